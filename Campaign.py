@@ -0,0 +1,82 @@
+import errno
+import json
+import os
+
+# Manifest of a campaign, outputs/<ts>/campaign.jsonl. The first line holds the
+# campaign settings, {"Campaign": {...}}, every following line a status change
+# of one mission:
+#   {"Mission": <n>, "Status": "running", "ReportId": <id>, "Seed": <seed>}
+#   {"Mission": <n>, "Status": "done", "ReportId": <id>, "Offset": <offset>}
+#   {"Mission": <n>, "Status": "failed", "ReportId": <id>, "Error": <error>}
+# A failed mission could not be flown (e.g. the vehicle could not be reset),
+# it is run again when the campaign is resumed. Lines are appended and fsync'ed like the stream reports, so after a crash the
+# manifest tells which missions are done and which one was in flight.
+
+MANIFEST_NAME = 'campaign.jsonl'
+RUNNING       = 'running'
+DONE          = 'done'
+FAILED        = 'failed'
+
+
+class CampaignManifest(object):
+
+    def __init__(self, path):
+        self.path     = path
+        self.settings = None
+        self.missions = {}
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    # Reads the manifest, dropping a partially written last line.
+    def load(self):
+        valid_size = 0
+        with open(self.path, 'rb') as stream:
+            for line in stream:
+                if not line.endswith('\n'):
+                    break
+                valid_size += len(line)
+                record = json.loads(line)
+                if 'Campaign' in record:
+                    self.settings = record['Campaign']
+                else:
+                    self.missions[record['Mission']] = record
+        if valid_size != os.path.getsize(self.path):
+            with open(self.path, 'r+b') as stream:
+                stream.truncate(valid_size)
+
+    def create(self, settings):
+        directory = os.path.dirname(self.path)
+        if directory:
+            try:
+                os.makedirs(directory)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+        self.settings = settings
+        self.append({'Campaign': settings})
+
+    def append(self, record):
+        with open(self.path, 'ab') as stream:
+            stream.write(json.dumps(record, sort_keys=True) + '\n')
+            stream.flush()
+            os.fsync(stream.fileno())
+
+    def update(self, mission, status, **fields):
+        record = dict(fields, Mission=mission, Status=status)
+        self.append(record)
+        self.missions[mission] = record
+
+    def status(self, mission):
+        record = self.missions.get(mission)
+        return record['Status'] if record is not None else None
+
+    # Missions that were started and did not finish.
+    def in_flight(self):
+        return sorted(mission for mission, record in self.missions.items() if \
+            record['Status'] == RUNNING)
+
+    # Missions of the campaign still to run, in order.
+    def remaining(self):
+        return [mission for mission in range(self.settings['Quantity']) if \
+            self.status(mission) != DONE]
@@ -0,0 +1,100 @@
+import time
+
+# Clocks Houston measures every timeout, intent and report timestamp with.
+# All of them have the same interface:
+#   now()           current time in seconds
+#   sleep(duration) blocks for a duration measured on the clock
+#   to_wall(duration) wall clock seconds a duration of the clock lasts, used to
+#                   bound waits on threading primitives
+
+
+class WallClock(object):
+    def now(self):
+        return time.time()
+
+    def sleep(self, duration):
+        time.sleep(duration)
+
+    def to_wall(self, duration):
+        return duration
+
+
+class ScaledClock(object):
+    """Wall clock running speed_up times faster, e.g. for SITL started with a
+    speed up (SIM_SPEEDUP)."""
+    def __init__(self, speed_up):
+        self.speed_up   = float(speed_up)
+        self.wall_start = time.time()
+
+    def now(self):
+        return self.wall_start + (time.time() - self.wall_start) * self.speed_up
+
+    def sleep(self, duration):
+        time.sleep(duration / self.speed_up)
+
+    def to_wall(self, duration):
+        return duration / self.speed_up
+
+
+class RosClock(object):
+    """ROS time, which follows /clock when use_sim_time is set. rospy.init_node
+    has to be called before the clock is read."""
+    def __init__(self, rospy):
+        self.rospy = rospy
+
+    def now(self):
+        return self.rospy.get_time()
+
+    def sleep(self, duration):
+        self.rospy.sleep(duration)
+
+    def to_wall(self, duration):
+        return duration
+
+
+class SimulatorClock(object):
+    """Simulated time of a KinematicSimulator."""
+    def __init__(self, simulator):
+        self.simulator = simulator
+
+    def now(self):
+        return self.simulator.get_time()
+
+    def sleep(self, duration):
+        self.simulator.sleep(duration)
+
+    def to_wall(self, duration):
+        return duration / self.simulator.speed_up
+
+
+class ReplayClock(object):
+    """Time of a recorded mission being replayed. It only moves when the
+    replay sets it, nothing waits on it."""
+    def __init__(self, start = 0.0):
+        self.time = start
+
+    def set(self, time):
+        self.time = time
+
+    def now(self):
+        return self.time
+
+    def sleep(self, duration):
+        self.time += duration
+
+    def to_wall(self, duration):
+        return 0.0
+
+
+# Same as rospy.Rate, on any of the clocks above.
+class Rate(object):
+    def __init__(self, clock, hz):
+        self.clock  = clock
+        self.period = 1.0 / hz
+        self.last   = clock.now()
+
+    def sleep(self):
+        self.last = max(self.last + self.period, self.clock.now())
+        remaining = self.last - self.clock.now()
+        if remaining > 0:
+            self.clock.sleep(remaining)
@@ -0,0 +1,181 @@
+import collections
+import math
+import threading
+
+# Early detection of missions that cannot end before their Time or Battery
+# failure flag. The action loops name the step in progress (climb, fly,
+# descend) and how to get the distance left to its target, the monitor feeds
+# it with the mission time and the battery used. Over the last window seconds
+# the progress rate and the battery drain are least squares slopes kept as
+# running sums, each sample costs O(1).
+#
+# The time to target is projected with the progress rate CONFIDENCE standard
+# errors above its estimate, and the battery at the target with the drain
+# CONFIDENCE standard errors below it, so a failure is only predicted when even
+# this optimistic projection crosses a failure flag. A step that makes no
+# progress never reaches its target. The projection has to hold for hold
+# seconds before the failure is reported. The time of the steps left after the
+# current one is not projected.
+
+PREDICTION_WINDOW     = 5.0 # seconds
+PREDICTION_HOLD       = 3.0 # seconds
+PREDICTION_CONFIDENCE = 3.0 # standard errors
+MIN_SAMPLES           = 10
+# Progress rates (m/s) under this are rounding noise of a step that does not
+# move.
+MIN_RATE              = 1e-6
+PREDICTED_FAILURE     = 'Predicted failure'
+
+
+# Least squares slope of the values of the last window seconds.
+class WindowSlope(object):
+
+    def __init__(self, window):
+        self.window  = window
+        self.samples = collections.deque()
+        self.origin  = None
+        # Sums of 1, t, y, t^2, t*y and y^2 over the window, t from origin.
+        self.sums    = [0.0] * 6
+
+    def clear(self):
+        self.samples.clear()
+        self.origin = None
+        self.sums   = [0.0] * 6
+
+    def add(self, time, value):
+        if self.origin is None:
+            self.origin = time
+        time -= self.origin
+        sample = (time, (1.0, time, value, time * time, time * value, value * \
+            value))
+        self.samples.append(sample)
+        self.update(sample[1], 1.0)
+        while time - self.samples[0][0] > self.window:
+            self.update(self.samples.popleft()[1], -1.0)
+
+    def update(self, values, sign):
+        sums = self.sums
+        for index in range(6):
+            sums[index] += sign * values[index]
+
+    @property
+    def count(self):
+        return len(self.samples)
+
+    # Seconds between the first and the last sample of the window.
+    def duration(self):
+        if not self.samples:
+            return 0.0
+        return self.samples[-1][0] - self.samples[0][0]
+
+    # (slope, standard error), None with less than MIN_SAMPLES samples.
+    def slope(self):
+        if self.count < MIN_SAMPLES:
+            return None
+        n, t, y, tt, ty, yy = self.sums
+        variance_t = tt - t * t / n
+        if variance_t <= 0:
+            return None
+        slope = (ty - t * y / n) / variance_t
+        residuals = max(yy - y * y / n - slope * (ty - t * y / n), 0.0)
+        return slope, math.sqrt(residuals / (n - 2) / variance_t)
+
+
+class FailurePredictor(object):
+
+    def __init__(self, min_remaining, window = PREDICTION_WINDOW, hold = \
+        PREDICTION_HOLD, confidence = PREDICTION_CONFIDENCE):
+        self.min_remaining = min_remaining
+        self.window        = window
+        self.hold          = hold
+        self.confidence    = confidence
+        self.lock          = threading.Lock()
+        self.time_limit    = None
+        self.battery_limit = None
+        self.step          = None
+        self.remaining     = None
+        self.progress      = WindowSlope(window)
+        self.drain         = WindowSlope(window)
+        # Mission time the current projection started to fail at.
+        self.since         = None
+        # Projection the failure was predicted with, written to the report.
+        self.evidence      = None
+
+    # Time and Battery failure flags, nothing is predicted before they are set.
+    def set_limits(self, time_limit, battery_limit):
+        with self.lock:
+            self.time_limit    = float(time_limit)
+            self.battery_limit = float(battery_limit)
+
+    # Starts a step, remaining returns the distance left to its target. A step
+    # None ends the current one.
+    def track(self, step, remaining = None):
+        with self.lock:
+            self.step      = step
+            self.remaining = remaining if step is not None else None
+            self.since     = None
+            self.progress.clear()
+            self.drain.clear()
+
+    # Returns the message of the failure predicted, None if none is (yet).
+    def check(self, elapsed, battery_used):
+        with self.lock:
+            if self.remaining is None or self.time_limit is None or \
+                self.evidence is not None:
+                return None
+            remaining = self.remaining()
+            self.progress.add(elapsed, remaining)
+            self.drain.add(elapsed, battery_used)
+            projection = self.project(elapsed, remaining, battery_used)
+            if projection is None:
+                self.since = None
+                return None
+            if self.since is None:
+                self.since = elapsed
+            if elapsed - self.since < self.hold:
+                return None
+            projection['Since'] = self.since
+            self.evidence = projection
+            if projection['Reason'] == 'Time':
+                projected, limit = projection['ProjectedTime'], self.time_limit
+            else:
+                projected, limit = projection['ProjectedBattery'], \
+                    self.battery_limit
+            return '{}: {}: Projected: {} - Limit: {} - Step: {} - Time: {}'.\
+                format(PREDICTED_FAILURE, projection['Reason'], 'never' if \
+                projected is None else projected, limit, self.step, elapsed)
+
+    # Projection of the current step, when it crosses a failure flag.
+    def project(self, elapsed, remaining, battery_used):
+        if remaining <= self.min_remaining or self.progress.duration() < \
+            0.9 * self.window:
+            return None
+        fit = self.progress.slope()
+        if fit is None:
+            return None
+        rate, rate_error = -fit[0], fit[1]
+        rate_bound = rate + self.confidence * rate_error
+        drain, drain_error = self.drain.slope() or (0.0, 0.0)
+        drain_bound = max(drain - self.confidence * drain_error, 0.0)
+        # None: the step is not getting closer to its target.
+        time_to_target = remaining / rate_bound if rate_bound > MIN_RATE else \
+            None
+        projected_time = elapsed + time_to_target if time_to_target is not None \
+            else None
+        if drain_bound == 0 or time_to_target is None:
+            projected_battery = battery_used if drain_bound == 0 else None
+        else:
+            projected_battery = battery_used + drain_bound * time_to_target
+        if projected_time is None or projected_time >= self.time_limit:
+            reason = 'Time'
+        elif projected_battery >= self.battery_limit:
+            reason = 'Battery'
+        else:
+            return None
+        return {'Reason': reason, 'Step': self.step, 'Time': elapsed, 'Remaining': \
+            remaining, 'Rate': rate, 'RateBound': rate_bound, 'TimeToTarget': \
+            time_to_target, 'ProjectedTime': projected_time, 'TimeLimit': \
+            self.time_limit, 'Battery': battery_used, 'Drain': drain, \
+            'DrainBound': drain_bound, 'ProjectedBattery': projected_battery, \
+            'BatteryLimit': self.battery_limit, 'Samples': self.progress.count, \
+            'Window': self.window, 'Confidence': self.confidence}
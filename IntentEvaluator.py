@@ -0,0 +1,92 @@
+# Intents and failure flags compiled once per mission into threshold tables.
+# Samples are checked against the tables with float comparisons only, and the
+# report is only touched when something changes: the first violation of an
+# intent (its time) and every new peak of the violating value.
+
+TIME       = 0
+BATTERY    = 1
+MAX_HEIGHT = 2
+MIN_HEIGHT = 3
+INTENTS    = ('Time', 'Battery', 'MaxHeight', 'MinHeight')
+
+
+class ThresholdTable(object):
+    def __init__(self, thresholds):
+        self.intended   = tuple(thresholds[intent] for intent in INTENTS)
+        self.time       = float(thresholds['Time'])
+        self.battery    = float(thresholds['Battery'])
+        self.max_height = float(thresholds['MaxHeight'])
+        self.min_height = float(thresholds['MinHeight'])
+
+
+class FailureFlagChecker(object):
+    def __init__(self, failure_flags):
+        self.table = ThresholdTable(failure_flags)
+
+    # Returns the message of the first flag raised, None if none is.
+    # min_height is -1 until the system has taken off.
+    def check(self, elapsed, battery_used, max_height, min_height):
+        table = self.table
+        if elapsed >= table.time:
+            return 'Time exceeded: Expected: {} Current: {}'.format(\
+                table.intended[TIME], elapsed)
+        elif battery_used >= table.battery:
+            return 'Battery exceeded: Expected: {} - Current: {} - Time: {}'.\
+                format(table.intended[BATTERY], battery_used, elapsed)
+        elif max_height >= table.max_height:
+            return 'Max height exceeded: Expected: {} - Current: {} - Time: {}'.\
+                format(table.intended[MAX_HEIGHT], max_height, elapsed)
+        elif min_height != -1 and min_height <= table.min_height:
+            return 'Min height exceeded: Expected: {} - Current: {} - Time: {}'.\
+                format(table.intended[MIN_HEIGHT], min_height, elapsed)
+        return None
+
+
+class IntentTracker(object):
+    """Tracks the intents of the whole mission (general) or of one action
+    (specific) and writes the violations into report, a dict of the Report."""
+    def __init__(self, intents, report, specific = False):
+        self.table    = ThresholdTable(intents)
+        self.report   = report
+        self.specific = specific
+        self.peak     = [None, None, None, None]
+
+    # elapsed and battery_used are counted from the start of the mission
+    # (general) or of the action (specific). min_height is only checked when
+    # check_min_height is set (after takeoff, before landing).
+    def update(self, elapsed, battery_used, max_height, min_height, \
+        check_min_height):
+        table = self.table
+        peak = self.peak
+        if peak[TIME] is None and elapsed >= table.time:
+            peak[TIME] = elapsed
+            if self.specific:
+                self.report['Time'] = {'Curremt-Time': elapsed, 'Intended-Time': \
+                    table.intended[TIME], 'Success': False}
+            else:
+                self.report['Time'] = {'Time': elapsed, 'Success': False}
+        if battery_used >= table.battery and (peak[BATTERY] is None or \
+            battery_used > peak[BATTERY]):
+            self.violation(BATTERY, elapsed, battery_used)
+        if max_height >= table.max_height and (peak[MAX_HEIGHT] is None or \
+            max_height > peak[MAX_HEIGHT]):
+            self.violation(MAX_HEIGHT, elapsed, max_height)
+        if check_min_height and min_height <= table.min_height and \
+            (peak[MIN_HEIGHT] is None or min_height < peak[MIN_HEIGHT]):
+            self.violation(MIN_HEIGHT, elapsed, min_height)
+
+    def violation(self, index, elapsed, value):
+        intent = INTENTS[index]
+        if self.peak[index] is None:
+            self.report[intent] = {'Time': elapsed, 'Success': False, \
+                'Current-' + intent: value, 'Intended-' + intent: \
+                self.table.intended[index]}
+        else:
+            self.report[intent]['Current-' + intent] = value
+        self.peak[index] = value
+
+    # Called when the action or the mission ends, records how long a time
+    # intent was exceeded by.
+    def finalize(self, elapsed):
+        if self.peak[TIME] is not None and self.specific:
+            self.report['Time']['Curremt-Time'] = elapsed
@@ -0,0 +1,316 @@
+import math
+import threading
+import time
+import numpy
+import Geodesy as Geodesy
+
+# Headless stand-in for ArduCopter SITL + Gazebo + MAVROS. It models the
+# multirotor as a point mass that tracks a position target with bounded
+# velocities, drains the battery while armed, and exposes the subset of the
+# rospy API Houston uses (Subscriber, Publisher, ServiceProxy, Rate, init_node)
+# so it can replace rospy inside Houston. Messages are plain objects with the
+# same attribute layout as the ROS messages Houston reads.
+
+HOME_COORDINATES   = (-35.3632607, 149.1652351)
+SIM_STEP           = 0.02      # seconds of simulated time per step
+MAX_SPEED_XY       = 5.0       # m/s, ArduCopter WPNAV_SPEED default
+MAX_SPEED_UP       = 2.5       # m/s
+MAX_SPEED_DOWN     = 1.5       # m/s
+LAND_SPEED         = 0.5       # m/s
+POSITION_GAIN      = 1.0       # 1/s, position error to velocity command
+VELOCITY_TAU       = 0.5       # seconds, first order velocity response
+BATTERY_IDLE_DRAIN = 0.0005    # fraction per second while armed on the ground
+BATTERY_HOVER_DRAIN= 0.0020    # fraction per second while flying
+BATTERY_MOVE_DRAIN = 0.0001    # extra fraction per second per m/s
+RTL_ALTITUDE       = 15.0      # meters, ArduCopter RTL_ALT default
+# Rates (Hz, simulated time) at which the feeds are published.
+FEED_RATES         = {'odom': 30.0, 'global': 10.0, 'battery': 2.0, 'model': 50.0, \
+                      'state': 1.0}
+# MAVLink commands of the command service (MAVROS cmd/command).
+MAV_CMD_BATTERY_RESET = 42651
+MAV_RESULT_ACCEPTED   = 0
+MAV_RESULT_UNSUPPORTED = 3
+
+
+class Message(object):
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def point(x, y, z):
+    return Message(x=float(x), y=float(y), z=float(z))
+
+
+class MultirotorModel(object):
+    """Kinematic multirotor in the local ENU frame of the home position."""
+    def __init__(self):
+        self.position = numpy.zeros(3)
+        self.velocity = numpy.zeros(3)
+        self.target   = None
+        self.battery  = 1.0
+        self.armed    = False
+        self.mode     = 'STABILIZE'
+
+    def step(self, dt):
+        if self.armed and self.mode == 'RTL':
+            # Back over home at RTL_ALTITUDE at least, then land.
+            if math.hypot(self.position[0], self.position[1]) > 0.1:
+                self.target = numpy.array([0.0, 0.0, max(self.position[2], \
+                    RTL_ALTITUDE)])
+            else:
+                self.target = numpy.array([0.0, 0.0, -1.0])
+        if self.armed and self.target is not None:
+            error = self.target - self.position
+            command = error * POSITION_GAIN
+            speed_xy = math.hypot(command[0], command[1])
+            if speed_xy > MAX_SPEED_XY:
+                command[:2] *= MAX_SPEED_XY / speed_xy
+            max_down = LAND_SPEED if self.mode in ('LAND', 'RTL') else \
+                MAX_SPEED_DOWN
+            command[2] = min(max(command[2], -max_down), MAX_SPEED_UP)
+        else:
+            command = numpy.zeros(3)
+            if self.position[2] > 0.0:
+                # Unpowered, fall at the max descent rate.
+                command[2] = -MAX_SPEED_DOWN
+        self.velocity += (command - self.velocity) * min(dt / VELOCITY_TAU, 1.0)
+        self.position += self.velocity * dt
+        if self.position[2] <= 0.0:
+            self.position[2] = 0.0
+            self.velocity[:] = 0.0
+            if self.armed and (self.mode == 'LAND' or (self.mode == 'RTL' and \
+                self.target[2] < 0.0)):
+                # ArduCopter disarms once it detects the landing.
+                self.armed = False
+                self.target = None
+        if self.armed:
+            if self.position[2] > 0.0:
+                drain = BATTERY_HOVER_DRAIN + BATTERY_MOVE_DRAIN * \
+                    numpy.linalg.norm(self.velocity)
+            else:
+                drain = BATTERY_IDLE_DRAIN
+            self.battery = max(self.battery - drain * dt, 0.0)
+
+
+class SimulatedSubscriber(object):
+    def __init__(self, simulator, topic, callback):
+        self.simulator = simulator
+        self.topic     = topic
+        self.callback  = callback
+
+    def unregister(self):
+        self.simulator.remove_subscriber(self)
+
+
+class SimulatedPublisher(object):
+    def __init__(self, simulator, topic):
+        self.simulator = simulator
+        self.topic     = topic
+
+    def publish(self, message):
+        self.simulator.handle_publish(self.topic, message)
+
+    def get_num_connections(self):
+        return 1
+
+    def unregister(self):
+        pass
+
+
+class SimulatedRate(object):
+    def __init__(self, simulator, hz):
+        self.simulator = simulator
+        self.period    = 1.0 / hz
+        self.last      = simulator.get_time()
+
+    def sleep(self):
+        self.last = max(self.last + self.period, self.simulator.get_time())
+        self.simulator.sleep_until(self.last)
+
+
+class KinematicSimulator(object):
+    """Steps a MultirotorModel in a background thread, speed_up times faster
+    than real time, and serves the MAVROS and Gazebo interfaces."""
+    def __init__(self, namespace = '/mavros', model_name = 'iris_demo', \
+        speed_up = 1.0, home = HOME_COORDINATES):
+        self.namespace   = namespace
+        self.model_name  = model_name
+        self.speed_up    = float(speed_up)
+        self.home        = home
+        self.home_plane  = Geodesy.LocalTangentPlane(home)
+        self.model       = MultirotorModel()
+        self.lock        = threading.Lock()
+        self.clock       = threading.Condition()
+        self.sim_time    = 0.0
+        self.subscribers = {}
+        self.thread      = None
+        self.next_feed   = dict.fromkeys(FEED_RATES, 0.0)
+        self.services    = {
+            self.namespace + '/set_mode': self.service_set_mode,
+            self.namespace + '/cmd/arming': self.service_arming,
+            self.namespace + '/cmd/takeoff': self.service_takeoff,
+            self.namespace + '/cmd/land': self.service_land,
+            self.namespace + '/cmd/command': self.service_command}
+        self.feeds       = {
+            'odom': (self.namespace + '/local_position/odom', self.odom_message),
+            'global': (self.namespace + '/global_position/global', \
+                self.global_message),
+            'battery': (self.namespace + '/battery', self.battery_message),
+            'model': ('/gazebo/model_states', self.model_states_message),
+            'state': (self.namespace + '/state', self.state_message)}
+
+    # rospy like API
+
+    def init_node(self, name, *args, **kwargs):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def Subscriber(self, topic, data_class, callback, queue_size = None):
+        subscriber = SimulatedSubscriber(self, topic, callback)
+        with self.lock:
+            self.subscribers.setdefault(topic, []).append(subscriber)
+        return subscriber
+
+    def Publisher(self, topic, data_class, queue_size = None, **kwargs):
+        return SimulatedPublisher(self, topic)
+
+    def ServiceProxy(self, name, service_class, persistent = False, **kwargs):
+        if name not in self.services:
+            raise ValueError('Service {} is not simulated'.format(name))
+        return self.services[name]
+
+    def wait_for_service(self, service, timeout = None):
+        if service not in self.services:
+            raise ValueError('Service {} is not simulated'.format(service))
+
+    def Rate(self, hz):
+        return SimulatedRate(self, hz)
+
+    def get_time(self):
+        return self.sim_time
+
+    def sleep(self, duration):
+        self.sleep_until(self.sim_time + duration)
+
+    def sleep_until(self, sim_time):
+        with self.clock:
+            while self.sim_time < sim_time:
+                self.clock.wait(1.0)
+
+    def remove_subscriber(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers.get(subscriber.topic, []):
+                self.subscribers[subscriber.topic].remove(subscriber)
+
+    # Simulation
+
+    def run(self):
+        wall_next = time.time()
+        while True:
+            with self.lock:
+                self.model.step(SIM_STEP)
+            with self.clock:
+                self.sim_time += SIM_STEP
+                self.clock.notify_all()
+            self.publish_feeds()
+            wall_next += SIM_STEP / self.speed_up
+            delay = wall_next - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Running behind, do not try to catch up.
+                wall_next = time.time()
+
+    def publish_feeds(self):
+        for feed, rate in FEED_RATES.items():
+            if self.sim_time < self.next_feed[feed]:
+                continue
+            self.next_feed[feed] = self.sim_time + 1.0 / rate
+            topic, make_message = self.feeds[feed]
+            subscribers = self.subscribers.get(topic)
+            if not subscribers:
+                continue
+            with self.lock:
+                message = make_message()
+            for subscriber in list(subscribers):
+                subscriber.callback(message)
+
+    def handle_publish(self, topic, message):
+        if topic == self.namespace + '/setpoint_position/local':
+            position = message.pose.position
+            with self.lock:
+                if self.model.armed and self.model.mode == 'GUIDED' and \
+                    self.model.target is not None:
+                    self.model.target = numpy.array([position.x, position.y, \
+                        position.z], dtype=float)
+
+    # Services, same arguments as the MAVROS services
+
+    def service_set_mode(self, base_mode = 0, custom_mode = ''):
+        with self.lock:
+            self.model.mode = custom_mode
+            if custom_mode == 'LAND' and self.model.armed:
+                self.model.target = numpy.array([self.model.position[0], \
+                    self.model.position[1], -1.0])
+        return Message(mode_sent=True)
+
+    def service_arming(self, value):
+        with self.lock:
+            if value and self.model.battery <= 0.0:
+                return Message(success=False, result=4)
+            self.model.armed = bool(value)
+            if not value:
+                self.model.target = None
+        return Message(success=True, result=0)
+
+    def service_takeoff(self, min_pitch, yaw, latitude, longitude, altitude):
+        with self.lock:
+            if not self.model.armed or self.model.mode != 'GUIDED':
+                return Message(success=False, result=4)
+            self.model.target = numpy.array([self.model.position[0], \
+                self.model.position[1], float(altitude)])
+        return Message(success=True, result=0)
+
+    def service_land(self, min_pitch, yaw, latitude, longitude, altitude):
+        return Message(success=self.service_set_mode(0, 'LAND').mode_sent, \
+            result=0)
+
+    # Only the battery reset is simulated.
+    def service_command(self, broadcast, command, confirmation, param1 = 0, \
+        param2 = 0, param3 = 0, param4 = 0, param5 = 0, param6 = 0, param7 = 0):
+        if command != MAV_CMD_BATTERY_RESET:
+            return Message(success=False, result=MAV_RESULT_UNSUPPORTED)
+        with self.lock:
+            self.model.battery = min(max(param2 / 100.0, 0.0), 1.0)
+        return Message(success=True, result=MAV_RESULT_ACCEPTED)
+
+    # Feeds. The local frame is ENU, Gazebo's frame is rotated so that
+    # gazebo x = local y and gazebo y = -local x.
+
+    def odom_message(self):
+        position, velocity = self.model.position, self.model.velocity
+        return Message(header=Message(stamp=self.sim_time), pose=Message(pose=\
+            Message(position=point(*position))), twist=Message(twist=Message(\
+            linear=point(*velocity))))
+
+    def global_message(self):
+        latitude, longitude = self.home_plane.to_lat_long(\
+            self.model.position[0], self.model.position[1])
+        return Message(header=Message(stamp=self.sim_time), latitude=latitude, \
+            longitude=longitude, altitude=self.model.position[2])
+
+    def state_message(self):
+        return Message(header=Message(stamp=self.sim_time), connected=True, \
+            armed=self.model.armed, guided=self.model.mode == 'GUIDED', \
+            mode=self.model.mode)
+
+    def battery_message(self):
+        return Message(header=Message(stamp=self.sim_time), remaining=\
+            self.model.battery, voltage=12.6 * (0.8 + 0.2 * self.model.battery))
+
+    def model_states_message(self):
+        x, y, z = self.model.position
+        return Message(name=[self.model_name], pose=[Message(position=point(y, \
+            -x, z))])
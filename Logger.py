@@ -0,0 +1,186 @@
+import atexit
+import errno
+import os
+import Queue
+import threading
+import time
+
+# Log backend. Messages go through a queue to a background writer thread which
+# writes them in batches, so logging never blocks the caller: when the queue
+# is full the message is dropped and counted. Files are rotated by size.
+# A forked process (e.g. a campaign worker) inherits the writer of its parent
+# but not its thread, so it gets a writer of its own, on the same file.
+
+LEVELS          = {'DEBUG': 10, 'LOG': 20, 'WARNING': 30, 'ERROR': 40}
+LOG_FILE        = 'houston.log'
+QUEUE_SIZE      = 10000
+FLUSH_SIZE      = 256            # messages
+FLUSH_INTERVAL  = 1.0            # seconds
+MAX_BYTES       = 50 * 1024 * 1024
+BACKUP_COUNT    = 5
+
+_level  = LEVELS['LOG']
+_writer = None
+
+
+class BufferedLogWriter(object):
+
+    def __init__(self, path, flush_size = FLUSH_SIZE, flush_interval = \
+        FLUSH_INTERVAL, max_bytes = MAX_BYTES, backup_count = BACKUP_COUNT):
+        self.path           = path
+        # Path of the messages written next, path once set_path is processed.
+        self.next_path      = path
+        self.pid            = os.getpid()
+        self.flush_size     = flush_size
+        self.flush_interval = flush_interval
+        self.max_bytes      = max_bytes
+        self.backup_count   = backup_count
+        self.queue          = Queue.Queue(QUEUE_SIZE)
+        self.dropped        = 0
+        self.file           = None
+        self.thread         = threading.Thread(target=self.run)
+        self.thread.daemon  = True
+        self.thread.start()
+
+    # Never blocks.
+    def write(self, line):
+        try:
+            self.queue.put_nowait(line)
+        except Queue.Full:
+            self.dropped += 1
+
+    # Following messages go to another file (e.g. one log per mission).
+    def set_path(self, path):
+        self.next_path = path
+        self.queue.put(('path', path))
+
+    # Blocks until everything queued so far is written.
+    def flush(self):
+        done = threading.Event()
+        self.queue.put(('flush', done))
+        done.wait(5 * self.flush_interval)
+
+    # Writes everything queued so far and stops the writer thread.
+    def close(self):
+        done = threading.Event()
+        self.queue.put(('close', done))
+        done.wait(5 * self.flush_interval)
+
+    def run(self):
+        batch = []
+        last_flush = time.time()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except Queue.Empty:
+                item = None
+            if isinstance(item, tuple):
+                self.write_batch(batch)
+                batch = []
+                last_flush = time.time()
+                if item[0] == 'path':
+                    self.close_file()
+                    self.path = item[1]
+                    continue
+                if item[0] == 'close':
+                    self.close_file()
+                    item[1].set()
+                    return
+                item[1].set()
+                continue
+            if item is not None:
+                batch.append(item)
+            if len(batch) >= self.flush_size or (batch and time.time() - \
+                last_flush >= self.flush_interval):
+                self.write_batch(batch)
+                batch = []
+                last_flush = time.time()
+
+    def write_batch(self, batch):
+        if self.dropped:
+            batch.append('[WARNING]: {} log messages dropped '.format(self.dropped))
+            self.dropped = 0
+        if not batch:
+            return
+        if self.file is None:
+            self.open_file()
+        self.file.write('\n'.join(batch) + '\n')
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def open_file(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            try:
+                os.makedirs(directory)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+        self.file = open(self.path, 'a')
+
+    def close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    # houston.log -> houston.log.1 -> ... -> houston.log.<backup_count>
+    def rotate(self):
+        self.close_file()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = '{}.{}'.format(self.path, index)
+            if os.path.exists(source):
+                os.rename(source, '{}.{}'.format(self.path, index + 1))
+        if self.backup_count > 0:
+            os.rename(self.path, '{}.1'.format(self.path))
+        else:
+            os.remove(self.path)
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        _writer = BufferedLogWriter(LOG_FILE)
+        atexit.register(close)
+    elif _writer.pid != os.getpid():
+        _writer = BufferedLogWriter(_writer.next_path)
+    return _writer
+
+
+# Writes the messages of this process queued so far.
+def flush():
+    if _writer is not None and _writer.pid == os.getpid():
+        _writer.flush()
+
+
+# Writes the messages of this process queued so far and stops its writer, run
+# at exit. Processes that exit without running atexit (multiprocessing) call it
+# before they exit.
+def close():
+    global _writer
+    if _writer is not None and _writer.pid == os.getpid():
+        _writer.close()
+        _writer = None
+
+
+def set_level(level):
+    global _level
+    _level = LEVELS[level]
+
+
+def get_level():
+    for name, value in LEVELS.items():
+        if value == _level:
+            return name
+
+
+def enabled(nature):
+    return LEVELS.get(nature, LEVELS['LOG']) >= _level
+
+
+def set_log_file(path):
+    get_writer().set_path(path)
+
+
+def write(line):
+    get_writer().write(line)
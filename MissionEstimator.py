@@ -0,0 +1,299 @@
+import json
+import math
+import os
+import ReportAnalyzer as ReportAnalyzer
+import Timing         as Timing
+
+# Duration and battery estimates of mission actions, fitted from the reports of
+# previous missions. Each estimate is a least squares line kept as running sums,
+# so a report is added in O(1) and the model file only holds a few numbers:
+#   Takeoff  seconds from the takeoff altitude
+#   Land     seconds from the altitude the landing starts at
+#   GoTo     seconds from the horizontal distance to the location
+#   Battery  battery used from the mission time
+# Until a line has MIN_SAMPLES samples it uses the constants RandomMissionGenerator
+# used before (DEFAULTS), so missions do not change without history.
+#
+# The time of a mission minus the estimates of its actions and its waits (the
+# time between actions) is tracked as well: its mean and the waits are added to
+# the time intent of a mission, and failure flags get CONFIDENCE standard
+# deviations of it, and of the battery residual, over the intents.
+
+MIN_SAMPLES           = 10
+CONFIDENCE            = 3.0 # standard deviations
+# (intercept, slope) of each estimate without enough samples.
+DEFAULTS              = {'Takeoff': (0.0, 1.8), 'Land': (0.0, 2.6), 'GoTo': \
+                         (0.0, 1.8), 'Battery': (0.0, 0.0025)}
+DEFAULT_TIME_MARGIN   = 10.0 # seconds
+DEFAULT_BATTERY_MARGIN= 0.0025 * 10
+MIN_TIME_MARGIN       = 2.0 # seconds
+
+
+# Least squares line y = intercept + slope * x over running sums.
+class LinearFit(object):
+
+    def __init__(self, default):
+        self.default = default
+        self.sums    = [0.0] * 6 # n, x, y, xx, xy, yy
+
+    def add(self, x, y):
+        sums = self.sums
+        for index, value in enumerate((1.0, x, y, x * x, x * y, y * y)):
+            sums[index] += value
+
+    @property
+    def count(self):
+        return int(self.sums[0])
+
+    def ready(self):
+        return self.count >= MIN_SAMPLES
+
+    def coefficients(self):
+        if not self.ready():
+            return self.default
+        n, x, y, xx, xy, yy = self.sums
+        variance_x = xx - x * x / n
+        if variance_x <= 1e-9 * max(xx, 1.0):
+            # All the samples at the same x, only the level can be fitted.
+            slope = self.default[1]
+        else:
+            slope = (xy - x * y / n) / variance_x
+        return (y - slope * x) / n, slope
+
+    # Works on numbers and on numpy arrays.
+    def predict(self, x):
+        intercept, slope = self.coefficients()
+        return intercept + slope * x
+
+    # Standard deviation of the residuals, None without enough samples.
+    def sigma(self):
+        if not self.ready():
+            return None
+        n, x, y, xx, xy, yy = self.sums
+        intercept, slope = self.coefficients()
+        residuals = yy - 2 * intercept * y - 2 * slope * xy + n * intercept ** 2 + \
+            2 * intercept * slope * x + slope ** 2 * xx
+        return math.sqrt(max(residuals, 0.0) / max(n - 2, 1))
+
+
+# Mean and standard deviation of a value stream.
+class RunningStats(object):
+
+    def __init__(self):
+        self.sums = [0.0] * 3 # n, x, xx
+
+    def add(self, value):
+        self.sums[0] += 1
+        self.sums[1] += value
+        self.sums[2] += value * value
+
+    @property
+    def count(self):
+        return int(self.sums[0])
+
+    def mean(self):
+        return self.sums[1] / self.sums[0]
+
+    def sigma(self):
+        n, x, xx = self.sums
+        return math.sqrt(max(xx - x * x / n, 0.0) / max(n - 1, 1))
+
+    def ready(self):
+        return self.count >= MIN_SAMPLES
+
+
+class MissionEstimator(object):
+
+    def __init__(self, path = None):
+        self.path            = path
+        self.fits            = dict((name, LinearFit(default)) for name, default \
+            in DEFAULTS.items())
+        # Mission time not explained by the action estimates.
+        self.time_residual   = RunningStats()
+        self.battery_residual= RunningStats()
+        # Ids of the reports already added, by report file.
+        self.sources         = {}
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def load(self, path):
+        with open(path) as stream:
+            model = json.load(stream)
+        for name, sums in model['Fits'].items():
+            self.fits[name].sums = list(sums)
+        self.time_residual.sums = list(model['TimeResidual'])
+        self.battery_residual.sums = list(model['BatteryResidual'])
+        self.sources = dict(model['Sources'])
+
+    def save(self, path = None):
+        path = path or self.path
+        sources = dict((source, sorted(report_ids) if isinstance(report_ids, \
+            set) else report_ids) for source, report_ids in self.sources.items())
+        model = {'Fits': dict((name, fit.sums) for name, fit in self.fits.items()), \
+            'TimeResidual': self.time_residual.sums, 'BatteryResidual': \
+            self.battery_residual.sums, 'Sources': sources, 'Estimates': \
+            self.summary()}
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as stream:
+            json.dump(model, stream, sort_keys=True, indent=4)
+        os.rename(temporary, path)
+
+    def takeoff_time(self, altitude):
+        return self.fits['Takeoff'].predict(altitude)
+
+    def land_time(self, altitude):
+        return self.fits['Land'].predict(altitude)
+
+    def go_to_time(self, distance):
+        return self.fits['GoTo'].predict(distance)
+
+    def battery(self, time):
+        return self.fits['Battery'].predict(time)
+
+    # Seconds of a mission spent outside its actions: between them and waiting on
+    # purpose (wait, e.g. of an extraction). Without history neither is added,
+    # the default estimates and margin cover them. Works on numpy arrays.
+    def time_offset(self, wait = 0.0):
+        if not self.time_residual.ready():
+            return 0.0
+        return self.time_residual.mean() + wait
+
+    # Seconds a failure flag adds to the time intent of a mission.
+    def time_margin(self):
+        if not self.time_residual.ready():
+            return DEFAULT_TIME_MARGIN
+        return max(CONFIDENCE * self.time_residual.sigma(), MIN_TIME_MARGIN)
+
+    # Battery a failure flag adds to the battery intent of a mission.
+    def battery_margin(self):
+        if not self.battery_residual.ready():
+            return DEFAULT_BATTERY_MARGIN
+        return CONFIDENCE * self.battery_residual.sigma()
+
+    # Ids of the reports of a report file already added. Models written before
+    # ids were kept hold how many reports were added: whole files, or reports
+    # added as they were written, so ids 0 to count - 1.
+    def report_ids(self, source):
+        report_ids = self.sources.get(source, [])
+        if isinstance(report_ids, int):
+            report_ids = range(report_ids)
+        if not isinstance(report_ids, set):
+            report_ids = set(int(report_id) for report_id in report_ids)
+            self.sources[source] = report_ids
+        return report_ids
+
+    # Adds the actions of a mission report, report_id of source. Only the
+    # actions that succeeded are used, and the mission time only when the whole
+    # mission succeeded.
+    def add_report(self, report, source = None, report_id = None):
+        if source is not None and report_id is not None:
+            self.report_ids(source).add(int(report_id))
+        actions = get_actions(report)
+        if actions is None:
+            return
+        # Residuals are taken against the estimates before the report is added,
+        # and only once the estimates are fitted.
+        predicted = 0.0
+        fitted = True
+        for name, x, duration, passed in actions:
+            predicted += self.fits[name].predict(x)
+            fitted = fitted and self.fits[name].ready()
+        for name, x, duration, passed in actions:
+            if passed and duration is not None:
+                self.fits[name].add(x, duration)
+        if report.get('Failure Flags') != 'Success':
+            return
+        overall_time = float(report['OverallTime'])
+        if fitted:
+            self.time_residual.add(overall_time - get_waits(report) - predicted)
+        battery_used = ReportAnalyzer.get_battery_used(report)
+        if battery_used is not None:
+            if self.fits['Battery'].ready():
+                self.battery_residual.add(battery_used - self.battery(overall_time))
+            self.fits['Battery'].add(overall_time, battery_used)
+
+    # Adds the reports of a report.json or report.jsonl file not added yet, by
+    # report id: report.json keeps its ids in string order. Returns how many were
+    # added.
+    def update_from_file(self, report_file):
+        source = os.path.abspath(report_file)
+        seen = self.report_ids(source)
+        added = 0
+        for report_id, report in ReportAnalyzer.iter_reports(report_file):
+            if int(report_id) in seen:
+                continue
+            self.add_report(report, source, report_id)
+            added += 1
+        return added
+
+    def summary(self):
+        summary = {}
+        for name, fit in self.fits.items():
+            intercept, slope = fit.coefficients()
+            summary[name] = {'Intercept': intercept, 'Slope': slope, 'Sigma': \
+                fit.sigma(), 'Samples': fit.count}
+        summary['TimeOffset'] = self.time_offset()
+        summary['TimeMargin'] = self.time_margin()
+        summary['BatteryMargin'] = self.battery_margin()
+        return summary
+
+
+# (estimate, x, duration, passed) of every action of a report. Durations come
+# from the 'Timing' spans and, for older reports, from the action times, which
+# are measured from the start of the mission. None when the actions cannot be
+# told apart: no action output, or an extraction without spans (both legs write
+# the same actions).
+def get_actions(report):
+    outputs = report.get('ActionOutput')
+    if not outputs or 'Takeoff' not in outputs or (report.get('MissionType') == \
+        'Extraction' and not report.get('Timing')):
+        return None
+    takeoff = outputs['Takeoff']
+    altitude = float(takeoff['Output'][1])
+    go_tos = sorted((int(name.split('_')[1]), output) for name, output in \
+        outputs.items() if name.startswith('GoTo_'))
+    land_altitude = float(go_tos[-1][1]['Goal']['To']['z']) if go_tos else altitude
+    durations = get_durations(report, go_tos)
+    actions = []
+    for name, x, key, passed in [('Takeoff', altitude, 'Takeoff', \
+        takeoff['Output'][0])] + [('GoTo', go_to_distance(output), 'GoTo_{}'.\
+        format(number), output['Output']) for number, output in go_tos] + \
+        ([('Land', land_altitude, 'Land', outputs['Land']['Output'])] if 'Land' \
+        in outputs else []):
+        for duration in durations.get(key, [None]):
+            actions.append((name, x, duration, bool(passed)))
+    return actions
+
+
+# Durations of the actions by name. A name may appear several times (the two
+# legs of an extraction).
+def get_durations(report, go_tos):
+    durations = {}
+    if report.get('Timing'):
+        for path, span in Timing.iter_spans(report['Timing']):
+            name = path.split('/')[-1]
+            if (name in ('Takeoff', 'Land') or name.startswith('GoTo_')) and \
+                span['Duration'] is not None and 'FailsafeLand' not in path:
+                durations.setdefault(name, []).append(span['Duration'])
+        return durations
+    outputs = report['ActionOutput']
+    previous = float(outputs['Takeoff']['Time'])
+    durations['Takeoff'] = [previous]
+    for number, output in go_tos:
+        durations['GoTo_{}'.format(number)] = [float(output['Time']) - previous]
+        previous = float(output['Time'])
+    if 'Land' in outputs:
+        durations['Land'] = [float(outputs['Land']['Time']) - previous]
+    return durations
+
+
+def go_to_distance(output):
+    start, end = output['Goal']['From'], output['Goal']['To']
+    return math.hypot(float(end['x']) - float(start['x']), float(end['y']) - \
+        float(start['y']))
+
+
+# Seconds a mission waited on purpose (extraction), not estimated.
+def get_waits(report):
+    return sum(span['Duration'] or 0.0 for path, span in Timing.iter_spans(\
+        report.get('Timing') or []) if path.split('/')[-1] == 'Wait')
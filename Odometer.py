@@ -0,0 +1,38 @@
+import math
+
+# Distance traveled by the system, fed by the model position callback. Moves
+# shorter than the noise floor from the last counted position are not counted,
+# so hovering jitter does not add up, while a steady move is counted in steps
+# of at least the noise floor. Each sample costs O(1).
+
+NOISE_FLOOR = 0.05 # meters
+
+
+class Odometer(object):
+
+    def __init__(self, noise_floor = NOISE_FLOOR):
+        self.noise_floor  = noise_floor
+        self.anchor       = None
+        self.total        = 0.0
+        self.action_start = 0.0
+
+    def update(self, x, y, z):
+        anchor = self.anchor
+        if anchor is None:
+            self.anchor = (x, y, z)
+            return
+        dx = x - anchor[0]
+        dy = y - anchor[1]
+        dz = z - anchor[2]
+        step = math.sqrt(dx * dx + dy * dy + dz * dz)
+        if step >= self.noise_floor:
+            self.total += step
+            self.anchor = (x, y, z)
+
+    # Distance of the current action starts to be counted from here.
+    def start_action(self):
+        self.action_start = self.total
+
+    # Distance traveled since the start of the current action.
+    def action(self):
+        return self.total - self.action_start
@@ -1,13 +1,26 @@
 import random
 import math
+import numpy
+import MissionEstimator as MissionEstimator
 from houston import euclidean
-QUALITY_ATTRUBUTE_INFORM_RATE = 5
+QUALITY_ATTRUBUTE_INFORM_RATE = 5 # seconds between quality attribute samples
 FAILURE_FLAG_SHUTDOWN         = True
+# Batch generation draws its random numbers in blocks of BATCH_BLOCK_SIZE
+# missions, each block seeded with (seed, block number). A mission therefore
+# only depends on the seed and its number, not on how the work is chunked.
+# The random numbers are not the ones of generate_random_mission, the missions
+# of a seed differ from the ones random-mission generates with it.
+BATCH_BLOCK_SIZE              = 4096
+MAX_LOCATIONS                 = 10
 
 class RandomMissionGenerator(object):
     """Generates random  missions"""
-    def __init__(self, name, current_model_position):
+    # Action times, battery and failure flag margins come from estimator, see
+    # MissionEstimator, which without history uses the constants used so far.
+    def __init__(self, name, current_model_position, seed = None, estimator = None):
         self.name = name
+        self.estimator = estimator or MissionEstimator.MissionEstimator()
+        self.random = random.Random(seed)
         self.types = ['PTP','MPTP','Extraction']
         self.ptp_params = ['alt','x','y', 'z','x_d','y_d','z_d']
         self.extraction_params = list(self.ptp_params)
@@ -21,11 +34,11 @@ class RandomMissionGenerator(object):
 
     def get_random_by_type(self, param):
         if param == 'alt':
-            return random.randint(1, 50)
+            return self.random.randint(1, 50)
         elif param == 'wait':
-            return random.randint(1,50)
+            return self.random.randint(1,50)
         elif param in self.ptp_params:
-            return random.randint(0, 50)
+            return self.random.randint(0, 50)
 
 
     def get_multiple_locations(self, number_of_locations):
@@ -57,7 +70,7 @@ class RandomMissionGenerator(object):
             return action_data
         elif psudo_random_number == 1:
             action_data['Type'] = self.types[1]
-            action_data['Locations'] = self.get_multiple_locations(random.randint(1,10))
+            action_data['Locations'] = self.get_multiple_locations(self.random.randint(1,10))
             return action_data
         elif psudo_random_number == 2:
             action_data['Type'] = self.types[2]
@@ -76,6 +89,7 @@ class RandomMissionGenerator(object):
         for param in self.quaility_attributes:
             if param == 'ReportRate':
                 quality_attributes_data[param] = QUALITY_ATTRUBUTE_INFORM_RATE
+                continue
             quality_attributes_data[param] = True
         return quality_attributes_data
 
@@ -95,13 +109,13 @@ class RandomMissionGenerator(object):
         return total_time
 
     def calculate_time_from_point_to_point(self, _from, _to):
-        return euclidean(_from, _to) * 1.8 # TODO
+        return self.estimator.go_to_time(euclidean(_from, _to))
 
     def calculate_time_land(self, alt):
-        return alt * 2.6 # TODO
+        return self.estimator.land_time(alt)
 
     def calculate_time_takeoff(self, alt):
-        return alt * 1.8 # TODO
+        return self.estimator.takeoff_time(alt)
 
     def get_specific_intents(self, locations):
         specific_intents = [{}]
@@ -112,7 +126,8 @@ class RandomMissionGenerator(object):
                 specific_intents[0]['Time'] = self.calculate_time_from_point_to_point((\
                     self.current_model_position.x, self.current_model_position.y), \
                     (locations[0]['x'], locations[0]['y']))
-                specific_intents[0]['Battery'] = specific_intents[0]['Time'] * 0.0025
+                specific_intents[0]['Battery'] = self.estimator.battery(\
+                    specific_intents[0]['Time'])
                 specific_intents[0]['MaxHeight'] = locations[0]['alt'] + 0.3
                 specific_intents[0]['MinHeight'] = locations[0]['alt'] - 0.3
                 lowest_highest[0] =  locations[0]['alt'] - 0.3
@@ -122,7 +137,8 @@ class RandomMissionGenerator(object):
                 specific_intents[index]['Time'] = self.calculate_time_from_point_to_point((\
                     locations[index-1]['x'], locations[index-1]['y']), (locations[index]['x'], \
                     locations[index]['y']))
-                specific_intents[index]['Battery'] = specific_intents[index]['Time'] * 0.0025
+                specific_intents[index]['Battery'] = self.estimator.battery(\
+                    specific_intents[index]['Time'])
                 if   float(locations[index]['alt']) > float(locations[index - 1]['alt']):
                     if float(locations[index]['alt']) > lowest_highest[1]:
                         lowest_highest[1] = float(locations[index]['alt'] +0.3)
@@ -143,7 +159,6 @@ class RandomMissionGenerator(object):
         intents_data['General']['Time'] = self.calculate_time_for_general_intents(mission_action)
         intents_data['General']['MaxHeight'] = mission_action['alt']+ 0.3
         intents_data['General']['MinHeight'] = mission_action['alt']- 0.3
-        intents_data['General']['Battery']   = intents_data['General']['Time'] * 0.0025
         specific_intents, lowest_highest = self.get_specific_intents(list([mission_action]))
         intents_data['Specific'] = specific_intents
         return intents_data
@@ -155,14 +170,12 @@ class RandomMissionGenerator(object):
         intents_data['General']['Time'] = self.calculate_time_for_general_intents(mission_action, True)
         intents_data['General']['MaxHeight'] = lowest_highest[1]
         intents_data['General']['MinHeight'] = lowest_highest[0]
-        intents_data['General']['Battery']   = intents_data['General']['Time'] * 0.0025
         intents_data['Specific'] = specific_intents
         return intents_data
 
     def process_Extraction_intents(self, intents_data, mission_action):
         intents_data =  self.process_PTP_intents(intents_data, mission_action)
         intents_data['General']['Time'] = intents_data['General']['Time'] * 2
-        intents_data['General']['Battery'] = intents_data['General']['Battery'] * 2
         previous_mission_action = dict(mission_action)
         previous_mission_action['x'] = self.current_model_position.x
         previous_mission_action['y'] = self.current_model_position.y
@@ -180,14 +193,20 @@ class RandomMissionGenerator(object):
             intents_data = self.process_MPTP_intents(intents_data, mission_action)
         elif mission_action['Type'] == 'Extraction': # Extraction
             intents_data = self.process_Extraction_intents(intents_data, mission_action)
-
+        # The time spent between the actions, then the battery of the whole time.
+        intents_data['General']['Time'] += self.estimator.time_offset(\
+            mission_action.get('wait', 0.0))
+        intents_data['General']['Battery'] = self.estimator.battery(\
+            intents_data['General']['Time'])
         return intents_data
 
 
     def get_failure_flags(self, intents):
         failure_flags_data = {}
-        failure_flags_data['Time'] = intents['General']['Time'] + 10
-        failure_flags_data['Battery'] = intents['General']['Battery'] + (0.0025 * 10) #Tecnically 10 more seconds of battery
+        failure_flags_data['Time'] = intents['General']['Time'] + \
+            self.estimator.time_margin()
+        failure_flags_data['Battery'] = intents['General']['Battery'] + \
+            self.estimator.battery_margin()
         failure_flags_data['MaxHeight'] = intents['General']['MaxHeight'] + 1.5
         failure_flags_data['MinHeight'] = intents['General']['MinHeight'] - 1.5
         failure_flags_data['SystemShutdown'] = FAILURE_FLAG_SHUTDOWN
@@ -204,7 +223,7 @@ class RandomMissionGenerator(object):
         'None', 'Mission': {'Name': self.name}}}
         mission_type_number = self.get_mission_type(mission_type)
         if mission_type_number == -1:
-            mission_type_number = random.randint(0,len(self.types)-1)
+            mission_type_number = self.random.randint(0,len(self.types)-1)
         action  = self.get_mission_action(mission_type_number)
         quality_attributes = self.get_quality_attributes()
         intents = self.get_intents(action)
@@ -216,3 +235,146 @@ class RandomMissionGenerator(object):
 
 
         return json
+
+    # Generates missions number start to start + count - 1 of the mission set
+    # given by seed, as a stream of mission descriptions. Random numbers,
+    # actions, intents and failure flags are computed as arrays, one block of
+    # BATCH_BLOCK_SIZE missions at a time.
+    def generate_missions(self, mission_type, count, seed, start = 0):
+        mission_type_number = self.get_mission_type(mission_type)
+        end = start + count
+        block = start // BATCH_BLOCK_SIZE
+        while block * BATCH_BLOCK_SIZE < end:
+            block_start = block * BATCH_BLOCK_SIZE
+            missions = self.generate_block(mission_type_number, seed, block)
+            for index in range(max(start, block_start), min(end, block_start + \
+                BATCH_BLOCK_SIZE)):
+                yield missions(index - block_start)
+            block += 1
+
+    # Draws the random numbers of a block. Every array is always drawn, in the
+    # same order, whatever the mission types are.
+    def draw_block(self, seed, block):
+        # RandomState takes 32 bit words, negative seeds included.
+        state = numpy.random.RandomState([seed & 0xffffffff, (seed >> 32) & \
+            0xffffffff, block])
+        size = (BATCH_BLOCK_SIZE, MAX_LOCATIONS)
+        draws = {}
+        draws['Type'] = state.randint(0, len(self.types), BATCH_BLOCK_SIZE)
+        draws['Locations'] = state.randint(1, MAX_LOCATIONS + 1, BATCH_BLOCK_SIZE)
+        for param in ('x', 'y', 'x_d', 'y_d', 'z_d'):
+            draws[param] = state.randint(0, 51, size)
+        draws['alt'] = state.randint(1, 51, size)
+        draws['wait'] = state.randint(1, 51, BATCH_BLOCK_SIZE)
+        return draws
+
+    # Returns a function building mission <index> of the block.
+    def generate_block(self, mission_type_number, seed, block):
+        draws = self.draw_block(seed, block)
+        if mission_type_number == -1:
+            types = draws['Type']
+        else:
+            types = numpy.full(BATCH_BLOCK_SIZE, mission_type_number, dtype=int)
+        start_x = self.current_model_position.x
+        start_y = self.current_model_position.y
+        x, y, alt = draws['x'], draws['y'], draws['alt']
+        number_of_locations = numpy.where(types == 1, draws['Locations'], 1)
+
+        # Specific intents, location by location. PTP and Extraction use the
+        # first location.
+        specific_time = numpy.zeros((BATCH_BLOCK_SIZE, MAX_LOCATIONS))
+        specific_max = numpy.zeros((BATCH_BLOCK_SIZE, MAX_LOCATIONS))
+        specific_min = numpy.zeros((BATCH_BLOCK_SIZE, MAX_LOCATIONS))
+        specific_time[:, 0] = self.batch_time_from_point_to_point(start_x, start_y, \
+            x[:, 0], y[:, 0])
+        specific_max[:, 0] = alt[:, 0] + 0.3
+        specific_min[:, 0] = alt[:, 0] - 0.3
+        lowest = alt[:, 0] - 0.3
+        highest = alt[:, 0] + 0.3
+        for index in range(1, MAX_LOCATIONS):
+            active = index < number_of_locations
+            current, previous = alt[:, index], alt[:, index - 1]
+            specific_time[:, index] = self.batch_time_from_point_to_point(\
+                x[:, index - 1], y[:, index - 1], x[:, index], y[:, index])
+            up, down = current > previous, current < previous
+            specific_max[:, index] = numpy.where(down, previous + 0.3, current + 0.3)
+            specific_min[:, index] = numpy.where(up, previous - 0.3, current - 0.3)
+            highest = numpy.where(active & up & (current > highest), current + 0.3, \
+                highest)
+            lowest = numpy.where(active & down & (current < lowest), current, lowest)
+
+        # General intents
+        takeoff = self.calculate_time_takeoff(alt[:, 0])
+        land = self.calculate_time_land(alt[:, 0])
+        # MPTP measures every location from the start position, as
+        # calculate_time_for_general_intents does.
+        from_start = self.batch_time_from_point_to_point(start_x, start_y, x, y)
+        from_start = numpy.where(numpy.arange(MAX_LOCATIONS) < \
+            number_of_locations[:, None], from_start, 0)
+        general_time = numpy.zeros(BATCH_BLOCK_SIZE) + takeoff
+        for index in range(MAX_LOCATIONS):
+            general_time = general_time + from_start[:, index]
+        general_time = general_time + land
+        general_max = numpy.where(types == 1, highest, alt[:, 0] + 0.3)
+        general_min = numpy.where(types == 1, lowest, alt[:, 0] - 0.3)
+        extraction = types == 2
+        general_time = numpy.where(extraction, general_time * 2, general_time) + \
+            self.estimator.time_offset(numpy.where(extraction, draws['wait'], 0))
+        general_battery = self.estimator.battery(general_time)
+        back_time = self.batch_time_from_point_to_point(x[:, 0], y[:, 0], start_x, \
+            start_y)
+        specific_battery = self.estimator.battery(specific_time).tolist()
+        back_battery = self.estimator.battery(back_time).tolist()
+
+        columns = dict((name, draws[name].tolist()) for name in ('x', 'y', 'x_d', \
+            'y_d', 'z_d', 'alt', 'wait'))
+        types = types.tolist()
+        number_of_locations = number_of_locations.tolist()
+        specific_time, specific_max, specific_min = specific_time.tolist(), \
+            specific_max.tolist(), specific_min.tolist()
+        general = [array.tolist() for array in (general_time, general_battery, \
+            general_max, general_min)]
+        back_time = back_time.tolist()
+        quality_attributes = self.get_quality_attributes()
+
+        def mission(index):
+            mission_type = types[index]
+            locations = []
+            for location in range(number_of_locations[index]):
+                action_data = dict((param, columns[param][index][location]) for \
+                    param in ('x', 'y', 'x_d', 'y_d', 'z_d', 'alt'))
+                action_data['z'] = action_data['alt']
+                locations.append(action_data)
+            specific = []
+            for location in range(number_of_locations[index]):
+                specific.append({'Time': specific_time[index][location], 'Battery': \
+                    specific_battery[index][location], \
+                    'MaxHeight': specific_max[index][location], \
+                    'MinHeight': specific_min[index][location]})
+            if mission_type == 1:
+                action = {'Type': self.types[1], 'Locations': locations}
+            else:
+                action = dict(locations[0])
+                action['Type'] = self.types[mission_type]
+            if mission_type == 2:
+                action['wait'] = columns['wait'][index]
+                altitude = float(action['alt'])
+                specific.append({'Time': back_time[index], 'Battery': \
+                    back_battery[index], 'MaxHeight': altitude + 0.3, \
+                    'MinHeight': altitude - 0.3})
+            intents = {'General': {'Time': general[0][index], 'Battery': \
+                general[1][index], 'MaxHeight': general[2][index], 'MinHeight': \
+                general[3][index]}, 'Specific': specific}
+            return {'MDescription': {'RobotType': 'Copter', 'LaunchFile': 'None', \
+                'Map': 'None', 'Mission': {'Name': self.name, 'Action': action, \
+                'QualityAttributes': dict(quality_attributes), 'Intents': intents, \
+                'FailureFlags': self.get_failure_flags(intents)}}}
+        return mission
+
+    def batch_time_from_point_to_point(self, from_x, from_y, to_x, to_y):
+        from_x, from_y = numpy.asarray(from_x), numpy.asarray(from_y)
+        to_x, to_y = numpy.asarray(to_x), numpy.asarray(to_y)
+        if from_x.ndim == 1 and to_x.ndim == 2:
+            from_x, from_y = from_x[:, None], from_y[:, None]
+        return self.estimator.go_to_time(numpy.sqrt((from_x - to_x) ** 2 + \
+            (from_y - to_y) ** 2))
@@ -1,21 +1,294 @@
 import json
 import os
 import sys
+import random
+import ReportStore as ReportStore
+import Timing      as Timing
+
+# Reports are read one at a time, so memory does not grow with the size of the
+# report file. Percentiles are computed over a bounded reservoir sample, they
+# are exact as long as a distribution has less than RESERVOIR_SIZE values.
+CHUNK_SIZE     = 1 << 20
+RESERVOIR_SIZE = 10000
+PERCENTILES    = (50, 90, 95, 99)
+MISSION_TYPES  = ('PTP', 'MPTP', 'Extraction')
+INTENTS        = ('Time', 'Battery', 'MaxHeight', 'MinHeight')
+# Callbacks is the number of telemetry callbacks registered in Houston at the
+# end of each mission, it should not change over a campaign.
+DISTRIBUTIONS  = ('OverallTime', 'TotalDistanceTraveled', 'BatteryUsed', \
+    'DistanceError', 'Callbacks')
+WHITESPACE     = ' \t\r\n'
+
+
+# Incremental reader for the legacy {'Reports': {...}} document. It only keeps
+# the part of the file that has not been decoded yet.
+class LegacyReportReader(object):
+
+    def __init__(self, stream):
+        self.stream  = stream
+        self.buffer  = ''
+        self.pos     = 0
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        chunk = self.stream.read(CHUNK_SIZE)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill():
+                break
+        return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('Expected {} at {}'.format(char, self.pos))
+        self.pos += 1
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return value
+            except ValueError:
+                if not self.fill():
+                    raise
+
+    # Yields (id, report) for every entry under 'Reports'.
+    def reports(self):
+        self.expect('{')
+        while self.peek() not in ('}', ''):
+            key = self.decode()
+            self.expect(':')
+            if key != 'Reports':
+                self.decode()
+            else:
+                self.expect('{')
+                while self.peek() != '}':
+                    report_id = self.decode()
+                    self.expect(':')
+                    yield report_id, self.decode()
+                    if self.peek() == ',':
+                        self.pos += 1
+                self.expect('}')
+            if self.peek() == ',':
+                self.pos += 1
+
+
+# Yields (id, report) from either a report.json or a report.jsonl file.
+def iter_reports(report_file):
+    if report_file.endswith('.jsonl'):
+        for record in ReportStore.read_records(report_file):
+            yield record
+    else:
+        with open(report_file) as stream:
+            for record in LegacyReportReader(stream).reports():
+                yield record
+
+
+# Count, min, max, mean and reservoir sampled percentiles of a value stream.
+class Distribution(object):
+
+    def __init__(self, seed = 0):
+        self.count     = 0
+        self.total     = 0.0
+        self.min       = None
+        self.max       = None
+        self.reservoir = []
+        self.random    = random.Random(seed)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if len(self.reservoir) < RESERVOIR_SIZE:
+            self.reservoir.append(value)
+        else:
+            index = self.random.randint(0, self.count - 1)
+            if index < RESERVOIR_SIZE:
+                self.reservoir[index] = value
+
+    def summary(self):
+        if not self.count:
+            return {'Count': 0}
+        values = sorted(self.reservoir)
+        summary = {'Count': self.count, 'Min': self.min, 'Max': self.max, \
+            'Mean': self.total / self.count}
+        for percentile in PERCENTILES:
+            index = int(round((percentile / 100.0) * (len(values) - 1)))
+            summary['P{}'.format(percentile)] = values[index]
+        return summary
+
+
+# Pass/fail counters and distributions of one group of reports.
+class ReportAggregate(object):
+
+    def __init__(self):
+        self.count            = 0
+        self.failure_flags    = [0, 0]
+        # Failed missions ended early by the failure predictor (a 'Prediction'
+        # in the report), see FailurePredictor.
+        self.predicted        = 0
+        self.general_intents  = dict((intent, [0, 0]) for intent in INTENTS)
+        self.specific_intents = dict((intent, [0, 0]) for intent in INTENTS)
+        self.distributions    = dict((name, Distribution()) for name in \
+            DISTRIBUTIONS)
+        # Duration (mission clock) and wall time of each span path, e.g.
+        # 'Takeoff/Climb', see Timing.
+        self.timing           = {}
+
+    def add(self, report):
+        self.count += 1
+        self.failure_flags[report.get('Failure Flags') == 'Success'] += 1
+        if report.get('Prediction') is not None:
+            self.predicted += 1
+        general = report.get('Genral-Intents') or {}
+        for intent in INTENTS:
+            self.general_intents[intent][intent not in general] += 1
+        for action_intents in report.get('Specific-Intents') or []:
+            for intent in INTENTS:
+                self.specific_intents[intent][intent not in action_intents] += 1
+        self.distributions['OverallTime'].add(float(report['OverallTime']))
+        self.distributions['TotalDistanceTraveled'].add(float(\
+            report['TotalDistanceTraveled']))
+        battery_used = get_battery_used(report)
+        if battery_used is not None:
+            self.distributions['BatteryUsed'].add(battery_used)
+        if report.get('Callbacks') is not None:
+            self.distributions['Callbacks'].add(report['Callbacks'])
+        for action, output in (report.get('ActionOutput') or {}).items():
+            if action.startswith('GoTo') and 'DistanceTraveled' in output:
+                traveled = output['DistanceTraveled']
+                self.distributions['DistanceError'].add(float(traveled['Traveled'])\
+                    - float(traveled['Expected']))
+        for path, span in Timing.iter_spans(report.get('Timing') or []):
+            if span['Duration'] is None:
+                continue
+            if path not in self.timing:
+                self.timing[path] = (Distribution(), Distribution())
+            self.timing[path][0].add(span['Duration'])
+            self.timing[path][1].add(span['Wall'])
+
+    def summary(self):
+        summary = {'Count': self.count}
+        summary['FailureFlags'] = pass_fail_summary(self.failure_flags)
+        summary['PredictedFailures'] = self.predicted
+        summary['General-Intents'] = dict((intent, pass_fail_summary(counts)) \
+            for intent, counts in self.general_intents.items())
+        summary['Specific-Intents'] = dict((intent, pass_fail_summary(counts)) \
+            for intent, counts in self.specific_intents.items())
+        for name, distribution in self.distributions.items():
+            summary[name] = distribution.summary()
+        summary['Timing'] = dict((path, {'Duration': duration.summary(), 'Wall': \
+            wall.summary()}) for path, (duration, wall) in self.timing.items())
+        return summary
+
+
+# counts is [failed, passed]
+def pass_fail_summary(counts):
+    total = counts[0] + counts[1]
+    return {'Pass': counts[1], 'Fail': counts[0], 'PassRate': \
+        (float(counts[1]) / total) if total else None}
+
+
+# Battery used is the last battery sample of the quality attributes, which are
+# either columns ({'Battery': [...]}) or, in older reports, a list of samples.
+def get_battery_used(report):
+    quality_attributes = report.get('QualityAttributes')
+    if not quality_attributes:
+        return None
+    if isinstance(quality_attributes, dict):
+        if not quality_attributes.get('Battery'):
+            return None
+        return float(quality_attributes['Battery'][-1])
+    return float(quality_attributes[-1]['Battery'])
+
 
 class ReportAnalyzer(object):
 
-    def __init__(self, report):
-        self.report = report
+    def __init__(self, report_file):
+        self.report_file = report_file
 
-    def analyze(self):
-        counts = {'PTP': {}, 'MPTP': {}, 'Extraction': {}}
-        count = 0
-        for report in self.report['Reports']:
-            count += 1
-            counts[self.report['Reports'][report]['MissionType']][report] = self.report['Reports'][report]
+    def analyze(self, as_json = False):
+        aggregates = {'All': ReportAggregate()}
+        for mission_type in MISSION_TYPES:
+            aggregates[mission_type] = ReportAggregate()
+        # Spans timed once the reports were written, see ReportStore.
+        report_timing = ReportStore.read_timing(self.report_file)
+        for report_id, report in iter_reports(self.report_file):
+            spans = report_timing.get(int(report_id))
+            if spans:
+                report['Timing'] = (report.get('Timing') or []) + spans
+            aggregates['All'].add(report)
+            mission_type = report['MissionType']
+            if mission_type not in aggregates:
+                aggregates[mission_type] = ReportAggregate()
+            aggregates[mission_type].add(report)
+        summary = dict((name, aggregate.summary()) for name, aggregate in \
+            aggregates.items())
 
-        print 'PTP:        {}'.format(len(counts['PTP']))
-        print 'MPTP:       {}'.format(len(counts['MPTP']))
-        print 'Extraction: {}'.format(len(counts['Extraction']))
+        if as_json:
+            print json.dumps(summary, sort_keys=True, indent=4)
+            return summary
+        print 'PTP:        {}'.format(aggregates['PTP'].count)
+        print 'MPTP:       {}'.format(aggregates['MPTP'].count)
+        print 'Extraction: {}'.format(aggregates['Extraction'].count)
         print '---------------'
-        print 'Total:      {}'.format(count)
+        print 'Total:      {}'.format(aggregates['All'].count)
+        for name in sorted(summary):
+            if not summary[name]['Count']:
+                continue
+            print ''
+            print '== {} =='.format(name)
+            self.print_pass_fail('Failure flags', summary[name]['FailureFlags'])
+            if summary[name]['PredictedFailures']:
+                print '{:<28} {}'.format('Predicted failures', \
+                    summary[name]['PredictedFailures'])
+            for kind in ('General-Intents', 'Specific-Intents'):
+                for intent in INTENTS:
+                    self.print_pass_fail('{} {}'.format(kind, intent), \
+                        summary[name][kind][intent])
+            for distribution in DISTRIBUTIONS:
+                self.print_distribution(distribution, summary[name][distribution])
+            self.print_timing(summary[name]['Timing'])
+        return summary
+
+    # Mean time spent in each span, on the mission clock and on the wall clock,
+    # and its share of the time of all the top level spans.
+    def print_timing(self, timing):
+        if not timing:
+            return
+        totals = dict((path, span['Duration']['Mean'] * span['Duration']['Count']) \
+            for path, span in timing.items())
+        total = sum(totals[path] for path in totals if '/' not in path)
+        print '{:<28} {:>8} {:>10} {:>10} {:>7}'.format('Timing', 'count', \
+            'mean (s)', 'wall (s)', 'share')
+        for path in sorted(timing, key=lambda path: (path.split('/')[0] in \
+            ('Report', 'Write'), path)):
+            duration = timing[path]['Duration']
+            print '  {:<26} {:>8} {:>10.3f} {:>10.3f} {:>6.1f}%'.format(path, \
+                duration['Count'], duration['Mean'], timing[path]['Wall']['Mean'], \
+                100.0 * totals[path] / total if total else 0.0)
+
+    def print_pass_fail(self, label, counts):
+        if counts['PassRate'] is None:
+            return
+        print '{:<28} pass: {:<6} fail: {:<6} rate: {:.3f}'.format(label, \
+            counts['Pass'], counts['Fail'], counts['PassRate'])
+
+    def print_distribution(self, label, distribution):
+        if not distribution['Count']:
+            return
+        print '{:<28} {}'.format(label, '  '.join('{}: {:.2f}'.format(key, \
+            distribution[key]) for key in ['Min'] + ['P{}'.format(p) for p in \
+            PERCENTILES] + ['Max']))
@@ -0,0 +1,141 @@
+import errno
+import json
+import os
+
+# Append-only mission report storage. Each mission report is one JSON line,
+# {"Id": <n>, "Report": {...}}, written and fsync'ed when the mission commits,
+# so the cost per mission does not depend on the size of the campaign and a
+# crash can at most lose the line being written.
+
+STREAM_REPORT_NAME = 'report.jsonl'
+LEGACY_REPORT_NAME = 'report.json'
+# Timing spans of a report known only once it is written (the write itself),
+# one {"Id": <n>, "Timing": [...]} line per report, next to the report.
+REPORT_TIMING_NAME = 'report_timing.jsonl'
+
+_stores = {}
+
+
+# Returns the store of a given path, so the record count is only computed once
+# per process.
+def get_store(path):
+    if path not in _stores:
+        _stores[path] = StreamingReportStore(path)
+    return _stores[path]
+
+
+class StreamingReportStore(object):
+
+    def __init__(self, path):
+        self.path  = path
+        self.count = None
+
+    # Drops a partially written last line (e.g. crash in the middle of a
+    # write) and counts the records already present.
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            try:
+                os.makedirs(directory)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+        self.count = 0
+        if not os.path.exists(self.path):
+            return
+        valid_size = 0
+        with open(self.path, 'rb') as stream:
+            for line in stream:
+                if not line.endswith('\n'):
+                    break
+                valid_size += len(line)
+                self.count += 1
+        if valid_size != os.path.getsize(self.path):
+            with open(self.path, 'r+b') as stream:
+                stream.truncate(valid_size)
+
+    # Id the next appended report gets.
+    def next_id(self):
+        if self.count is None:
+            self.open()
+        return self.count
+
+    # Appends a mission report. Returns its id and the byte offset of its record.
+    def append(self, report_data):
+        if self.count is None:
+            self.open()
+        record = json.dumps({'Id': self.count, 'Report': report_data}, \
+            sort_keys=True)
+        with open(self.path, 'ab') as stream:
+            stream.seek(0, os.SEEK_END)
+            offset = stream.tell()
+            stream.write(record + '\n')
+            stream.flush()
+            os.fsync(stream.fileno())
+        report_id = self.count
+        self.count += 1
+        return report_id, offset
+
+
+def timing_path(report_path):
+    return os.path.join(os.path.dirname(report_path), REPORT_TIMING_NAME)
+
+
+# Adds spans to the ones of a report of report_path, see REPORT_TIMING_NAME.
+def append_timing(report_path, report_id, spans):
+    with open(timing_path(report_path), 'ab') as stream:
+        stream.write(json.dumps({'Id': int(report_id), 'Timing': spans}, \
+            sort_keys=True) + '\n')
+
+
+# Spans of the reports of report_path by report id, see REPORT_TIMING_NAME.
+def read_timing(report_path):
+    timing = {}
+    path = timing_path(report_path)
+    if not os.path.exists(path):
+        return timing
+    with open(path, 'rb') as stream:
+        for line in stream:
+            if not line.endswith('\n'):
+                break
+            record = json.loads(line)
+            timing.setdefault(record['Id'], []).extend(record['Timing'])
+    return timing
+
+
+# Yields (id, report) for every complete record of a stream report.
+def read_records(path):
+    with open(path, 'rb') as stream:
+        for line in stream:
+            if not line.endswith('\n'):
+                break
+            record = json.loads(line)
+            yield record['Id'], record['Report']
+
+
+# Byte offset of the record of a given id, None if it is not in the report.
+def find_offset(path, report_id):
+    offset = 0
+    with open(path, 'rb') as stream:
+        for line in stream:
+            if not line.endswith('\n'):
+                break
+            if json.loads(line)['Id'] == report_id:
+                return offset
+            offset += len(line)
+    return None
+
+
+# Writes the legacy {'Reports': {'<id>': {...}}} document from a stream report.
+# Records are written one at a time so memory stays flat.
+def export_legacy(stream_path, json_path):
+    with open(json_path, 'w') as legacy:
+        legacy.write('{\n    "Reports": {')
+        separator = '\n'
+        for report_id, report in read_records(stream_path):
+            data = json.dumps(report, sort_keys=True, indent=4, separators=\
+                (',', ': '))
+            legacy.write('{}        "{}": {}'.format(separator, report_id, \
+                data.replace('\n', '\n        ')))
+            separator = ',\n'
+        legacy.write('\n    }\n}')
@@ -0,0 +1,49 @@
+import collections
+import threading
+
+# Settle detection from the odometry feed. The vehicle is settled once the last
+# window seconds of samples have an RMS speed under speed_tolerance and a
+# position standard deviation (over the three axes) under position_tolerance.
+# The window statistics are running sums, each sample costs O(1).
+
+SETTLE_WINDOW             = 1.0  # seconds
+SETTLE_SPEED_TOLERANCE    = 0.1  # m/s
+SETTLE_POSITION_TOLERANCE = 0.05 # meters
+
+
+class SettleDetector(object):
+
+    def __init__(self, window = SETTLE_WINDOW, speed_tolerance = \
+        SETTLE_SPEED_TOLERANCE, position_tolerance = SETTLE_POSITION_TOLERANCE):
+        self.window             = window
+        self.speed_tolerance    = speed_tolerance
+        self.position_tolerance = position_tolerance
+        self.lock               = threading.Lock()
+        self.samples            = collections.deque()
+        # Sums of x, y, z, x^2, y^2, z^2 and speed^2 over the window.
+        self.sums               = [0.0] * 7
+
+    def update(self, time, x, y, z, vx, vy, vz):
+        sample = (time, (x, y, z, x * x, y * y, z * z, vx * vx + vy * vy + vz * vz))
+        with self.lock:
+            self.samples.append(sample)
+            self.add(sample[1], 1.0)
+            while time - self.samples[0][0] > self.window:
+                self.add(self.samples.popleft()[1], -1.0)
+
+    def add(self, values, sign):
+        sums = self.sums
+        for index in range(7):
+            sums[index] += sign * values[index]
+
+    def settled(self):
+        with self.lock:
+            count = len(self.samples)
+            if count < 2 or self.samples[-1][0] - self.samples[0][0] < \
+                0.9 * self.window:
+                return False
+            sums = self.sums
+            variance = sum(sums[index + 3] / count - (sums[index] / count) ** 2 \
+                for index in range(3))
+            return sums[6] / count <= self.speed_tolerance ** 2 and \
+                variance <= self.position_tolerance ** 2
@@ -0,0 +1,100 @@
+import errno
+import os
+import numpy
+
+# Full rate telemetry of a mission. Every sample the ROSHandler callbacks get is
+# stored, with its time, in preallocated column arrays (one per topic) that
+# double in size when full. Past MAX_SAMPLES a topic keeps its last MAX_SAMPLES
+# samples (ring buffer). At the end of the mission the columns are written to
+# a compressed .npz file.
+
+INITIAL_CAPACITY = 4096
+MAX_SAMPLES      = 1 << 22
+
+# Columns of each topic. Times are on the mission clock.
+TOPICS = {
+    'odom':    ('Time', 'X', 'Y', 'Z', 'VX', 'VY', 'VZ'),
+    'global':  ('Time', 'Latitude', 'Longitude', 'Altitude'),
+    'battery': ('Time', 'Remaining'),
+    'model':   ('Time', 'X', 'Y', 'Z'),
+    # Start of each action: its number and the battery at that time.
+    'actions': ('Time', 'Action', 'Battery'),
+    # Mission events the intents depend on, see EVENTS.
+    'events':  ('Time', 'Event')}
+
+# Codes of the 'events' topic.
+TAKEOFF_REACHED = 0 # the takeoff altitude was reached, min height is checked
+LANDING         = 1 # landing started, min height is no longer checked
+MISSION_OVER    = 2
+
+
+class ColumnBuffer(object):
+
+    def __init__(self, columns, capacity = INITIAL_CAPACITY, max_samples = \
+        MAX_SAMPLES):
+        self.columns     = columns
+        self.max_samples = max_samples
+        self.data        = numpy.empty((len(columns), min(capacity, max_samples)))
+        self.count       = 0
+
+    def append(self, values):
+        capacity = self.data.shape[1]
+        if self.count == capacity and capacity < self.max_samples:
+            data = numpy.empty((len(self.columns), min(2 * capacity, \
+                self.max_samples)))
+            data[:, :capacity] = self.data
+            self.data = data
+            capacity = data.shape[1]
+        self.data[:, self.count % capacity] = values
+        self.count += 1
+
+    # Samples in time order, one row per column.
+    def samples(self):
+        capacity = self.data.shape[1]
+        if self.count <= capacity:
+            return self.data[:, :self.count]
+        split = self.count % capacity
+        return numpy.concatenate((self.data[:, split:], self.data[:, :split]), \
+            axis=1)
+
+
+class TelemetryRecorder(object):
+
+    def __init__(self):
+        self.buffers = dict((topic, ColumnBuffer(columns)) for topic, columns \
+            in TOPICS.items())
+        self.start   = None
+
+    def record(self, topic, values):
+        self.buffers[topic].append(values)
+
+    def dump(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            try:
+                os.makedirs(directory)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+        arrays = {'Start': numpy.array([self.start if self.start is not None \
+            else numpy.nan])}
+        for topic, buffer in self.buffers.items():
+            arrays[topic] = buffer.samples()
+            arrays[topic + '_columns'] = numpy.array(buffer.columns)
+            arrays[topic + '_dropped'] = numpy.array([max(buffer.count - \
+                buffer.data.shape[1], 0)])
+        numpy.savez_compressed(path, **arrays)
+
+
+# Reads a file written by TelemetryRecorder.dump. Returns the start time and a
+# dict topic -> dict column -> array. Topics missing from older files are empty.
+def load(path):
+    archive = numpy.load(path)
+    telemetry = {}
+    for topic, columns in TOPICS.items():
+        if topic not in archive.files:
+            telemetry[topic] = dict((column, numpy.empty(0)) for column in columns)
+            continue
+        columns = [str(column) for column in archive[topic + '_columns']]
+        telemetry[topic] = dict(zip(columns, archive[topic]))
+    return float(archive['Start'][0]), telemetry
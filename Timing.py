@@ -0,0 +1,73 @@
+import contextlib
+import threading
+import time
+
+# Hierarchical timing spans. Each span records its start (relative to the
+# recorder origin) and duration on the mission clock, and its wall clock
+# duration, so time spent waiting for the vehicle can be told apart from time
+# spent in Houston itself. Spans opened while another one is open on the same
+# thread are its children.
+
+
+class Span(object):
+
+    def __init__(self, name, start, wall_start):
+        self.name       = name
+        self.start      = start
+        self.wall_start = wall_start
+        self.duration   = None
+        self.wall       = None
+        self.children   = []
+
+    def to_report(self, origin):
+        report = {'Name': self.name, 'Start': self.start - origin, 'Duration': \
+            self.duration, 'Wall': self.wall}
+        if self.children:
+            report['Children'] = [child.to_report(origin) for child in \
+                self.children]
+        return report
+
+
+class SpanRecorder(object):
+
+    def __init__(self, clock, origin = None):
+        self.clock  = clock
+        self.origin = clock.now() if origin is None else origin
+        self.roots  = []
+        self.lock   = threading.Lock()
+        self.local  = threading.local()
+
+    @contextlib.contextmanager
+    def span(self, name):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        span = Span(name, self.clock.now(), time.time())
+        if stack:
+            stack[-1].children.append(span)
+        else:
+            with self.lock:
+                self.roots.append(span)
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            stack.pop()
+            span.duration = self.clock.now() - span.start
+            span.wall = time.time() - span.wall_start
+
+    # Closed and open spans, open ones without durations.
+    def to_report(self):
+        with self.lock:
+            roots = list(self.roots)
+        return [span.to_report(self.origin) for span in roots]
+
+
+# Yields (path, span) for every span of a report's 'Timing', the path being the
+# names from the root span joined with '/'.
+def iter_spans(spans, prefix = ''):
+    for span in spans:
+        path = prefix + span['Name']
+        yield path, span
+        for child in iter_spans(span.get('Children', []), path + '/'):
+            yield child
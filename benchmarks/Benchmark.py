@@ -0,0 +1,213 @@
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import timeit
+
+# Shared pieces of the benchmark scripts: timing of calls, summaries of the
+# latencies, JSON results and the comparison against a stored baseline.
+# Every time is in seconds, measured with timeit.default_timer. Baselines are
+# stored per machine in baselines/ (not committed), and only compared with runs
+# of the machine, Python and settings they were recorded with: the settings
+# change the work measured (e.g. batch and report sizes).
+
+PERCENTILES       = (50, 90, 99)
+BASELINE_FOLDER   = os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    'baselines')
+# A case regresses when its best latency grows by more than this fraction.
+DEFAULT_TOLERANCE = 0.25
+TIMER             = timeit.default_timer
+BATCH_SIZE        = 50
+
+
+# Makes the Houston modules importable from benchmarks/. houston has to be
+# imported after RandomMissionGenerator, which imports it back.
+def import_houston():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    import RandomMissionGenerator
+    import houston
+    return houston
+
+
+# Calls function once per argument tuple, in batches of batch calls, and returns
+# the mean latency of the calls of each batch. A single call of the hot path
+# lasts about as long as the timer resolution, so calls are not timed alone.
+def measure(function, arguments, batch = BATCH_SIZE):
+    latencies = []
+    for first in range(0, len(arguments), batch):
+        chunk = arguments[first:first + batch]
+        start = TIMER()
+        for args in chunk:
+            function(*args)
+        latencies.append((TIMER() - start) / len(chunk))
+    return latencies
+
+
+# Calls function repeat times without arguments, see measure.
+def measure_repeat(function, repeat, batch = BATCH_SIZE):
+    return measure(function, [()] * repeat, batch)
+
+
+# measure_repeat and the calibration of the machine just before it, as
+# (latencies, calibration), see summarize.
+def measure_calibrated(function, repeat, batch = BATCH_SIZE):
+    calibration = calibrate()
+    return measure_repeat(function, repeat, batch), calibration
+
+
+# Latency percentiles of the batches, count is the number of calls. With a
+# calibration, the best latency relative to it, see regressions.
+def summarize(latencies, count = None, items = None, calibration = None):
+    values = sorted(latencies)
+    count = count if count is not None else len(values)
+    total = sum(values) * count / len(values)
+    summary = {'Count': count, 'Total': total, 'Mean': total / count, \
+        'Min': values[0], 'Max': values[-1]}
+    for percentile in PERCENTILES:
+        index = int(round((percentile / 100.0) * (len(values) - 1)))
+        summary['P{}'.format(percentile)] = values[index]
+    # Calls, or items (e.g. missions, reports) when given, per second.
+    summary['PerSecond'] = (items if items is not None else count) / total \
+        if total else None
+    if calibration is not None:
+        summary['Relative'] = values[0] / calibration
+    return summary
+
+
+# Fixed pure Python work the latencies are calibrated with, see regressions.
+def reference_work():
+    values = {}
+    for index in range(32):
+        values[index] = float(index) * 0.5
+    return sum(values.values())
+
+
+def calibrate(repeat = 20000):
+    return min(measure_repeat(reference_work, repeat))
+
+
+# Host name, CPU model and number of CPUs. Host names alone are often the same
+# on different virtual machines.
+def machine():
+    cpu = platform.processor()
+    if os.path.exists('/proc/cpuinfo'):
+        with open('/proc/cpuinfo') as stream:
+            for line in stream:
+                if line.startswith('model name'):
+                    cpu = line.split(':', 1)[1].strip()
+                    break
+    return '{} ({}, {} CPUs)'.format(platform.node(), cpu or 'unknown CPU', \
+        multiprocessing.cpu_count())
+
+
+def results(benchmark, cases, settings):
+    return {'Benchmark': benchmark, 'Python': platform.python_version(), \
+        'Machine': machine(), 'Settings': settings, 'Cases': cases, \
+        'Calibration': calibrate()}
+
+
+def baseline_path(benchmark):
+    return os.path.join(BASELINE_FOLDER, '{}.json'.format(benchmark))
+
+
+def save_baseline(benchmark_results):
+    path = baseline_path(benchmark_results['Benchmark'])
+    if not os.path.isdir(BASELINE_FOLDER):
+        os.makedirs(BASELINE_FOLDER)
+    with open(path, 'w') as stream:
+        json.dump(benchmark_results, stream, sort_keys=True, indent=4)
+    return path
+
+
+def load_baseline(benchmark):
+    path = baseline_path(benchmark)
+    if not os.path.exists(path):
+        return None
+    with open(path) as stream:
+        return json.load(stream)
+
+
+# Why the baseline cannot be compared with the results, None when it can.
+def baseline_mismatch(benchmark_results, baseline):
+    for key in ('Machine', 'Python', 'Settings'):
+        if baseline.get(key) != benchmark_results[key]:
+            return 'baseline recorded with {} {}, not {}'.format(key, \
+                baseline.get(key), benchmark_results[key])
+    return None
+
+
+# Cases whose best (Min) latency exceeds the baseline one by more than
+# tolerance, as (case, baseline, current). The best batch is the least affected
+# by the other processes of the machine. To compare runs on machines (or CPU
+# frequencies) of different speed, the latencies are taken relative to the
+# calibration: the one of the case (or of its round) when it has a 'Relative'
+# latency, otherwise the one of the run. Paced cases, timed call by call while
+# other threads run, are too noisy to be compared.
+def regressions(benchmark_results, baseline, tolerance = DEFAULT_TOLERANCE):
+    found = []
+    for case, summary in sorted(benchmark_results['Cases'].items()):
+        reference = baseline['Cases'].get(case)
+        if not reference or 'Min' not in summary or 'Min' not in reference or \
+            summary.get('Paced'):
+            continue
+        if 'Relative' in summary and 'Relative' in reference:
+            current, expected = summary['Relative'], reference['Relative']
+        else:
+            current = summary['Min'] / benchmark_results['Calibration']
+            expected = reference['Min'] / baseline['Calibration']
+        if current > expected * (1.0 + tolerance):
+            found.append((case, expected, current))
+    return found
+
+
+def print_cases(benchmark_results):
+    print '{:<40} {:>9} {:>12} {:>10} {:>10} {:>10} {:>10}'.format('Case', \
+        'count', 'per second', 'Min (us)', 'P50 (us)', 'P90 (us)', 'P99 (us)')
+    for case, summary in sorted(benchmark_results['Cases'].items()):
+        if 'P50' not in summary:
+            continue
+        print '{:<40} {:>9} {:>12.0f} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f}'.\
+            format(case, summary['Count'], summary['PerSecond'] or 0.0, \
+            summary['Min'] * 1e6, summary['P50'] * 1e6, summary['P90'] * 1e6, \
+            summary['P99'] * 1e6)
+
+
+# Prints the results (as JSON with as_json), saves them as the new baseline or
+# compares them with the stored one. Returns the exit status, 1 on regression.
+def report(benchmark_results, as_json, update_baseline, tolerance):
+    if as_json:
+        print json.dumps(benchmark_results, sort_keys=True, indent=4)
+    else:
+        print_cases(benchmark_results)
+    if update_baseline:
+        sys.stderr.write('Baseline written to {}\n'.format(save_baseline(\
+            benchmark_results)))
+        return 0
+    baseline = load_baseline(benchmark_results['Benchmark'])
+    if baseline is None:
+        sys.stderr.write('No baseline for {}, see --update_baseline\n'.format(\
+            benchmark_results['Benchmark']))
+        return 0
+    mismatch = baseline_mismatch(benchmark_results, baseline)
+    if mismatch is not None:
+        sys.stderr.write('Not compared with the baseline of {}: {}, see \
+--update_baseline\n'.format(benchmark_results['Benchmark'], mismatch))
+        return 0
+    found = regressions(benchmark_results, baseline, tolerance)
+    for case, reference, current in found:
+        sys.stderr.write('REGRESSION {}: {:.3f}, baseline {:.3f} (calibrated \
+latency)\n'.format(case, current, reference))
+    return 1 if found else 0
+
+
+def add_arguments(parser, tolerance = DEFAULT_TOLERANCE):
+    parser.add_argument('--json', action='store_true', default=False, \
+        help='Print the results as JSON.')
+    parser.add_argument('--update_baseline', action='store_true', default=False, \
+        help='Store the results as the baseline of this benchmark.')
+    parser.add_argument('--tolerance', type=float, default=tolerance, \
+        help='Allowed growth of the best latency over the baseline before a case is \
+        reported as a regression.')
@@ -0,0 +1,268 @@
+#!/usr/bin/python2.7
+
+# Micro-benchmarks of the telemetry hot path of a ROSHandler: the subscriber
+# callbacks, the monitor checks and the report sampling. Synthetic Odometry,
+# NavSatFix, BatteryStatus and ModelStates messages are fed straight into the
+# callbacks, no ROS master or simulator is needed.
+#
+#   python benchmarks/hot_path.py [--samples N] [--duration S] [--json]
+#
+# Two parts:
+#   - every callback and check is called --samples times in a row, --rounds
+#     times, giving its latency percentiles and calls per second.
+#   - the four feeds are replayed for --duration seconds at their rates times
+#     --rate_scale while a thread runs the monitor loop of the ROSHandler
+#     (run_monitor), giving the samples per second delivered and the CPU use of
+#     the monitor checks and of the whole process.
+# Results are compared with baselines/hot_path.json when it was recorded on
+# this machine with the same settings, see Benchmark.
+
+import argparse
+import json
+import math
+import os
+import sys
+import thread
+import threading
+import time
+import Benchmark as Benchmark
+
+houston = Benchmark.import_houston()
+import KinematicSimulator as KinematicSimulator
+
+Message = KinematicSimulator.Message
+
+MISSION_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(\
+    __file__))), 'mission_examples', 'multiple_point_to_point.json')
+FEED_RATES   = dict((topic, KinematicSimulator.FEED_RATES[topic]) for topic in \
+    ('odom', 'global', 'battery', 'model'))
+
+
+# Position and velocity of sample i of a synthetic flight: a 20 m circle at
+# 15 m, climbing from 12 m over the first 100 samples. It stays within the
+# failure flags of the mission, which would make the monitor land.
+def trajectory(i, rate):
+    t = i / rate
+    z = 12.0 + min(i / 100.0, 1.0) * 3.0
+    x, y = 20.0 * math.cos(0.1 * t), 20.0 * math.sin(0.1 * t)
+    return (x, y, z), (-2.0 * math.sin(0.1 * t), 2.0 * math.cos(0.1 * t), 0.0)
+
+
+def odometry(i):
+    (x, y, z), (vx, vy, vz) = trajectory(i, FEED_RATES['odom'])
+    return Message(pose=Message(pose=Message(position=KinematicSimulator.point(\
+        x, y, z))), twist=Message(twist=Message(linear=KinematicSimulator.point(\
+        vx, vy, vz))))
+
+
+def nav_sat_fix(i):
+    (x, y, z), velocity = trajectory(i, FEED_RATES['global'])
+    latitude, longitude = houston.HOME_PLANE.to_lat_long(x, y)
+    return Message(latitude=latitude, longitude=longitude, altitude=z + 584.0)
+
+
+def battery_status(i):
+    return Message(remaining=1.0 - 0.0001 * i)
+
+
+def model_states(i):
+    (x, y, z), velocity = trajectory(i, FEED_RATES['model'])
+    # Gazebo frame, see ros_monitor_callback_model_position_gazebo
+    return Message(name=['ground_plane', houston.ROBOT_MODEL_NAME], pose=[\
+        Message(position=KinematicSimulator.point(0, 0, 0)), \
+        Message(position=KinematicSimulator.point(y, -x, z))])
+
+
+MESSAGES = {'odom': odometry, 'global': nav_sat_fix, 'battery': battery_status, \
+    'model': model_states}
+
+
+def load_mission():
+    with open(MISSION_FILE) as stream:
+        return houston.Mission(json.load(stream)['MDescription'])
+
+
+# Monitor trigger adding up the time the monitor loop spends outside of wait,
+# in its checks.
+class TimedTrigger(houston.MonitorTrigger):
+
+    def __init__(self):
+        houston.MonitorTrigger.__init__(self)
+        self.busy    = 0.0
+        self.checks  = 0
+        self.resumed = None
+
+    def wait(self):
+        if self.resumed is not None:
+            self.busy += Benchmark.TIMER() - self.resumed
+            self.checks += 1
+        due = houston.MonitorTrigger.wait(self)
+        self.resumed = Benchmark.TIMER()
+        return due
+
+
+# A ROSHandler set up like ros_monitor does (prepare_monitor), without the
+# subscribers, flying the first action after its takeoff. With record_telemetry
+# the samples also go to a TelemetryRecorder, with predict_failures the monitor
+# feeds a FailurePredictor tracking a step that gets 2 m/s closer to its target.
+def make_handler(record_telemetry, predict_failures):
+    mission = load_mission()
+    houston.RECORD_TELEMETRY = record_telemetry
+    houston.PREDICT_FAILURES = predict_failures
+    ros = houston.ROSHandler('mavros')
+    ros.monitor_trigger = TimedTrigger()
+    ros.ros_set_mission_info(mission, True, False)
+    mission_info = mission.mission_info
+    ros.prepare_monitor(mission_info['QualityAttributes'], mission_info[\
+        'Intents'], mission_info['FailureFlags'])
+    ros.ros_monitor_callback_battery(battery_status(0))
+    ros.ros_monitor_callback_global_position(nav_sat_fix(0))
+    ros.ros_monitor_callback_odom_local_position(odometry(0))
+    ros.ros_update_current_action(0)
+    ros.ros_takeoff_reached()
+    start = houston.CLOCK.now()
+    ros.track_target('Fly', lambda: 1000.0 - 2.0 * (houston.CLOCK.now() - start))
+    return ros
+
+
+def callbacks(ros):
+    return {'odom': ros.ros_monitor_callback_odom_local_position, 'global': \
+        ros.ros_monitor_callback_global_position, 'battery': \
+        ros.ros_monitor_callback_battery, 'model': \
+        ros.ros_monitor_callback_model_position_gazebo}
+
+
+# Latencies of every callback and check, see Benchmark.measure. Each round uses
+# a new ROSHandler and measures all the cases again, so a slow period of the
+# machine does not hit a single case, and the round is calibrated, see
+# Benchmark.regressions.
+def benchmark_calls(samples, rounds, record_telemetry, predict_failures):
+    latencies = {}
+    relative = {}
+    for round_number in range(rounds):
+        calibration = Benchmark.calibrate()
+        for case, case_latencies in measure_calls(samples, record_telemetry, \
+            predict_failures).items():
+            latencies.setdefault(case, []).extend(case_latencies)
+            relative.setdefault(case, []).append(min(case_latencies) / \
+                calibration)
+    # Median over the rounds of the calibrated best latency.
+    return dict((case, dict(Benchmark.summarize(case_latencies, samples * \
+        rounds), Relative=sorted(relative[case])[rounds // 2])) for case, \
+        case_latencies in latencies.items())
+
+
+def measure_calls(samples, record_telemetry, predict_failures):
+    latencies = {}
+    ros = make_handler(record_telemetry, predict_failures)
+    for topic, callback in callbacks(ros).items():
+        messages = [(MESSAGES[topic](i),) for i in range(samples)]
+        latencies['callback/{}'.format(topic)] = Benchmark.measure(callback, \
+            messages)
+    checks = {'check_failure_flags': ros.check_failure_flags, \
+        'check_predicted_failure': ros.check_predicted_failure, \
+        'check_general_intents': ros.check_general_intents, \
+        'check_specific_intents': ros.check_specific_intents, \
+        'get_quality_attributes': ros.get_quality_attributes, \
+        'get_current_x_y': ros.get_current_x_y, \
+        'evaluate': ros.evaluate}
+    # Sampled every call instead of every ReportRate seconds.
+    ros.report.report_period = 0.0
+    checks['update_quality_attributes_report'] = \
+        ros.report.update_quality_attributes_report
+    for name, check in checks.items():
+        latencies['check/{}'.format(name)] = Benchmark.measure_repeat(check, \
+            samples)
+    points = [((float(i), 2.0 * i, 0.5), (float(-i), 1.0, 3.0 * i)) for i in \
+        range(samples)]
+    latencies['euclidean'] = Benchmark.measure(houston.euclidean, points)
+    return latencies
+
+
+def monitor(ros, done):
+    try:
+        ros.run_monitor()
+    finally:
+        done.set()
+
+
+def benchmark_feeds(duration, rate_scale, record_telemetry, predict_failures):
+    ros = make_handler(record_telemetry, predict_failures)
+    feeds = callbacks(ros)
+    rates = dict((topic, rate * rate_scale) for topic, rate in FEED_RATES.items())
+    next_sample = dict((topic, 0) for topic in rates)
+    latencies = dict((topic, []) for topic in rates)
+    done = threading.Event()
+    thread.start_new_thread(monitor, (ros, done))
+    cpu_start = os.times()
+    start = time.time()
+    while True:
+        elapsed = time.time() - start
+        if elapsed >= duration:
+            break
+        # Next sample due, of any topic.
+        topic = min(rates, key=lambda topic: next_sample[topic] / rates[topic])
+        due = next_sample[topic] / rates[topic]
+        if due > elapsed:
+            time.sleep(due - elapsed)
+        message = MESSAGES[topic](next_sample[topic])
+        call_start = Benchmark.TIMER()
+        feeds[topic](message)
+        latencies[topic].append(Benchmark.TIMER() - call_start)
+        next_sample[topic] += 1
+    elapsed = time.time() - start
+    ros.ros_set_mission_over()
+    done.wait(1.0)
+    cpu_end = os.times()
+    if ros.report.failure_flags_report != 'Success':
+        sys.stderr.write('Monitor failed the mission: {}\n'.format(\
+            ros.report.failure_flags_report))
+    cases = {}
+    for topic in rates:
+        cases['feed/{}'.format(topic)] = dict(Benchmark.summarize(\
+            latencies[topic]), Rate=len(latencies[topic]) / elapsed, Paced=True)
+    cases['feed/all'] = {'SamplesPerSecond': sum(next_sample.values()) / \
+        elapsed, 'MonitorChecks': ros.monitor_trigger.checks, 'MonitorCpu': \
+        ros.monitor_trigger.busy / elapsed, \
+        'ProcessCpu': ((cpu_end[0] - cpu_start[0]) + (cpu_end[1] - cpu_start[1])) \
+        / elapsed}
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hot path micro-benchmarks.')
+    parser.add_argument('--samples', type=int, default=10000, help='Calls of \
+        each callback and check per round.')
+    parser.add_argument('--rounds', type=int, default=5, help='Rounds of calls.')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds \
+        the feeds are replayed at their rates, 0 to skip.')
+    parser.add_argument('--rate_scale', type=float, default=1.0, help='Feed rates \
+        are the simulator ones ({}) times this.'.format(', '.join('{} {:g} Hz'.\
+        format(topic, rate) for topic, rate in sorted(FEED_RATES.items()))))
+    parser.add_argument('-t', '--record_telemetry', action='store_true', \
+        default=False, help='Record the samples like houston -t.')
+    parser.add_argument('--predict_failures', action='store_true', default=\
+        False, help='Predict failures like houston --predict_failures.')
+    Benchmark.add_arguments(parser)
+    args = parser.parse_args()
+    houston.Logger.set_level('ERROR')
+    cases = benchmark_calls(args.samples, args.rounds, args.record_telemetry, \
+        args.predict_failures)
+    if args.duration > 0:
+        cases.update(benchmark_feeds(args.duration, args.rate_scale, \
+            args.record_telemetry, args.predict_failures))
+    results = Benchmark.results('hot_path', cases, {'Samples': args.samples, \
+        'Rounds': args.rounds, 'Duration': args.duration, 'RateScale': args.rate_scale, \
+        'RecordTelemetry': args.record_telemetry, 'PredictFailures': \
+        args.predict_failures})
+    status = Benchmark.report(results, args.json, args.update_baseline, \
+        args.tolerance)
+    if not args.json and 'feed/all' in cases:
+        feeds = cases['feed/all']
+        print 'Feeds: {:.0f} samples/s, {} monitor checks, monitor CPU {:.2f}%, \
+process CPU {:.2f}%'.format(feeds['SamplesPerSecond'], feeds['MonitorChecks'], \
+            100.0 * feeds['MonitorCpu'], 100.0 * feeds['ProcessCpu'])
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/python2.7
+
+# Benchmarks of the parts of a campaign that do not touch ROS: mission
+# generation, report writing and reading, and report analysis, at increasing
+# sizes. Reports are synthetic, with the schema of the ones Houston writes.
+#
+#   python benchmarks/pipeline.py [--sizes N ...] [--json]
+#
+# Cases are named <step>/<size>, e.g. analyze/jsonl/10000, so the scaling of
+# each step can be followed between releases from the JSON results. Results
+# are compared with baselines/pipeline.json when it was recorded on this
+# machine with the same settings, see Benchmark. The default sizes take about a
+# minute, --sizes 1000 10000 100000 several.
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import Benchmark as Benchmark
+
+houston = Benchmark.import_houston()
+import KinematicSimulator     as KinematicSimulator
+import RandomMissionGenerator as RandomMissionGenerator
+import ReportAnalyzer         as ReportAnalyzer
+import ReportStore            as ReportStore
+
+MISSION_FILE  = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(\
+    __file__))), 'mission_examples', 'multiple_point_to_point.json')
+MISSION_TYPES = ('PTP', 'MPTP', 'EXTR', 'RDM')
+REPORT_TYPES  = ('PTP', 'MPTP', 'Extraction')
+FORMATS       = ('jsonl', 'json')
+TOLERANCE     = 0.5
+
+
+# Report number index of a campaign, with ActionOutput, quality attribute
+# columns and Timing spans sized like the ones of a flown mission.
+def synthetic_report(index):
+    rng = random.Random(index)
+    mission_type = REPORT_TYPES[index % len(REPORT_TYPES)]
+    locations = rng.randint(1, 10) if mission_type == 'MPTP' else 1
+    action_output = {'Takeoff': {'Time': rng.uniform(5, 20), 'Output': [True, \
+        15.0], 'SettleTime': rng.uniform(0, 5)}}
+    for location in range(locations):
+        action_output['GoTo_{}'.format(location)] = {'Time': rng.uniform(10, 100), \
+            'Output': True, 'Goal': {'From': {'x': 0.0, 'y': 0.0, 'z': 15.0}, \
+            'To': {'x': rng.uniform(0, 50), 'y': rng.uniform(0, 50), 'z': 15.0}}, \
+            'DistanceTraveled': {'Expected': rng.uniform(0, 70), 'Traveled': \
+            rng.uniform(0, 70)}, 'SettleTime': rng.uniform(0, 5)}
+    action_output['Land'] = {'Time': rng.uniform(50, 150), 'Output': True, \
+        'SettleTime': rng.uniform(0, 5)}
+    action_output['TotalDistanceTraveled'] = rng.uniform(0, 300)
+    samples = rng.randint(10, 60)
+    quality_attributes = dict((attribute, [rng.uniform(0, 50) for sample in \
+        range(samples)]) for attribute in ('Time',) + houston.QUALITY_ATTRIBUTES)
+    timing = [{'Name': name, 'Start': 0.0, 'Duration': rng.uniform(0, 50), \
+        'Wall': rng.uniform(0, 0.5), 'Children': [{'Name': step, 'Start': 0.0, \
+        'Duration': rng.uniform(0, 20), 'Wall': rng.uniform(0, 0.2)} for step in \
+        ('Command', 'Settle')]} for name in ['Takeoff'] + ['GoTo_{}'.format(\
+        location) for location in range(locations)] + ['Land']]
+    return {'MissionType': mission_type, 'RobotType': 'Copter', 'Map': 'None', \
+        'LaunchFile': 'None', 'OverallTime': str(rng.uniform(30, 400)), \
+        'TotalDistanceTraveled': action_output['TotalDistanceTraveled'], \
+        'QualityAttributes': quality_attributes, 'ActionOutput': action_output, \
+        'Genral-Intents': {'Time': 1.5} if rng.random() < 0.2 else {}, \
+        'Specific-Intents': [{} for location in range(locations)], \
+        'Failure Flags': 'Success' if rng.random() < 0.9 else \
+        'Battery failure flag', 'Timing': timing}
+
+
+# Writes a report of size synthetic missions in the given format.
+def write_reports(path, size, report_format):
+    if report_format == 'json':
+        houston.write_json_report(path, {'Reports': dict((str(index), \
+            synthetic_report(index)) for index in range(size))})
+        return
+    houston.make_parent_dirs(os.path.dirname(path))
+    with open(path, 'wb') as stream:
+        for index in range(size):
+            stream.write(json.dumps({'Id': index, 'Report': synthetic_report(\
+                index)}, sort_keys=True) + '\n')
+
+
+def report_path(folder, name, report_format):
+    return os.path.join(folder, name, ReportStore.STREAM_REPORT_NAME if \
+        report_format == 'jsonl' else ReportStore.LEGACY_REPORT_NAME)
+
+
+def benchmark_generator(count):
+    cases = {}
+    position = KinematicSimulator.point(0, 0, 0)
+    for mission_type in MISSION_TYPES:
+        generator = RandomMissionGenerator.RandomMissionGenerator('random', \
+            position, 0)
+        latencies, calibration = Benchmark.measure_calibrated(lambda: \
+            generator.generate_random_mission(mission_type), count)
+        cases['generate_random_mission/{}'.format(mission_type)] = \
+            Benchmark.summarize(latencies, count, calibration=calibration)
+        latencies, calibration = Benchmark.measure_calibrated(lambda: sum(1 for \
+            mission in generator.generate_missions(mission_type, count, 0)), 1, 1)
+        cases['generate_missions/{}'.format(mission_type)] = dict(\
+            Benchmark.summarize(latencies, 1, count, calibration), Size=count)
+    return cases
+
+
+def benchmark_report_files(folder, sizes, repeat):
+    cases = {}
+    for size in sizes:
+        path = report_path(folder, 'files_{}'.format(size), 'json')
+        report = {'Reports': dict((str(index), synthetic_report(index)) for \
+            index in range(size))}
+        latencies, calibration = Benchmark.measure_calibrated(lambda: \
+            houston.write_json_report(path, report), repeat, 1)
+        cases['write_json_report/{}'.format(size)] = dict(Benchmark.summarize(\
+            latencies, calibration=calibration), Size=size)
+        latencies, calibration = Benchmark.measure_calibrated(lambda: \
+            houston.open_json_file(path), repeat, 1)
+        cases['open_json_file/{}'.format(size)] = dict(Benchmark.summarize(\
+            latencies, calibration=calibration), Size=size)
+    return cases
+
+
+# Report.generate of one mission appended to a report of size missions, in
+# both report modes.
+def benchmark_report_generate(folder, sizes, repeat):
+    cases = {}
+    with open(MISSION_FILE) as stream:
+        mission = houston.Mission(json.load(stream)['MDescription'])
+    mission_info = mission.mission_info
+    ros = houston.ROSHandler('mavros')
+    ros.ros_set_mission_info(mission, True, False)
+    ros.report = houston.Report(ros, mission, len(mission_info['Intents']\
+        ['Specific']), mission_info['QualityAttributes'])
+    ros.report.report_period = 0.0
+    for sample in range(60):
+        ros.report.update_quality_attributes_report()
+    for report_format, mode in (('json', 'json'), ('jsonl', 'stream')):
+        for size in sizes:
+            name = 'generate_{}_{}'.format(mode, size)
+            write_reports(report_path(folder, name, report_format), size, \
+                report_format)
+            houston.OUTPUT_FOLDER = name
+            houston.REPORT_MODE = mode
+            latencies, calibration = Benchmark.measure_calibrated(\
+                ros.report.generate, repeat, 1)
+            cases['Report.generate/{}/{}'.format(mode, size)] = dict(\
+                Benchmark.summarize(latencies, calibration=calibration), Size=size)
+    return cases
+
+
+def benchmark_analyze(folder, sizes, formats):
+    cases = {}
+    for report_format in formats:
+        for size in sizes:
+            path = report_path(folder, 'analyze_{}'.format(size), report_format)
+            write_reports(path, size, report_format)
+            analyzer = ReportAnalyzer.ReportAnalyzer(path)
+            stdout = sys.stdout
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                latencies, calibration = Benchmark.measure_calibrated(lambda: \
+                    analyzer.analyze(), 1, 1)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            cases['analyze/{}/{}'.format(report_format, size)] = dict(\
+                Benchmark.summarize(latencies, 1, size, calibration), Size=size, \
+                Bytes=os.path.getsize(path))
+            os.remove(path)
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline pipeline benchmarks.')
+    parser.add_argument('--missions', type=int, default=2000, help='Missions \
+        generated per mission type.')
+    parser.add_argument('--report_sizes', type=int, nargs='+', default=[10, \
+        100, 1000], help='Missions in the reports written, read and appended \
+        to.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], \
+        help='Missions in the reports analyzed.')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(\
+        FORMATS), help='Formats of the reports analyzed.')
+    parser.add_argument('--repeat', type=int, default=5, help='Repetitions of \
+        the report writes and reads.')
+    # Cases are timed a few times only, and file reads and writes are not
+    # tracked by the calibration.
+    Benchmark.add_arguments(parser, TOLERANCE)
+    args = parser.parse_args()
+    houston.Logger.set_level('ERROR')
+    folder = tempfile.mkdtemp(prefix='houston_benchmark_')
+    cwd = os.getcwd()
+    # Report.generate writes to outputs/<OUTPUT_FOLDER> of the working directory
+    os.chdir(folder)
+    try:
+        cases = benchmark_generator(args.missions)
+        cases.update(benchmark_report_files(folder, args.report_sizes, \
+            args.repeat))
+        cases.update(benchmark_report_generate(os.path.join(folder, 'outputs'), \
+            args.report_sizes, args.repeat))
+        cases.update(benchmark_analyze(folder, args.sizes, args.formats))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(folder)
+    results = Benchmark.results('pipeline', cases, {'Missions': args.missions, \
+        'ReportSizes': args.report_sizes, 'Sizes': args.sizes, 'Formats': \
+        args.formats, 'Repeat': args.repeat})
+    sys.exit(Benchmark.report(results, args.json, args.update_baseline, \
+        args.tolerance))
+
+if __name__ == "__main__":
+    main()
@@ -8,52 +8,255 @@ import json
 import os
 import sys
 import errno
-import thread
+import threading
+import array
 import signal
 import math
+import multiprocessing
+import Queue
 import random
+import numpy
 import RandomMissionGenerator as RandomMissionGenerator
 import ReportAnalyzer         as ReportAnalyzer
+import ReportStore            as ReportStore
+import Campaign               as Campaign
+import KinematicSimulator      as KinematicSimulator
+import Clock                  as Clock
+import Logger                 as Logger
+import IntentEvaluator        as IntentEvaluator
+import TelemetryRecorder      as TelemetryRecorder
+import Geodesy                as Geodesy
+import Odometer               as Odometer
+import Settle                 as Settle
+import Timing                 as Timing
+import MissionEstimator       as MissionEstimator
+import FailurePredictor       as FailurePredictor
 import rospy
 import xmlrpclib
 import argparse
+import cProfile
+import pstats
+import StringIO
 
 
 from gazebo_msgs.msg   import ModelStates
-from geopy             import distance
 from nav_msgs.msg      import Odometry
-from geometry_msgs.msg import PoseStamped
-from mavros_msgs.msg   import BatteryStatus
+from geometry_msgs.msg import PoseStamped, Point
+from mavros_msgs.msg   import BatteryStatus, State
 from sensor_msgs.msg   import NavSatFix
 from mavros_msgs.srv   import CommandLong, SetMode, CommandBool, CommandTOL
 
 HOME_COORDINATES              = (-35.3632607, 149.1652351)
+HOME_PLANE                    = Geodesy.LocalTangentPlane(HOME_COORDINATES)
+# Radius the expected coordinates of a go to are computed with. It differs from
+# Geodesy.EARTH_RADIUS, kept as is so expected distances do not change.
+EXPECTED_COORDINATES_RADIUS   = 6378000.0
 ERROR_LIMIT_DISTANCE          = .3 # 30cm TODO: pick a better name
 TIME_INFORM_RATE              = 10 # seconds. How often log time
-STABLE_BUFFER_TIME            = 5.0  # Seconds time to wait after each command
+STABLE_BUFFER_TIME            = 5.0  # Seconds. Max time to wait after each command for the system to settle
 ROBOT_MODEL_NAME              = 'iris_demo' # name of the model being used in gazebo
+MODEL_POSITION_MAX_AGE        = 1.0 # seconds. Older cached positions are logged as stale
+# 'json' rewrites outputs/<ts>/report.json after each mission. 'stream' appends
+# one record per mission to outputs/<ts>/report.jsonl (see ReportStore).
+REPORT_MODE                   = 'json'
+# Namespace of the MAVROS node. Campaign workers use their own namespace.
+MAVROS_NAMESPACE              = '/mavros'
+# Campaign worker N uses ROS master port ROS_MASTER_BASE_PORT + N * offset, SITL
+# instance N (whose ports ArduPilot shifts by 10 * N) and MAVROS namespace
+# WORKER_NAMESPACE. See test_environment/start_workers.sh.
+ROS_MASTER_BASE_PORT          = 11311
+WORKER_PORT_OFFSET            = 10
+WORKER_NAMESPACE              = '/worker{}/mavros'
+# Results workers send to the parent, (kind, worker, mission), and how often
+# (wall seconds) the parent looks for dead workers when none arrives.
+WORKER_STARTED                = 'started'
+WORKER_DONE                   = 'done'
+WORKER_FAILED                 = 'failed'
+WORKER_POLL_PERIOD            = 1.0
+# rospy, or the KinematicSimulator standing in for MAVROS and Gazebo when
+# running with --simulate (see use_simulator).
+ROS_API                       = rospy
+SIMULATOR                     = None
+# Every timeout, intent and report timestamp is measured on CLOCK, see Clock.py
+# and set_clock.
+CLOCK                         = Clock.WallClock()
+# Writes one log file per mission under outputs/<ts>/logs instead of houston.log
+LOG_PER_MISSION               = False
+# Records every sample of the subscribers to outputs/<ts>/telemetry/<id>.npz
+RECORD_TELEMETRY              = False
+# Brings the vehicle back to a clean state before each mission, see reset_vehicle
+RESET_VEHICLE                 = False
+RESET_TIMEOUT                 = 120.0 # seconds to fly back home, land and get ready
+RESET_ALTITUDE                = 10.0 # meters, climb to go home when landed away
+HOME_TOLERANCE                = 1.0 # meters from home the vehicle is at home
+RESET_MIN_BATTERY             = 0.99 # remaining battery a mission starts with
+# ArduPilot MAV_CMD_BATTERY_RESET, param1 battery mask, param2 remaining percent
+MAV_CMD_BATTERY_RESET         = 42651
+# Seconds to wait for a MAVROS service to come back after its connection was
+# lost, and for the setpoint publisher to get a subscriber.
+SERVICE_TIMEOUT               = 10.0
+PUBLISHER_CONNECTION_TIMEOUT  = 2.0
+# Seconds to wait for the monitor thread to stop at the end of a mission.
+MONITOR_JOIN_TIMEOUT          = 10.0
+# Window and tolerances of the settle detection after each command, see Settle.
+SETTLE_WINDOW                 = Settle.SETTLE_WINDOW
+SETTLE_SPEED_TOLERANCE        = Settle.SETTLE_SPEED_TOLERANCE
+SETTLE_POSITION_TOLERANCE     = Settle.SETTLE_POSITION_TOLERANCE
+# Seconds between quality attribute samples when the mission ReportRate is not
+# a number (e.g. true).
+DEFAULT_REPORT_RATE           = 2.0
+QUALITY_ATTRIBUTES            = ('Battery', 'MaxHeight', 'MinHeight', \
+                                 'DistanceTraveled')
+# Profiles Houston with cProfile, see run_profiled. PROFILE_TOP functions are
+# logged, the full stats are written to outputs/<ts>/PROFILE_NAME.
+PROFILE                       = False
+PROFILE_NAME                  = 'profile.pstats'
+PROFILE_TOP                   = 30
+THREAD_PROFILES               = []
 OUTPUT_FOLDER                 = datetime.datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
-
+# Model of the mission times and battery the random missions are generated
+# with, see --estimator. Reports are added to it as they are written, except in
+# campaign workers, whose reports are added after the merge.
+ESTIMATOR                     = None
+UPDATE_ESTIMATOR              = True
+# Ends a mission when its Time or Battery failure flag is predicted to be
+# crossed before the current step reaches its target, see FailurePredictor.
+PREDICT_FAILURES              = False
+# Minimum rate (Hz) at which the monitor re-checks each signal when no new sample
+# arrives. 'time' covers the time based intents and failure flags, so the worst
+# case detection latency is 1 / min(MONITOR_MIN_CHECK_RATES) seconds. Gazebo
+# publishes model_states at about 1 kHz, so 'model' samples never wake the
+# monitor: the model position is checked with the odom samples and at this rate.
+MONITOR_MIN_CHECK_RATES       = {'battery': 1.0, 'odom': 2.0, 'model': 2.0, \
+                                 'time': 2.0}
+
+
+# Gets the full name of a MAVROS topic or service, e.g. '/battery'.
+def mavros_topic(name):
+    return MAVROS_NAMESPACE + name
 
 # Error needs further handling
-def error(error, quiet, log_in_file):
+def error(error, quiet = False, log_in_file = False):
     log(error, quiet, log_in_file, 'ERROR')
 
-# Logs..
+# Logs.. Messages below the Logger level are discarded. The file is written by
+# the Logger background thread, so logging does not block the caller.
 def log(to_log, quiet, log_in_file, nature = 'LOG'):
+    if not Logger.enabled(nature):
+        return
+    line = '[{}]: {} '.format(nature, to_log)
     if log_in_file:
-        if os.path.exists('houston.log'):
-            a_w = 'a' # append if already exists
-        else:
-            a_w = 'w' # make a new file if not
-        with open('houston.log', a_w) as log_file:
-            log_file.write('[{}]: {} \n'.format(nature, to_log))
+        Logger.write(line)
     if not quiet:
-        print '[{}]: {}'.format(nature, to_log)
+        print line
+
+# Switches between the DEBUG and LOG levels (kill -USR1 <pid>).
+def toggle_debug_handler(signal, frame):
+    Logger.set_level('LOG' if Logger.get_level() == 'DEBUG' else 'DEBUG')
+
+
+# Keeps the latest gazebo model position. A single long-lived subscriber feeds
+# it, so readers never block and never create a subscriber of their own.
+# Listeners (e.g. ROSHandler) get every ModelStates message the cache receives.
+class ModelPositionCache(object):
+    def __init__(self, model_name = ROBOT_MODEL_NAME):
+        self.lock         = threading.Lock()
+        self.model_name   = model_name
+        self.position     = None
+        self.stamp        = None
+        self.subscriber   = None
+        self.listeners    = ()
+        self.first_sample = threading.Event()
+
+    # Creates the subscriber the first time it is called. rospy.init_node has
+    # to be called before.
+    def start(self):
+        with self.lock:
+            if self.subscriber is None:
+                self.subscriber = ROS_API.Subscriber('/gazebo/model_states', \
+                    ModelStates, self.callback, queue_size=10)
+
+    def add_listener(self, listener):
+        with self.lock:
+            self.listeners = self.listeners + (listener,)
+
+    def remove_listener(self, listener):
+        with self.lock:
+            self.listeners = tuple(l for l in self.listeners if l != listener)
+
+    def callback(self, data):
+        position = data.pose[data.name.index(self.model_name)].position
+        with self.lock:
+            self.position = position
+            self.stamp    = CLOCK.now()
+        self.first_sample.set()
+        for listener in self.listeners:
+            listener(data)
+
+    # Non-blocking. Returns the last position and its age in seconds, or
+    # (None, None) if no sample has been received yet.
+    def read(self):
+        with self.lock:
+            if self.stamp is None:
+                return None, None
+            return self.position, CLOCK.now() - self.stamp
+
+    # Blocks until the first sample arrives. Only meant for start up.
+    def wait_for_position(self, timeout):
+        self.first_sample.wait(timeout)
+        return self.read()
+
+
+# Wakes up the monitor when a subscriber callback delivers a new sample, or when
+# the minimum check period of a signal expires. The monitor sleeps in between.
+# Only the odom and battery callbacks notify, see MONITOR_MIN_CHECK_RATES.
+class MonitorTrigger(object):
+    def __init__(self, min_check_rates = MONITOR_MIN_CHECK_RATES):
+        self.condition    = threading.Condition()
+        self.periods      = dict((signal, 1.0 / rate) for signal, rate in \
+            min_check_rates.items())
+        self.last_checked = dict.fromkeys(self.periods, CLOCK.now())
+        self.pending      = set()
+
+    # Called from the subscriber callbacks.
+    def notify(self, signal):
+        with self.condition:
+            self.pending.add(signal)
+            self.condition.notify_all()
+
+    # Adds or changes the minimum check rate of a signal.
+    def set_min_check_rate(self, signal, rate):
+        with self.condition:
+            self.periods[signal] = 1.0 / rate
+            self.last_checked.setdefault(signal, CLOCK.now())
+            self.condition.notify_all()
+
+    def next_deadline(self):
+        return min(self.last_checked[signal] + self.periods[signal] for signal \
+            in self.periods)
+
+    # Blocks until a sample arrives or a check period expires. Returns the set
+    # of signals that have to be re-evaluated.
+    def wait(self):
+        with self.condition:
+            while not self.pending:
+                remaining = self.next_deadline() - CLOCK.now()
+                if remaining <= 0:
+                    break
+                self.condition.wait(CLOCK.to_wall(remaining))
+            now = CLOCK.now()
+            due = self.pending
+            self.pending = set()
+            for signal in self.periods:
+                if signal in due or now - self.last_checked[signal] >= \
+                    self.periods[signal]:
+                    due.add(signal)
+                    self.last_checked[signal] = now
+            return due
 
 
 class ROSHandler(object):
-    def __init__ (self, target):
+    def __init__ (self, target, timing = None):
         self.mission_info               = None
         # Report gets initialized in monitor
         self.report                     = None
@@ -61,7 +264,7 @@ class ROSHandler(object):
         # mission_on to false if the mission has failed.
         self.mission_on                 = True
         self.initial_set                = [False, False, False, False]
-        self.starting_time              = time.time()
+        self.starting_time              = CLOCK.now()
         self.target                     = target
         self.battery                    = [0,0]
         self.min_max_height             = [-1,0]
@@ -80,175 +283,213 @@ class ROSHandler(object):
         # added to hable specific intents (meaning intents to each location or action)
         self.starting_values_current_action = {}
         self.current_action                 = -1
-        self.total_distance_traveled        =  0
+        # Fed by the model position callback, see Odometer
+        self.odometer                       = Odometer.Odometer()
+        # Fed by the odometry callback, see wait_for_settle
+        self.settle_detector                = Settle.SettleDetector(SETTLE_WINDOW, \
+            SETTLE_SPEED_TOLERANCE, SETTLE_POSITION_TOLERANCE)
+        # Compiled in ros_monitor, see compile_intents
+        self.failure_flag_checker           = None
+        self.general_intent_tracker         = None
+        self.specific_intent_trackers       = []
+        self.telemetry                      = None
+        # Fed by the monitor, the action loops set its target, see track_target
+        self.failure_predictor              = None
+        if PREDICT_FAILURES:
+            self.failure_predictor          = FailurePredictor.FailurePredictor(\
+                ERROR_LIMIT_DISTANCE)
+        if RECORD_TELEMETRY:
+            self.telemetry                  = TelemetryRecorder.TelemetryRecorder()
+            self.telemetry.start            = self.starting_time
+        self.monitor_trigger                = MonitorTrigger()
+        # Owns the subscribers and the monitor thread, see MissionSession
+        self.session                        = None
+        # Phases of the mission, written to the report under 'Timing'. Spans
+        # start relative to starting_time.
+        self.timing                         = timing or Timing.SpanRecorder(CLOCK)
+        self.timing.origin                  = self.starting_time
 
     # Checks that MAVROS node is running
     def check_mavros(self):
+        if SIMULATOR is not None:
+            return True
         m = xmlrpclib.ServerProxy(os.environ['ROS_MASTER_URI'])
-        code, status_message, uri = m.lookupNode('/mavros', '/mavros')
+        code, status_message, uri = m.lookupNode(MAVROS_NAMESPACE, MAVROS_NAMESPACE)
         return code == 1
 
-    def update_distance_traveled(self, _from, _to):
-        distance = euclidean(_from, _to)
-        self.total_distance_traveled += distance
-        return distance
-
+    @property
+    def total_distance_traveled(self):
+        return self.odometer.total
 
     # Verifies that the system has reached its correct position by comparing
     # the distance between the current model position and the position where is
     # supposed to be.
     def check_go_to_completion(self, expected_coor, pose, pub):
         position = pose.pose.position
-        local_action_time = time.time()
-        r = rospy.Rate(10)
-        previous_location = get_gazebo_model_positon()
-        remaining_distance = euclidean((position.x, position.y), \
-            (self.current_model_position[0], self.current_model_position[1]))
+        local_action_time = CLOCK.now()
+        r = Clock.Rate(CLOCK, 10)
+        stale_logged = False
+        remaining_distance = math.hypot(position.x - self.current_model_position[0], \
+            position.y - self.current_model_position[1])
         expected_distance = float(remaining_distance)
-        local_distance_traveled = 0
-        while remaining_distance > ERROR_LIMIT_DISTANCE  and self.mission_on:
-            r.sleep()
-            pub.publish(pose)
-
-            current_location = get_gazebo_model_positon()
-            local_distance_traveled += self.update_distance_traveled((\
-                previous_location.x, previous_location.y), (current_location.x, \
-                current_location.y))
-            previous_location = current_location
-
-            local_action_time = \
-                self.timer_log(local_action_time, 2, 'Remaining: {}, Distance traveled: {}'.\
-                format(remaining_distance, self.total_distance_traveled)) # TODO
-            remaining_distance = euclidean((pose.pose.position.x,pose.pose.position.y), \
-                (self.current_model_position[0], self.current_model_position[1]))
+        self.track_target('Fly', lambda: math.hypot(position.x - \
+            self.current_model_position[0], position.y - \
+            self.current_model_position[1]))
+        with self.timing.span('Fly'):
+            while remaining_distance > ERROR_LIMIT_DISTANCE  and self.mission_on:
+                r.sleep()
+                pub.publish(pose)
+
+                current_location, age = MODEL_POSITION_CACHE.read()
+                if age > MODEL_POSITION_MAX_AGE and not stale_logged:
+                    log('Model position is {:.2f}s old'.format(age), self.quiet, \
+                        self.log_in_file, 'WARNING')
+                stale_logged = age > MODEL_POSITION_MAX_AGE
+
+                local_action_time = \
+                    self.timer_log(local_action_time, 2, 'Remaining: {}, Distance traveled: {}'.\
+                    format(remaining_distance, self.total_distance_traveled)) # TODO
+                remaining_distance = math.hypot(position.x - \
+                    self.current_model_position[0], position.y - \
+                    self.current_model_position[1])
+        self.track_target(None)
+        # Distance traveled during this action until the goal was reached (or
+        # the mission ended), the stabilization time is not counted.
+        local_distance_traveled = self.odometer.action()
         # This is done to double check, that the current position is the actual
         # goal position.
         if remaining_distance > ERROR_LIMIT_DISTANCE:
             return (False, position), 'System did not reached location on time',\
-                (expected_distance, local_distance_traveled)
-        time.sleep(STABLE_BUFFER_TIME)
+                (expected_distance, local_distance_traveled, None)
+        settle_time = self.wait_for_settle()
         return (True, position), 'System reached location', (expected_distance,\
-            local_distance_traveled)
+            local_distance_traveled, settle_time)
+
+    # Waits until the odometry shows the system is settled (see Settle), at most
+    # max_wait seconds (STABLE_BUFFER_TIME by default). Returns the time waited.
+    def wait_for_settle(self, max_wait = None):
+        if max_wait is None:
+            max_wait = STABLE_BUFFER_TIME
+        start = CLOCK.now()
+        r = Clock.Rate(CLOCK, 10)
+        with self.timing.span('Settle'):
+            while not self.settle_detector.settled() and self.mission_on and \
+                CLOCK.now() - start < max_wait:
+                r.sleep()
+        return CLOCK.now() - start
 
     # Makes sure that the system has landed.
-    def check_land_completion(self, alt, wait = STABLE_BUFFER_TIME):
-        local_action_time = time.time()
-        self.lock_min_height = True
-        while self.current_model_position[2] >= ERROR_LIMIT_DISTANCE and \
-            self.mission_on:
-            local_action_time = self.timer_log(local_action_time, 5, \
-            'Waiting to reach land. Goal: ~0 - Current: {}'.format(\
-                self.current_model_position[2]))
+    def check_land_completion(self, alt, wait = None):
+        local_action_time = CLOCK.now()
+        self.ros_landing_started()
+        r = Clock.Rate(CLOCK, 10)
+        self.track_target('Descend', lambda: self.current_model_position[2])
+        with self.timing.span('Descend'):
+            while self.current_model_position[2] >= ERROR_LIMIT_DISTANCE and \
+                self.mission_on:
+                r.sleep()
+                local_action_time = self.timer_log(local_action_time, 5, \
+                'Waiting to reach land. Goal: ~0 - Current: {}'.format(\
+                    self.current_model_position[2]))
+        self.track_target(None)
         if self.current_model_position[2] >= ERROR_LIMIT_DISTANCE:
-            return False, 'System did not land on time'
-        time.sleep(wait)
-        return True, 'System has landed'
+            return False, 'System did not land on time', None
+        return True, 'System has landed', self.wait_for_settle(wait)
 
     # Makes sure that the system reaches a given altitude (takeoff).
     def check_takeoff_completion(self, alt):
-        local_action_time = time.time()
+        local_action_time = CLOCK.now()
+        r = Clock.Rate(CLOCK, 10)
 
         # We check with current_odom_position beacuse the difference between,
         # the ground truth and the current_odom_position increases as the alt
         # does.
-        while alt >= (self.current_odom_position[2] + ERROR_LIMIT_DISTANCE)\
-            and self.mission_on:
-            local_action_time = self.timer_log(local_action_time, 5, \
-                'Waiting to reach alt. Goal: {} - Current: {}'.format(alt, \
-                self.current_model_position[2]))
-        if self.min_max_height[0] == -1:
-            self.min_max_height[0] = self.current_odom_position[2]
-            self.lock_min_height = False
+        self.track_target('Climb', lambda: alt - self.current_odom_position[2])
+        with self.timing.span('Climb'):
+            while alt >= (self.current_odom_position[2] + ERROR_LIMIT_DISTANCE)\
+                and self.mission_on:
+                r.sleep()
+                local_action_time = self.timer_log(local_action_time, 5, \
+                    'Waiting to reach alt. Goal: {} - Current: {}'.format(alt, \
+                    self.current_model_position[2]))
+        self.track_target(None)
+        self.ros_takeoff_reached()
 
 
         if alt < (self.current_model_position[2] - ERROR_LIMIT_DISTANCE):
-            return (False, alt), 'System did not reach height on time'
-        time.sleep(STABLE_BUFFER_TIME)
-
-        return (True, alt), 'System reached height'
+            return (False, alt), 'System did not reach height on time', None
+        return (True, alt), 'System reached height', self.wait_for_settle()
 
     # Sets the system to GUIDED, arms and takesoff to a given altitude.
     # TODO: add mode to mission parameters?
     def ros_command_takeoff(self, alt):
-        set_mode = rospy.ServiceProxy('/mavros/set_mode', SetMode)
-        res = set_mode(0, "GUIDED")
+        set_mode = MAVROS_CONNECTIONS.service('/set_mode', SetMode)
+        with self.timing.span('SetMode'):
+            res = set_mode(0, "GUIDED")
         if res: # DO check res return to match bool
             log("Mode changed to GUIDED", self.quiet, self.log_in_file) # TODO log
         else:
             error("System mode could not be changed to GUIDED", self.quiet)
 
-        arm = rospy.ServiceProxy('/mavros/cmd/arming', CommandBool)
+        arm = MAVROS_CONNECTIONS.service('/cmd/arming', CommandBool)
         # TODO return if arm or mode fail
-        if arm(True):
+        with self.timing.span('Arm'):
+            armed = arm(True)
+        if armed:
             log("System ARMED...", self.quiet, self.log_in_file)
         else:
             error("System could not be ARMED.", self.quiet, self.log_in_file)
 
-        takeoff = rospy.ServiceProxy('/mavros/cmd/takeoff', CommandTOL)
-        if takeoff(0, 0, 0, 0, alt):
+        takeoff = MAVROS_CONNECTIONS.service('/cmd/takeoff', CommandTOL)
+        with self.timing.span('Command'):
+            taking_off = takeoff(0, 0, 0, 0, alt)
+        if taking_off:
             log("System Taking off...", self.quiet, self.log_in_file)
         else:
             error("System did not take off.", self.quiet, self.log_in_file)
 
-        pass_fail, message = self.check_takeoff_completion(alt)
+        pass_fail, message, settle_time = self.check_takeoff_completion(alt)
         log(message, self.quiet, self.log_in_file)
 
-        self.report.update_action_output('Takeoff', {'Time': time.time() - self.starting_time,
-            'Output': pass_fail})
+        self.report.update_action_output('Takeoff', {'Time': CLOCK.now() - self.starting_time,
+            'Output': pass_fail, 'SettleTime': settle_time})
         return pass_fail
 
     # Makes a service call to coomand the system to land
     def ros_command_land(self, alt, wait = None):
-        land = rospy.ServiceProxy('/mavros/cmd/land', CommandTOL)
-        if land(0, 0, 0, 0, alt):
+        land = MAVROS_CONNECTIONS.service('/cmd/land', CommandTOL)
+        with self.timing.span('Command'):
+            landing = land(0, 0, 0, 0, alt)
+        if landing:
             log("System landing...", self.quiet, self.log_in_file)
         else:
             error("System is not landing.", self.quiet, self.log_in_file)
-        pass_fail, message = self.check_land_completion(alt)
+        pass_fail, message, settle_time = self.check_land_completion(alt)
         log(message, self.quiet, self.log_in_file)
-        self.report.update_action_output('Land', {'Time': time.time() - self.starting_time,
-            'Output': pass_fail})
+        self.report.update_action_output('Land', {'Time': CLOCK.now() - self.starting_time,
+            'Output': pass_fail, 'SettleTime': settle_time})
         return pass_fail
 
     # Gets the current x and y values using latitude and longitud instead of
     # getting the values form local posiiton (odom)
     def get_current_x_y(self):
-        x = distance.great_circle(HOME_COORDINATES, ( HOME_COORDINATES[0], \
-            self.current_global_coordinates[1],)).meters
-        y = distance.great_circle(HOME_COORDINATES, (self.current_global_coordinates[0],\
-         HOME_COORDINATES[1],)).meters
-        if HOME_COORDINATES[0]> self.current_global_coordinates[0]:
-            y = -y
-        if HOME_COORDINATES[1]> self.current_global_coordinates[1]:
-            x = -x
-
-        return x, y
+        return HOME_PLANE.to_x_y(self.current_global_coordinates[0], \
+            self.current_global_coordinates[1])
 
     # Calculates the expected latitude and longitude, x and y are given in meters.
     def get_expected_lat_long(self, x_y, target, x_distance, y_distance):
-        expected_lat  = 0
-        expected_long = 0
-        if float("{0:.0f}".format(math.fabs(y_distance))) == 0:
-            expected_lat = self.initial_global_coordinates[0]
-        else:
-            if target['y']> x_y[1]:
-                expected_lat  = self.initial_global_coordinates[0] + ((y_distance / \
-                    6378000.0) * (180.0/math.pi))
-            else:
-                expected_lat  = self.initial_global_coordinates[0] - ((y_distance / \
-                    6378000.0) * (180.0/math.pi))
-        if float("{0:.0f}".format(math.fabs(x_distance))) == 0:
-            expected_long = self.initial_global_coordinates[1]
-        else:
-            if target['x']> x_y[0]:
-                expected_long = self.initial_global_coordinates[1] + ((x_distance / \
-                    6378000.0) * (180.0/math.pi) / math.cos(math.radians(\
-                    self.initial_global_coordinates[0])))
-            else:
-                expected_long = self.initial_global_coordinates[1] - ((x_distance / \
-                    6378000.0) * (180.0/math.pi) / math.cos(math.radians(\
-                    self.initial_global_coordinates[0])))
-        return expected_lat, expected_long
+        plane = Geodesy.LocalTangentPlane(self.initial_global_coordinates, \
+            EXPECTED_COORDINATES_RADIUS)
+        # Offsets under half a meter are not applied.
+        if math.fabs(y_distance) <= 0.5:
+            y_distance = 0
+        elif target['y'] <= x_y[1]:
+            y_distance = -y_distance
+        if math.fabs(x_distance) <= 0.5:
+            x_distance = 0
+        elif target['x'] <= x_y[0]:
+            x_distance = -x_distance
+        return plane.to_lat_long(x_distance, y_distance)
 
     def get_the_expected_distance_from_lat_long(self, target):
         current_x, current_y = self.get_current_x_y()
@@ -261,8 +502,7 @@ class ROSHandler(object):
         log('Using coordinates: initial: {} -  expected: {}'.format(\
             self.initial_global_coordinates, expected_coor), self.quiet, \
                 self.log_in_file)
-        return  distance.great_circle(self.initial_global_coordinates, \
-        expected_coor).meters
+        return Geodesy.distance(self.initial_global_coordinates, expected_coor)
 
     # Resets the initial global position
     def reset_initial_global_position(self):
@@ -279,8 +519,13 @@ class ROSHandler(object):
         # the next coordinate
         if mptp:
             self.reset_initial_global_position()
-        go_to_publisher = rospy.Publisher('/mavros/setpoint_position/local',\
-            PoseStamped, queue_size=10)
+        go_to_publisher = MAVROS_CONNECTIONS.publisher('/setpoint_position/local',\
+            PoseStamped)
+        with self.timing.span('Connect'):
+            connected = MAVROS_CONNECTIONS.wait_for_subscriber(go_to_publisher)
+        if not connected:
+            log('No subscriber to the setpoint topic yet', self.quiet, \
+                self.log_in_file, 'WARNING')
         pose = PoseStamped()
         pose.pose.position.x = float(target['x'])
         pose.pose.position.y = float(target['y'])
@@ -294,8 +539,8 @@ class ROSHandler(object):
         if target['x'] == 0 and target['y'] == 0:
             expected_coor = (HOME_COORDINATES[0], HOME_COORDINATES[1])
 
-            expected_distance = distance.great_circle(self.initial_global_coordinates, \
-                expected_coor).meters
+            expected_distance = Geodesy.distance(self.initial_global_coordinates, \
+                expected_coor)
             log('Using home coordinates: initial: {} -  expected: {}'.format(\
                 self.initial_global_coordinates, expected_coor), self.quiet, \
                     self.log_in_file)
@@ -316,12 +561,13 @@ class ROSHandler(object):
 
 
         self.report.update_action_output('GoTo_{}'.format(self.current_action), \
-            {'Time': time.time() - self.starting_time,'Output': pass_fail[0], \
+            {'Time': CLOCK.now() - self.starting_time,'Output': pass_fail[0], \
             'Goal':{'From':{'x': float(-cmp.y), 'y': float(cmp.x), 'z': float(cmp.z)}, \
                     'To': {'x': float(target['x']), 'y': float(target['y']), 'z': float(target['z']) }}, \
             'DistanceTraveled': \
                     {'Expected': distance_metrics[0],\
-                     'Traveled': distance_metrics[1]}})
+                     'Traveled': distance_metrics[1]}, \
+            'SettleTime': distance_metrics[2]})
 
         return pass_fail
 
@@ -338,6 +584,10 @@ class ROSHandler(object):
         self.current_model_position[0]            = -real_position.y
         self.current_model_position[1]            = real_position.x
         self.current_model_position[2]            = real_position.z
+        self.odometer.update(-real_position.y, real_position.x, real_position.z)
+        if self.telemetry is not None:
+            self.telemetry.record('model', (CLOCK.now(), -real_position.y, \
+                real_position.x, real_position.z))
 
     # Callback for global position sub
     def ros_monitor_callback_global_position(self, data):
@@ -349,6 +599,9 @@ class ROSHandler(object):
         self.current_global_coordinates[0]        = data.latitude
         self.current_global_coordinates[1]        = data.longitude
         self.global_alt[1]                        = data.altitude
+        if self.telemetry is not None:
+            self.telemetry.record('global', (CLOCK.now(), data.latitude, \
+                data.longitude, data.altitude))
 
     # Callback for battery sub
     def ros_monitor_callback_battery(self, data):
@@ -356,6 +609,9 @@ class ROSHandler(object):
             self.battery[0]                       = data.remaining
             self.initial_set[2]                   = True
         self.battery[1]                           = data.remaining
+        if self.telemetry is not None:
+            self.telemetry.record('battery', (CLOCK.now(), data.remaining))
+        self.monitor_trigger.notify('battery')
 
     # Callback for local_position sub
     def ros_monitor_callback_odom_local_position(self, data):
@@ -373,143 +629,191 @@ class ROSHandler(object):
         self.current_odom_position[0]             = data.pose.pose.position.x
         self.current_odom_position[1]             = data.pose.pose.position.y
         self.current_odom_position[2]             = data.pose.pose.position.z
+        velocity = data.twist.twist.linear
+        self.settle_detector.update(CLOCK.now(), data.pose.pose.position.x, \
+            data.pose.pose.position.y, data.pose.pose.position.z, velocity.x, \
+            velocity.y, velocity.z)
+        if self.telemetry is not None:
+            self.telemetry.record('odom', (CLOCK.now(), data.pose.pose.position.x, \
+                data.pose.pose.position.y, data.pose.pose.position.z, velocity.x, \
+                velocity.y, velocity.z))
+        self.monitor_trigger.notify('odom')
 
     # Timer which logs information with a given message.
     def timer_log(self, temp_time, time_rate = TIME_INFORM_RATE, message= ''):
-        current_time = time.time()
+        current_time = CLOCK.now()
         if  (current_time - temp_time) > time_rate:
-            log('Current time: {} : {}'.format((time.time() - self.starting_time),\
+            log('Current time: {} : {}'.format((CLOCK.now() - self.starting_time),\
                 message), self.quiet, self.log_in_file)
             return current_time
         else:
             return temp_time
 
+    # Records a mission event (see TelemetryRecorder.EVENTS) when telemetry is
+    # recorded, so a replay can apply it at the same time.
+    def record_event(self, event):
+        if self.telemetry is not None:
+            self.telemetry.record('events', (CLOCK.now(), event))
+
+    # The takeoff altitude is reached, the min height starts to be checked.
+    def ros_takeoff_reached(self):
+        if self.min_max_height[0] == -1:
+            self.min_max_height[0] = self.current_odom_position[2]
+            self.lock_min_height = False
+        self.record_event(TelemetryRecorder.TAKEOFF_REACHED)
+
+    # Landing starts, the min height is no longer checked.
+    def ros_landing_started(self):
+        self.lock_min_height = True
+        self.record_event(TelemetryRecorder.LANDING)
+
+    # Compiles the mission intents and failure flags into threshold tables
+    # once, see IntentEvaluator.
+    def compile_intents(self, intents, failure_flags):
+        self.failure_flag_checker = IntentEvaluator.FailureFlagChecker(failure_flags)
+        if self.failure_predictor is not None:
+            self.failure_predictor.set_limits(failure_flags['Time'], \
+                failure_flags['Battery'])
+        self.general_intent_tracker = IntentEvaluator.IntentTracker(\
+            intents['General'], self.report.get_general_intent_report())
+        self.specific_intent_trackers = [IntentEvaluator.IntentTracker(\
+            intents['Specific'][action], self.report.get_specific_intent_report(\
+            action), True) for action in range(len(intents['Specific']))]
+
     # Checks failure flags
-    def check_failure_flags(self, failure_flags):
-        current_time = time.time() - self.starting_time
-        if time.time() - self.starting_time >= float(failure_flags['Time']):
-            return True, 'Time exceeded: Expected: {} Current: {}'.format(\
-                failure_flags['Time'], current_time)
-        # Checks battery
-        elif self.battery[0] - self.battery[1] >= float(failure_flags['Battery']):
-            return True, 'Battery exceeded: Expected: {} - Current: {} - Time: {}'.\
-                format(failure_flags['Battery'], (self.battery[0] - self.battery[1]), \
-                current_time)
-        # Checks max height
-        elif self.min_max_height[1]  >= float(failure_flags['MaxHeight']):
-            return True, 'Max height exceeded: Expected: {} - Current: {} - Time: {}'.\
-                format(failure_flags['MaxHeight'], self.min_max_height[1], current_time)
-        # Checks min height
-        elif self.min_max_height[0] != -1 and self.min_max_height[0] <= float(\
-            failure_flags['MinHeight']):
-            return True, 'Min height exceeded: Expected: {} - Current: {} - Time: {}'.\
-                format(failure_flags['MinHeight'], self.min_max_height[0], current_time)
-        return False, None
+    def check_failure_flags(self):
+        message = self.failure_flag_checker.check(CLOCK.now() - self.starting_time, \
+            self.battery[0] - self.battery[1], self.min_max_height[1], \
+            self.min_max_height[0])
+        return message is not None, message
+
+    # Checks if the current step is predicted to end after the Time or Battery
+    # failure flag, see FailurePredictor.
+    def check_predicted_failure(self):
+        if self.failure_predictor is None:
+            return False, None
+        message = self.failure_predictor.check(CLOCK.now() - self.starting_time, \
+            self.battery[0] - self.battery[1])
+        return message is not None, message
+
+    # Step of an action whose progress is projected by the failure predictor,
+    # remaining returns the distance left to its target. None ends the step.
+    def track_target(self, step, remaining = None):
+        if self.failure_predictor is not None:
+            self.failure_predictor.track(step, remaining)
 
     # Updates quality attributes.
     def get_quality_attributes(self):
-        return {'Time': (time.time() - self.starting_time), \
+        return {'Time': (CLOCK.now() - self.starting_time), \
                 'Battery': self.battery[0] - self.battery[1], \
                 'MinHeight': self.min_max_height[0], \
-                'MaxHeight': self.min_max_height[1]}
-
-    # Checks if the current state of the system violates an intent.
-    def check_general_intents(self, intents, current_report_data):
-        current_time =  time.time() - self.starting_time
-        current_battery_used = self.battery[0] - self.battery[1]
-        # Checks time
-        if current_time >= float(intents['Time']):
-            current_report_data['Time'] = {'Time':current_time,'Success':False}
-        # Checks Battery
-        if current_battery_used >= float(intents['Battery']):
-            current_report_data['Battery'] = {'Time':current_time, 'Success':False, \
-            'Current-Battery': current_battery_used, 'Intended-Battery': \
-                intents['Battery'] }
-        # Checks max height
-        if self.min_max_height[1] >= float(intents['MaxHeight']):
-            current_report_data['MaxHeight'] = {'Time':current_time, 'Success':False, \
-            'Current-MaxHeight': self.min_max_height[1], 'Intended-MaxHeight': \
-                intents['MaxHeight']}
-        # Checks min height
-        if not self.lock_min_height and self.min_max_height[0] <= float(intents['MinHeight']):
-            current_report_data['MinHeight'] = {'Time':current_time, 'Success':False, \
-            'Current-MinHeight': self.min_max_height[0], 'Intended-MinHeight': \
-                intents['MinHeight']}
-        return current_report_data
+                'MaxHeight': self.min_max_height[1], \
+                'DistanceTraveled': self.odometer.total}
+
+    # Checks if the current state of the system violates an intent. Violations
+    # are written into the report.
+    def check_general_intents(self):
+        self.general_intent_tracker.update(CLOCK.now() - self.starting_time, \
+            self.battery[0] - self.battery[1], self.min_max_height[1], \
+            self.min_max_height[0], not self.lock_min_height)
 
     # Checks the intents for a specific portion of the mission.
-    def check_specific_intents(self, intents, current_report_data):
-        specific_intent_current_time = time.time() - self.starting_values_current_action['Time']
-        specific_intent_current_battery = self.starting_values_current_action['Battery'] - self.battery[1]
-        # Checks time
-        if specific_intent_current_time >= float(intents['Time']):
-            current_report_data['Time'] = {'Curremt-Time':specific_intent_current_time, \
-                'Intended-Time': intents['Time'],'Success':False}
-        # Checks Battery
-        if specific_intent_current_battery >= float(intents['Battery']):
-            current_report_data['Battery'] = {'Time':specific_intent_current_time, \
-                'Success':False, 'Current-Battery': specific_intent_current_battery, \
-                'Intended-Battery': intents['Battery'] }
-        # Checks max height
-        if self.current_odom_position[2] >= float(intents['MaxHeight']):
-            current_report_data['MaxHeight'] = {'Time':specific_intent_current_time, \
-                'Success':False, 'Current-MaxHeight': self.min_max_height[1], \
-                'Intended-MaxHeight': intents['MaxHeight']}
-        # Checks min height
-        if not self.lock_min_height and self.current_odom_position[2] <= float(intents['MinHeight']):
-            current_report_data['MinHeight'] = {'Time':specific_intent_current_time, \
-                'Success':False, 'Current-MinHeight': self.current_odom_position[2], \
-                'Intended-MinHeight': intents['MinHeight']}
-        return current_report_data
-
-    # Starts four subscribers to populate the system's location, system battery and
-    # the model position which is very similar to the position given by the local position.
+    def check_specific_intents(self):
+        if self.current_action == -1 or self.current_action >= \
+            len(self.specific_intent_trackers):
+            return
+        self.specific_intent_trackers[self.current_action].update(CLOCK.now() - \
+            self.starting_values_current_action['Time'], \
+            self.starting_values_current_action['Battery'] - self.battery[1], \
+            self.current_odom_position[2], self.current_odom_position[2], \
+            not self.lock_min_height)
+
+    # Records for how long the specific time intent of the current action was
+    # exceeded. Called when the action ends.
+    def finalize_specific_intents(self):
+        if self.current_action == -1 or self.current_action >= \
+            len(self.specific_intent_trackers):
+            return
+        self.specific_intent_trackers[self.current_action].finalize(CLOCK.now() - \
+            self.starting_values_current_action['Time'])
+
+    # Starts three subscribers to populate the system's location and battery, and
+    # listens to the shared model position cache for the model position which is
+    # very similar to the position given by the local position. They belong to
+    # the mission session, which removes them when the mission is over.
     def start_subscribers(self):
-        model_pos_sub   = rospy.Subscriber("/gazebo/model_states", ModelStates, \
-            self.ros_monitor_callback_model_position_gazebo, queue_size=10)
-        global_pos_sub  = rospy.Subscriber('/mavros/global_position/global', \
-            NavSatFix, self.ros_monitor_callback_global_position)
-        battery_sub     = rospy.Subscriber('/mavros/battery', BatteryStatus, \
-          self.ros_monitor_callback_battery)
-        local_odom_sub  = rospy.Subscriber('/mavros/local_position/odom', \
-            Odometry, self.ros_monitor_callback_odom_local_position)
-        time.sleep(2)
+        self.session.listen_model_position(\
+            self.ros_monitor_callback_model_position_gazebo)
+        self.session.subscribe('/global_position/global', NavSatFix, \
+            self.ros_monitor_callback_global_position)
+        self.session.subscribe('/battery', BatteryStatus, \
+            self.ros_monitor_callback_battery)
+        self.session.subscribe('/local_position/odom', Odometry, \
+            self.ros_monitor_callback_odom_local_position)
+        CLOCK.sleep(2)
 
     # Updates intents, quality attributes and checks failure_flags.
-    # Sends all the data to the report generator.
+    # Sends all the data to the report generator. The checks only run after the
+    # callbacks deliver a new sample or a minimum check period expires, see
+    # MonitorTrigger.
     def ros_monitor(self, quality_attributes, intents, failure_flags):
-        self.report = Report(self, self.mission_info, len(intents['Specific']))
+        self.prepare_monitor(quality_attributes, intents, failure_flags)
         self.start_subscribers()
-
+        self.run_monitor()
+
+    # Creates the report and compiles the intents the monitor checks.
+    def prepare_monitor(self, quality_attributes, intents, failure_flags):
+        self.report = Report(self, self.mission_info, len(intents['Specific']), \
+            quality_attributes)
+        self.monitor_trigger.set_min_check_rate('report', 1.0 / \
+            self.report.report_period)
+        self.compile_intents(intents, failure_flags)
+
+    # Runs the checks each time the monitor trigger fires, until the mission is
+    # over.
+    def run_monitor(self):
         while self.mission_on:
-            fail_g, message  = self.check_failure_flags(failure_flags)
+            self.monitor_trigger.wait()
+            if not self.mission_on:
+                break
+            fail_g, message  = self.check_failure_flags()
+            if not fail_g:
+                fail_g, message = self.check_predicted_failure()
             if fail_g:
                 log('Mission Failed. Command to land will start now.', self.quiet, \
                     self.log_in_file)
-                self.ros_command_land(1)
+                with self.timing.span('FailsafeLand'):
+                    self.ros_command_land(1)
                 self.mission_on = False
                 self.report.update_failure_flag(message)
-            self.report.update_quality_attributes_report(self.get_quality_attributes())
-            self.report.update_general_intents_report(self.check_general_intents(\
-                intents['General'], self.report.get_general_intent_report()))
-            if self.current_action != -1:
-                self.report.update_specific_intents_report(self.check_specific_intents\
-                    (intents['Specific'][self.current_action], \
-                    self.report.get_specific_intent_report(self.current_action)), \
-                    self.current_action)
+            self.evaluate()
+
+    # Samples the quality attributes and checks the intents.
+    def evaluate(self):
+        self.report.update_quality_attributes_report()
+        self.check_general_intents()
+        self.check_specific_intents()
 
     # Sets the mission to over, which would stop all while loops related to the
     # check of a action execution.
     def ros_set_mission_over(self):
+        self.finalize_specific_intents()
+        self.record_event(TelemetryRecorder.MISSION_OVER)
         self.mission_on = False
+        self.monitor_trigger.notify('mission_over')
 
     # Updates the number of the current action. This is used for multiple point
     # to point mission. It allow the program to check for specific intents.
     def ros_update_current_action(self, action):
+        self.finalize_specific_intents()
         self.current_action = action
+        self.odometer.start_action()
         self.starting_values_current_action = {}
-        self.starting_values_current_action['Time'] = time.time()
+        self.starting_values_current_action['Time'] = CLOCK.now()
         self.starting_values_current_action['Battery'] = self.battery[1]
+        if self.telemetry is not None:
+            self.telemetry.record('actions', (self.starting_values_current_action[\
+                'Time'], action, self.battery[1]))
 
     # Populates the mission info, quiet, and log in file.
     def ros_set_mission_info(self, mission_info, quiet, log_in_file):
@@ -519,15 +823,21 @@ class ROSHandler(object):
 
 class Report(object):
 
-    def __init__(self, ros_handler, mission_info, number_of_locations):
+    def __init__(self, ros_handler, mission_info, number_of_locations, \
+        quality_attributes):
         self.ros_handler                  = ros_handler
         self.mission_info                 = mission_info
-        self.quality_attributes_report    = []
+        # Quality attributes are sampled every ReportRate seconds of the mission
+        # clock and stored column by column, one array per enabled attribute.
+        self.report_period                = get_report_period(quality_attributes)
+        self.quality_attributes_report    = dict((attribute, array.array('d')) for \
+            attribute in ('Time',) + QUALITY_ATTRIBUTES if attribute == 'Time' or \
+            quality_attributes.get(attribute))
         self.failure_flags_report         = 'Success'
         self.general_intents_report       = {}
         self.specific_intents_report      = [{}]
         self.action_output                = {}
-        self.current_time                 = time.time()
+        self.current_time                 = CLOCK.now()
         self.total_distance_traveled      = ros_handler.total_distance_traveled
         self.action_output                = None
         for x in range(0, number_of_locations - 1):
@@ -540,18 +850,12 @@ class Report(object):
     def get_specific_intent_report(self, current_action):
         return self.specific_intents_report[current_action]
 
-    def update_quality_attributes_report(self, data):
-        if (time.time() - self.current_time) >= 2:
-            self.quality_attributes_report.append(data)
-            self.current_time = time.time()
-
-    def update_general_intents_report(self, intent_report):
-        if self.general_intents_report != intent_report:
-            self.general_intents_report = intent_report
-
-    def update_specific_intents_report(self, data, current_action):
-        if self.specific_intents_report[current_action] != data:
-            self.specific_intents_report[current_action] = dict(data)
+    def update_quality_attributes_report(self):
+        if (CLOCK.now() - self.current_time) >= self.report_period:
+            data = self.ros_handler.get_quality_attributes()
+            for attribute, column in self.quality_attributes_report.items():
+                column.append(data[attribute])
+            self.current_time = CLOCK.now()
 
 
     def update_failure_flag(self, data):
@@ -565,35 +869,264 @@ class Report(object):
     def get_action_output(self):
         self.action_output['TotalDistanceTraveled'] = self.ros_handler.total_distance_traveled
 
-    # Generates a report in JSON format
+    # Generates a report in JSON format. Returns the report id and, in stream
+    # mode, the byte offset of its record. The report 'Timing' holds the spans
+    # of the mission and of the report generation. The span of the report write
+    # ('Write') goes to the report timing file once it is written, see
+    # ReportStore.REPORT_TIMING_NAME.
     def generate(self):
-        data_to_dump = {}
-        data_to_dump['MissionType'] = self.mission_info.mission_info['Action']['Type']
-        data_to_dump['RobotType'] = self.mission_info.robot_type
-        data_to_dump['Map'] = self.mission_info.map
-        data_to_dump['LaunchFile'] = self.mission_info.launch_file
-        data_to_dump['OverallTime'] = str(time.time() - self.ros_handler.starting_time)
-        data_to_dump['TotalDistanceTraveled'] = self.ros_handler.total_distance_traveled
-        data_to_dump['QualityAttributes'] = self.quality_attributes_report
-        data_to_dump['ActionOutput'] = self.action_output
-        data_to_dump['Genral-Intents'] = self.general_intents_report
-        data_to_dump['Specific-Intents'] = self.specific_intents_report
-        data_to_dump['Failure Flags'] = self.failure_flags_report
-        report_present = 0
-        report_file = 'outputs/{}/report.json'.format(OUTPUT_FOLDER)
-        try:
-            report_present = os.stat(report_file).st_size
-        except:
-            log('No previous report found. Creating a new one', self.ros_handler.quiet, \
-            self.ros_handler.log_in_file)
-        if report_present == 0:
-            report = {'Reports': {'0': data_to_dump}}
-            write_json_report(report_file, report)
-        else:
-            report = open_json_file(report_file)
-            report['Reports'][str(len(report['Reports']) )] =  data_to_dump
-            write_json_report(report_file, report)
-
+        timing = self.ros_handler.timing
+        with timing.span('Report'):
+            data_to_dump = {}
+            data_to_dump['MissionType'] = self.mission_info.mission_info['Action']['Type']
+            data_to_dump['RobotType'] = self.mission_info.robot_type
+            data_to_dump['Map'] = self.mission_info.map
+            data_to_dump['LaunchFile'] = self.mission_info.launch_file
+            data_to_dump['OverallTime'] = str(CLOCK.now() - self.ros_handler.starting_time)
+            data_to_dump['TotalDistanceTraveled'] = self.ros_handler.total_distance_traveled
+            data_to_dump['QualityAttributes'] = dict((attribute, column.tolist()) for \
+                attribute, column in self.quality_attributes_report.items())
+            data_to_dump['ActionOutput'] = self.action_output
+            data_to_dump['Genral-Intents'] = self.general_intents_report
+            data_to_dump['Specific-Intents'] = self.specific_intents_report
+            data_to_dump['Failure Flags'] = self.failure_flags_report
+            if self.ros_handler.session is not None:
+                data_to_dump['Callbacks'] = self.ros_handler.session.callbacks
+            if CAMPAIGN_MISSION is not None:
+                data_to_dump['Mission'] = CAMPAIGN_MISSION
+            predictor = self.ros_handler.failure_predictor
+            if predictor is not None and predictor.evidence is not None:
+                data_to_dump['Prediction'] = predictor.evidence
+            report = None
+            if REPORT_MODE == 'stream':
+                report_file = 'outputs/{}/{}'.format(OUTPUT_FOLDER, \
+                    ReportStore.STREAM_REPORT_NAME)
+                store = ReportStore.get_store(report_file)
+                report_id = store.next_id()
+            else:
+                report_present = 0
+                report_file = 'outputs/{}/{}'.format(OUTPUT_FOLDER, \
+                    ReportStore.LEGACY_REPORT_NAME)
+                try:
+                    report_present = os.stat(report_file).st_size
+                except:
+                    log('No previous report found. Creating a new one', \
+                        self.ros_handler.quiet, self.ros_handler.log_in_file)
+                report_id = 0
+                if report_present != 0:
+                    report = open_json_file(report_file)
+                    report_id = len(report['Reports'])
+            with timing.span('Telemetry'):
+                self.dump_telemetry(data_to_dump, report_id)
+        data_to_dump['Timing'] = timing.to_report()
+        offset = None
+        with timing.span('Write') as write:
+            if REPORT_MODE == 'stream':
+                report_id, offset = store.append(data_to_dump)
+            else:
+                if report is None:
+                    report = {'Reports': {}}
+                report['Reports'][str(report_id)] =  data_to_dump
+                write_json_report(report_file, report)
+        ReportStore.append_timing(report_file, report_id, [write.to_report(\
+            timing.origin)])
+        if REPORT_MODE == 'stream':
+            log('Report {} appended to {}'.format(report_id, report_file), \
+                self.ros_handler.quiet, self.ros_handler.log_in_file)
+        update_estimator(data_to_dump, report_file, report_id)
+        return report_id, offset
+
+    # Writes the mission telemetry next to the report and adds its path,
+    # relative to the report, to the report data.
+    def dump_telemetry(self, data_to_dump, report_id):
+        if self.ros_handler.telemetry is None:
+            return
+        telemetry_file = 'telemetry/{}.npz'.format(report_id)
+        self.ros_handler.telemetry.dump('outputs/{}/{}'.format(OUTPUT_FOLDER, \
+            telemetry_file))
+        data_to_dump['Telemetry'] = telemetry_file
+
+
+
+# Seconds between quality attribute samples, from the mission ReportRate.
+def get_report_period(quality_attributes):
+    report_rate = quality_attributes.get('ReportRate')
+    if isinstance(report_rate, bool) or not isinstance(report_rate, (int, float)) \
+        or report_rate <= 0:
+        return DEFAULT_REPORT_RATE
+    return float(report_rate)
+
+
+# Service proxy kept open between calls (persistent=True). When the call fails
+# because the connection was lost (e.g. MAVROS restarted) it waits for the
+# service, reconnects and calls again once.
+class PersistentService(object):
+    def __init__(self, name, service_class):
+        self.name          = name
+        self.service_class = service_class
+        self.lock          = threading.Lock()
+        self.proxy         = None
+
+    def connect(self):
+        self.proxy = ROS_API.ServiceProxy(self.name, self.service_class, \
+            persistent=True)
+
+    def close(self):
+        if self.proxy is not None and hasattr(self.proxy, 'close'):
+            self.proxy.close()
+        self.proxy = None
+
+    def __call__(self, *args):
+        with self.lock:
+            if self.proxy is None:
+                self.connect()
+            try:
+                return self.proxy(*args)
+            except rospy.ServiceException as e:
+                log('Reconnecting to {}: {}'.format(self.name, e), False, False, \
+                    'WARNING')
+                self.close()
+                ROS_API.wait_for_service(self.name, SERVICE_TIMEOUT)
+                self.connect()
+                return self.proxy(*args)
+
+
+# MAVROS service proxies and publishers, created once per process and shared by
+# the missions, see PersistentService.
+class MavrosConnectionPool(object):
+    def __init__(self):
+        self.lock       = threading.Lock()
+        self.services   = {}
+        self.publishers = {}
+
+    # name is relative to the MAVROS namespace, e.g. '/set_mode'.
+    def service(self, name, service_class):
+        name = mavros_topic(name)
+        with self.lock:
+            if name not in self.services:
+                self.services[name] = PersistentService(name, service_class)
+            return self.services[name]
+
+    def publisher(self, name, data_class, queue_size = 10):
+        name = mavros_topic(name)
+        with self.lock:
+            if name not in self.publishers:
+                self.publishers[name] = ROS_API.Publisher(name, data_class, \
+                    queue_size=queue_size)
+            return self.publishers[name]
+
+    # Messages published before the subscriber is connected are dropped. Returns
+    # whether there is a subscriber.
+    def wait_for_subscriber(self, publisher, timeout = PUBLISHER_CONNECTION_TIMEOUT):
+        deadline = CLOCK.now() + timeout
+        while not publisher.get_num_connections() and CLOCK.now() < deadline:
+            CLOCK.sleep(0.05)
+        return publisher.get_num_connections() > 0
+
+
+# Last MAVROS state and battery, kept between missions for reset_vehicle.
+class VehicleStateCache(object):
+    def __init__(self):
+        self.lock        = threading.Lock()
+        self.state       = None
+        self.battery     = None
+        self.subscribers = None
+
+    # Creates the subscribers the first time it is called. rospy.init_node has
+    # to be called before.
+    def start(self):
+        with self.lock:
+            if self.subscribers is None:
+                self.subscribers = (ROS_API.Subscriber(mavros_topic('/state'), \
+                    State, self.state_callback, queue_size=10), \
+                    ROS_API.Subscriber(mavros_topic('/battery'), BatteryStatus, \
+                    self.battery_callback, queue_size=10))
+
+    def state_callback(self, data):
+        self.state = data
+
+    def battery_callback(self, data):
+        self.battery = data
+
+    def read(self):
+        return self.state, self.battery
+
+
+MODEL_POSITION_CACHE = ModelPositionCache()
+VEHICLE_STATE_CACHE  = VehicleStateCache()
+MAVROS_CONNECTIONS   = MavrosConnectionPool()
+MISSION_COUNT        = 0
+# Number of the campaign mission in flight, written to its report as 'Mission'.
+CAMPAIGN_MISSION     = None
+
+
+# Subscribers and monitor thread of one mission. Missions run one after the
+# other in the same process, so everything a mission registers is removed by
+# close when it is over, otherwise every message would also go to the
+# callbacks of the previous missions. Publishers and service proxies are
+# shared by the missions, see MavrosConnectionPool.
+class MissionSession(object):
+    # Telemetry callbacks registered by all the sessions of the process.
+    live_callbacks = 0
+    lock           = threading.Lock()
+
+    def __init__(self, ros):
+        self.ros         = ros
+        self.subscribers = []
+        self.listeners   = []
+        self.monitor     = None
+        # Callbacks registered in the process at the end of the mission,
+        # written to the report, the same for every mission of a campaign.
+        self.callbacks   = None
+        ros.session      = self
+
+    @classmethod
+    def count_callbacks(cls, count):
+        with cls.lock:
+            cls.live_callbacks += count
+
+    def subscribe(self, topic, data_class, callback):
+        self.subscribers.append(ROS_API.Subscriber(mavros_topic(topic), \
+            data_class, callback))
+        MissionSession.count_callbacks(1)
+
+    def listen_model_position(self, listener):
+        MODEL_POSITION_CACHE.add_listener(listener)
+        self.listeners.append(listener)
+        MissionSession.count_callbacks(1)
+        MODEL_POSITION_CACHE.start()
+
+    def start_monitor(self, quality_attributes, intents, failure_flags):
+        if MissionSession.live_callbacks:
+            error('{} callbacks of previous missions are still registered'.\
+                format(MissionSession.live_callbacks), self.ros.quiet, \
+                self.ros.log_in_file)
+        monitor = profiled(self.ros.ros_monitor) if PROFILE else \
+            self.ros.ros_monitor
+        self.monitor = threading.Thread(target=monitor, args=(\
+            quality_attributes, intents, failure_flags))
+        self.monitor.daemon = True
+        self.monitor.start()
+
+    # Stops the monitor, then removes the subscribers and listeners.
+    def close(self):
+        self.ros.mission_on = False
+        self.ros.monitor_trigger.notify('mission_over')
+        if self.monitor is not None:
+            self.monitor.join(CLOCK.to_wall(MONITOR_JOIN_TIMEOUT))
+            if self.monitor.is_alive():
+                log('Monitor still running {}s after the mission'.format(\
+                    MONITOR_JOIN_TIMEOUT), self.ros.quiet, self.ros.log_in_file, \
+                    'WARNING')
+        self.callbacks = MissionSession.live_callbacks
+        for subscriber in self.subscribers:
+            subscriber.unregister()
+        for listener in self.listeners:
+            MODEL_POSITION_CACHE.remove_listener(listener)
+        MissionSession.count_callbacks(-len(self.subscribers) - \
+            len(self.listeners))
+        self.subscribers = []
+        self.listeners   = []
 
 
 class Mission(object):
@@ -612,44 +1145,58 @@ class Mission(object):
             error('Mission: {}. Not supported.'.format(self.mission_info['Action']\
                 ['Type']), False, False)
             exit()
-        ros = ROSHandler('mavros')
-        main = rospy.init_node('HoustonMonitor')
+        main = ROS_API.init_node('HoustonMonitor')
+        timing = Timing.SpanRecorder(CLOCK)
+        ready = True
+        if RESET_VEHICLE:
+            with timing.span('Reset'):
+                ready = reset_vehicle(False, False)
+        ros = ROSHandler('mavros', timing)
         if not ros.check_mavros():
             error('Missing mavros', False, False)
             sys.exit()
-        return ros, main
+        return ros, main, ready
 
     # Starts action point to point.
     def execute_point_to_point(self, action_data, ros, action = 0):
         command_success = {}
-        command_success['takeoff'] = ros.ros_command_takeoff(action_data['alt'])
+        with ros.timing.span('Takeoff'):
+            command_success['takeoff'] = ros.ros_command_takeoff(action_data['alt'])
         ros.ros_update_current_action(action)
-        command_success['go_to'] = (action_data, ros.ros_command_go_to(action_data, False))
-        command_success['land'] = ros.ros_command_land(action_data['alt'])
+        with ros.timing.span('GoTo_{}'.format(action)):
+            command_success['go_to'] = (action_data, ros.ros_command_go_to(action_data, False))
+        with ros.timing.span('Land'):
+            command_success['land'] = ros.ros_command_land(action_data['alt'])
         return command_success
 
     # Executes multiple point to point action
     def execute_multiple_point_to_point(self, action_data, ros):
         command_success = {}
-        command_success['takeoff']= ros.ros_command_takeoff(action_data[0]['alt'])
+        with ros.timing.span('Takeoff'):
+            command_success['takeoff']= ros.ros_command_takeoff(action_data[0]['alt'])
         location_count = 0
         for target in action_data:
             ros.ros_update_current_action(location_count)
-            command_success['go_to_{}'.format(location_count)] = \
-                ros.ros_command_go_to(target, True)
+            with ros.timing.span('GoTo_{}'.format(location_count)):
+                command_success['go_to_{}'.format(location_count)] = \
+                    ros.ros_command_go_to(target, True)
             location_count += 1
-        command_success['land'] = ros.ros_command_land(action_data[0]['alt'])
+        with ros.timing.span('Land'):
+            command_success['land'] = ros.ros_command_land(action_data[0]['alt'])
         return command_success
 
     # Executes extraction action
     def execute_extraction(self, action_data, ros):
         initial_x_y = get_gazebo_model_positon()
-        to_command_success = self.execute_point_to_point(action_data,ros, 0)
-        time.sleep(action_data['wait'])
+        with ros.timing.span('To'):
+            to_command_success = self.execute_point_to_point(action_data,ros, 0)
+        with ros.timing.span('Wait'):
+            CLOCK.sleep(action_data['wait'])
         action_data['x'] = -initial_x_y.y
         action_data['y'] = initial_x_y.x
         ros.reset_intial_model_position()
-        from_command_success = self.execute_point_to_point(action_data, ros, 1)
+        with ros.timing.span('From'):
+            from_command_success = self.execute_point_to_point(action_data, ros, 1)
         return {'to':to_command_success, 'from': from_command_success}
 
     # Checks that all the required parameters for a correct mission run are present
@@ -707,17 +1254,21 @@ class Mission(object):
     # Looks into the type of action and executes them.  Function starts a monitor
     # thread which constantly updates the systems location and data required for the mission.
     def execute(self, quiet, log_in_file):
-        ros, main = self.initial_check()
+        ros, main, ready = self.initial_check()
         #self.check_parameters(self.mission_info)
         mission_action     = self.mission_info['Action']
         quality_attributes = self.mission_info['QualityAttributes']
         intents            = self.mission_info['Intents']
         failure_flags      = self.mission_info['FailureFlags']
         success_report     = []
+        if not ready:
+            ros.ros_set_mission_info(self, quiet, log_in_file)
+            ros.prepare_monitor(quality_attributes, intents, failure_flags)
+            raise VehicleResetError(ros, get_vehicle_issues())
+        session            = MissionSession(ros)
         try:
             ros.ros_set_mission_info(self, quiet, log_in_file)
-            thread.start_new_thread(ros.ros_monitor, (quality_attributes, intents, \
-                failure_flags))
+            session.start_monitor(quality_attributes, intents, failure_flags)
             if mission_action['Type'] == 'PTP':
                 action_data = self.get_params(mission_action)
                 success_report.append(self.execute_point_to_point(action_data, ros))
@@ -734,8 +1285,177 @@ class Mission(object):
             sys.exit(0)
         except Exception:
             raise
-        ros.report.generate()
+        finally:
+            session.close()
+        report_location = ros.report.generate()
         print success_report
+        return report_location
+
+
+# Re-evaluates the failure flags, intents and quality attributes of a mission
+# against telemetry recorded with -t, without flying it. The recorded samples
+# are fed in time order to the ROSHandler callbacks on a ReplayClock and the
+# monitor checks run after every sample, so the report has the same schema as
+# the one of the flown mission. Action outputs are rebuilt from the model
+# position: a location is reached when it gets within ERROR_LIMIT_DISTANCE, and
+# takeoff and land are timed when the altitude is reached and when the landing
+# ends, without the settle wait.
+class MissionReplay(object):
+
+    def __init__(self, mission_description, telemetry_file):
+        self.mission              = Mission(mission_description['MDescription'])
+        self.start, self.telemetry = TelemetryRecorder.load(telemetry_file)
+        self.ros                  = None
+        self.go_to                = None
+        self.landing              = False
+
+    # Recorded samples of all the topics in time order, as (topic, row).
+    def samples(self):
+        topics, rows, times = [], [], []
+        for topic in sorted(TelemetryRecorder.TOPICS):
+            columns = [self.telemetry[topic][column] for column in \
+                TelemetryRecorder.TOPICS[topic]]
+            if not len(columns[0]):
+                continue
+            topics.extend([topic] * len(columns[0]))
+            rows.extend(numpy.column_stack(columns).tolist())
+            times.append(columns[0])
+        if not times:
+            return []
+        order = numpy.argsort(numpy.concatenate(times), kind='mergesort')
+        return [(topics[index], rows[index]) for index in order.tolist()]
+
+    # Go to target (x, y, z) of each action. The second action of an extraction
+    # goes back to the initial position, known once the replay started.
+    def get_targets(self):
+        action = self.mission.mission_info['Action']
+        if action['Type'] == 'MPTP':
+            return [(float(location['x']), float(location['y']), \
+                float(location['z'])) for location in action['Locations']]
+        target = (float(action['x']), float(action['y']), float(action['z']))
+        if action['Type'] == 'Extraction':
+            return [target, None]
+        return [target]
+
+    def get_takeoff_altitude(self):
+        action = self.mission.mission_info['Action']
+        if action['Type'] == 'MPTP':
+            return float(action['Locations'][0]['alt'])
+        return float(action['alt'])
+
+    def run(self, quiet, log_in_file):
+        CLOCK.set(self.start)
+        ros = ROSHandler('mavros')
+        ros.telemetry = None
+        ros.ros_set_mission_info(self.mission, quiet, log_in_file)
+        mission_info = self.mission.mission_info
+        intents = mission_info['Intents']
+        ros.report = Report(ros, self.mission, len(intents['Specific']), \
+            mission_info['QualityAttributes'])
+        ros.compile_intents(intents, mission_info['FailureFlags'])
+        self.ros = ros
+        self.targets = self.get_targets()
+        callbacks = {'odom': self.replay_odom, 'global': self.replay_global, \
+            'battery': self.replay_battery, 'model': self.replay_model, \
+            'actions': self.replay_action, 'events': self.replay_event}
+        for topic, row in self.samples():
+            CLOCK.set(row[0])
+            if callbacks[topic](row):
+                break
+            fail_g, message = ros.check_failure_flags()
+            if fail_g:
+                log('Mission Failed: {}'.format(message), quiet, log_in_file)
+                ros.report.update_failure_flag(message)
+                ros.evaluate()
+                break
+            ros.evaluate()
+        self.finish_go_to()
+        self.finish_landing()
+        ros.ros_set_mission_over()
+        ros.report.generate()
+
+    def replay_odom(self, row):
+        self.ros.ros_monitor_callback_odom_local_position(KinematicSimulator.Message(\
+            pose=KinematicSimulator.Message(pose=KinematicSimulator.Message(\
+            position=KinematicSimulator.point(row[1], row[2], row[3]))), \
+            twist=KinematicSimulator.Message(twist=KinematicSimulator.Message(\
+            linear=KinematicSimulator.point(row[4], row[5], row[6])))))
+
+    def replay_global(self, row):
+        self.ros.ros_monitor_callback_global_position(KinematicSimulator.Message(\
+            latitude=row[1], longitude=row[2], altitude=row[3]))
+
+    def replay_battery(self, row):
+        self.ros.ros_monitor_callback_battery(KinematicSimulator.Message(\
+            remaining=row[1]))
+
+    # Recorded in the local frame, see ros_monitor_callback_model_position_gazebo.
+    def replay_model(self, row):
+        self.ros.ros_monitor_callback_model_position_gazebo(KinematicSimulator.Message(\
+            name=[ROBOT_MODEL_NAME], pose=[KinematicSimulator.Message(position=\
+            KinematicSimulator.point(row[2], -row[1], row[3]))]))
+        go_to = self.go_to
+        if go_to is not None and go_to['Reached'] is None and math.hypot(\
+            go_to['To'][0] - row[1], go_to['To'][1] - row[2]) <= ERROR_LIMIT_DISTANCE:
+            go_to['Reached'] = self.ros.odometer.action()
+
+    def replay_action(self, row):
+        action = int(row[1])
+        self.finish_go_to()
+        self.ros.ros_update_current_action(action)
+        if action >= len(self.targets):
+            return
+        target = self.targets[action]
+        position = list(self.ros.current_model_position)
+        if target is None:
+            target = (self.ros.initial_model_position[0], \
+                self.ros.initial_model_position[1], self.targets[0][2])
+        self.go_to = {'Action': action, 'From': position, 'To': target, \
+            'Expected': math.hypot(target[0] - position[0], target[1] - \
+            position[1]), 'Reached': None}
+
+    # Returns True when the mission is over.
+    def replay_event(self, row):
+        event = int(row[1])
+        ros = self.ros
+        if event == TelemetryRecorder.TAKEOFF_REACHED:
+            self.finish_landing()
+            ros.ros_takeoff_reached()
+            altitude = self.get_takeoff_altitude()
+            ros.report.update_action_output('Takeoff', {'Time': CLOCK.now() - \
+                ros.starting_time, 'Output': (altitude >= \
+                ros.current_model_position[2] - ERROR_LIMIT_DISTANCE, altitude)})
+        elif event == TelemetryRecorder.LANDING:
+            self.finish_go_to()
+            ros.ros_landing_started()
+            self.landing = True
+        return event == TelemetryRecorder.MISSION_OVER
+
+    # Writes the output of the landing in progress, as ros_command_land does.
+    def finish_landing(self):
+        if not self.landing:
+            return
+        self.landing = False
+        self.ros.report.update_action_output('Land', {'Time': CLOCK.now() - \
+            self.ros.starting_time, 'Output': self.ros.current_model_position[2] \
+            < ERROR_LIMIT_DISTANCE})
+
+    # Writes the output of the current go to, as ros_command_go_to does.
+    def finish_go_to(self):
+        go_to = self.go_to
+        if go_to is None:
+            return
+        self.go_to = None
+        traveled = go_to['Reached']
+        if traveled is None:
+            traveled = self.ros.odometer.action()
+        self.ros.report.update_action_output('GoTo_{}'.format(go_to['Action']), \
+            {'Time': CLOCK.now() - self.ros.starting_time, 'Output': \
+            go_to['Reached'] is not None, 'Goal': {'From': {'x': go_to['From'][0], \
+            'y': go_to['From'][1], 'z': go_to['From'][2]}, 'To': {'x': \
+            go_to['To'][0], 'y': go_to['To'][1], 'z': go_to['To'][2]}}, \
+            'DistanceTraveled': {'Expected': go_to['Expected'], 'Traveled': \
+            traveled}})
 
 
 # Checks that JSON file meets the requirements to start the mission.
@@ -773,43 +1493,591 @@ def euclidean(a, b):
     return math.sqrt(d)
 
 # Gets the gazebo model position. This function is here to allow the position be
-# passed to the random mission generator without creating a ROSHandler
+# passed to the random mission generator without creating a ROSHandler. It reads
+# MODEL_POSITION_CACHE and only blocks until the cache gets its first sample.
 def get_gazebo_model_positon(from_outside_mission = False):
     if from_outside_mission:
-        temporary_node = rospy.init_node('HoustonMonitor')
-    model_states = rospy.client.wait_for_message("/gazebo/model_states", \
-        ModelStates, timeout=1.0)
-    pose_reality = model_states.pose[model_states.name.index(ROBOT_MODEL_NAME)]
-    return pose_reality.position
-
+        temporary_node = ROS_API.init_node('HoustonMonitor')
+    MODEL_POSITION_CACHE.start()
+    position, age = MODEL_POSITION_CACHE.read()
+    if position is None:
+        position, age = MODEL_POSITION_CACHE.wait_for_position(1.0)
+    if position is None:
+        raise rospy.ROSException('timeout exceeded while waiting for model position')
+    return position
+
+# Position (Gazebo frame) a random mission is generated from. With --reset the
+# vehicle is flown home by Mission.initial_check, after the mission is
+# generated, so the mission starts from home, not from where the previous one
+# ended.
+def get_mission_start_position():
+    if RESET_VEHICLE:
+        return Point(0, 0, 0)
+    return get_gazebo_model_positon(True)
+
+# Last local (x, y, z) of the model, None before the first sample.
+def get_model_local_position():
+    position, age = MODEL_POSITION_CACHE.read()
+    if position is None:
+        return None
+    return -position.y, position.x, position.z
+
+# What keeps the vehicle from starting a mission: not connected, armed, flying,
+# away from home, battery not full. Empty when it is ready.
+def get_vehicle_issues():
+    issues = []
+    state, battery = VEHICLE_STATE_CACHE.read()
+    position = get_model_local_position()
+    if state is None or not state.connected:
+        issues.append('not connected')
+    elif state.armed:
+        issues.append('armed')
+    if position is None or MODEL_POSITION_CACHE.read()[1] > MODEL_POSITION_MAX_AGE:
+        issues.append('no recent model position')
+    else:
+        if position[2] >= ERROR_LIMIT_DISTANCE:
+            issues.append('not landed ({:.2f} m)'.format(position[2]))
+        if math.hypot(position[0], position[1]) > HOME_TOLERANCE:
+            issues.append('{:.2f} m from home'.format(math.hypot(position[0], \
+                position[1])))
+    if battery is None or battery.remaining < RESET_MIN_BATTERY:
+        issues.append('battery at {}'.format(battery.remaining if battery else \
+            None))
+    return issues
+
+# Waits, on CLOCK, until condition() is true or the timeout expires.
+def wait_until(condition, timeout):
+    deadline = CLOCK.now() + timeout
+    r = Clock.Rate(CLOCK, 10)
+    while not condition() and CLOCK.now() < deadline:
+        r.sleep()
+    return condition()
+
+# Raised by Mission.execute when the vehicle could not be reset (--reset), the
+# mission is not flown. write_report records it as a failed mission.
+class VehicleResetError(rospy.ROSException):
+    def __init__(self, ros, issues):
+        rospy.ROSException.__init__(self, 'vehicle could not be reset: {}'.format(\
+            ', '.join(issues)))
+        self.ros = ros
+
+    # Writes the report of the mission, with the error as its failure flag.
+    # Returns the report id and offset, see Report.generate.
+    def write_report(self):
+        # Nothing was flown, there is no telemetry to keep.
+        self.ros.telemetry = None
+        self.ros.report.update_failure_flag('Reset failed: {}'.format(self))
+        return self.ros.report.generate()
+
+# Brings the vehicle back to the state every mission starts from, using the
+# running node and MAVROS instead of restarting the stack: back home (RTL, after
+# climbing if it landed away from home), landed, disarmed, and a full battery
+# (MAV_CMD_BATTERY_RESET). Returns whether the vehicle is ready.
+def reset_vehicle(quiet, log_in_file):
+    MODEL_POSITION_CACHE.start()
+    VEHICLE_STATE_CACHE.start()
+    wait_until(lambda: get_model_local_position() is not None and \
+        VEHICLE_STATE_CACHE.read()[0] is not None, STABLE_BUFFER_TIME)
+    issues = get_vehicle_issues()
+    if not issues:
+        return True
+    position = get_model_local_position()
+    if position is None or VEHICLE_STATE_CACHE.read()[0] is None:
+        error('Vehicle not ready: {}'.format(', '.join(issues)), quiet, log_in_file)
+        return False
+    log('Resetting vehicle: {}'.format(', '.join(issues)), quiet, log_in_file)
+    set_mode = MAVROS_CONNECTIONS.service('/set_mode', SetMode)
+    arming = MAVROS_CONNECTIONS.service('/cmd/arming', CommandBool)
+    if math.hypot(position[0], position[1]) > HOME_TOLERANCE:
+        if position[2] < ERROR_LIMIT_DISTANCE:
+            takeoff = MAVROS_CONNECTIONS.service('/cmd/takeoff', CommandTOL)
+            set_mode(0, 'GUIDED')
+            arming(True)
+            takeoff(0, 0, 0, 0, RESET_ALTITUDE)
+            wait_until(lambda: get_model_local_position()[2] >= RESET_ALTITUDE - \
+                ERROR_LIMIT_DISTANCE, RESET_TIMEOUT)
+        set_mode(0, 'RTL')
+    elif position[2] >= ERROR_LIMIT_DISTANCE:
+        set_mode(0, 'LAND')
+    wait_until(lambda: get_model_local_position()[2] < ERROR_LIMIT_DISTANCE and \
+        not VEHICLE_STATE_CACHE.read()[0].armed, RESET_TIMEOUT)
+    if VEHICLE_STATE_CACHE.read()[0].armed:
+        arming(False)
+    command = MAVROS_CONNECTIONS.service('/cmd/command', CommandLong)
+    command(False, MAV_CMD_BATTERY_RESET, 0, 255, 100, 0, 0, 0, 0, 0)
+    if wait_until(lambda: not get_vehicle_issues(), STABLE_BUFFER_TIME):
+        log('Vehicle ready', quiet, log_in_file)
+        return True
+    error('Vehicle not ready: {}'.format(', '.join(get_vehicle_issues())), quiet, \
+        log_in_file)
+    return False
 
 # Starts the actual mission (Test).
 def start_test(mission_description, quiet, log_in_file):
+    global MISSION_COUNT
+    if LOG_PER_MISSION:
+        Logger.set_log_file('outputs/{}/logs/mission_{}.log'.format(OUTPUT_FOLDER, \
+            MISSION_COUNT))
+    MISSION_COUNT += 1
     check_json(mission_description)
     mission = Mission(mission_description['MDescription'])
-    mission_results = mission.execute(quiet, log_in_file)
+    return mission.execute(quiet, log_in_file)
 
 # Handles random missions, loops through the quantity of missions wanted and executes,
-# them.
-def start_random_mission(mission_type, quantity, quiet, log_in_file, save_missions):
-
-    for x in range(0, int(quantity)):
+# them. Mission x is generated with the seed seed + x, see run_campaign.
+def start_random_mission(mission_type, quantity, quiet, log_in_file, save_missions, \
+    seed = None):
+    campaign = open_campaign({'Type': 'random-mission', 'MissionType': \
+        mission_type, 'Quantity': int(quantity), 'Seed': seed}, quiet, log_in_file)
+    settings = campaign.settings
+
+    def get_mission(x):
         randomGenerator = RandomMissionGenerator.RandomMissionGenerator('random',\
-            get_gazebo_model_positon(True))
-        random_mission = randomGenerator.generate_random_mission(mission_type)
+            get_mission_start_position(), settings['Seed'] + x, ESTIMATOR)
+        random_mission = randomGenerator.generate_random_mission(\
+            settings['MissionType'])
         if save_missions:
             write_json_report('outputs/{}/missions/{}.json'.format(OUTPUT_FOLDER, x),\
                 random_mission)
-        start_test(random_mission, quiet,log_in_file)
-
-def analyze_report(json_file):
-    report = open_json_file(json_file)
-    report_analyzer = ReportAnalyzer.ReportAnalyzer(report)
-    report_analyzer.analyze()
-
-
-# Recieves a JSON file opens it and starts the test
+        return random_mission, {'Seed': settings['Seed'] + x}
+
+    run_campaign(campaign, get_mission, quiet, log_in_file)
+
+# Runs the missions of a JSON lines file (e.g. written by generate-missions) as a
+# campaign, mission x being line x.
+def start_json_missions(json_file, quiet, log_in_file):
+    with open(json_file) as missions:
+        quantity = sum(1 for line in missions if line.strip())
+    campaign = open_campaign({'Type': 'json-mission', 'Source': \
+        os.path.abspath(json_file), 'Quantity': quantity}, quiet, log_in_file)
+    remaining = set(campaign.remaining())
+
+    def get_missions():
+        with open(campaign.settings['Source']) as missions:
+            x = 0
+            for line in missions:
+                if not line.strip():
+                    continue
+                if x in remaining:
+                    yield x, json.loads(line)
+                x += 1
+
+    missions = get_missions()
+
+    def get_mission(x):
+        line, mission = next(missions)
+        assert line == x
+        return mission, {'Line': x}
+
+    run_campaign(campaign, get_mission, quiet, log_in_file)
+
+# Creates the manifest of a new campaign in outputs/<ts>, or loads it when the
+# campaign is resumed (--resume). A resumed campaign keeps its settings: the
+# report mode (-r) and the telemetry recording (-t) of the manifest are used,
+# and Houston exits when the missions given differ from the campaign ones. A
+# Seed None is not given, a random one is picked for a new campaign.
+def open_campaign(settings, quiet, log_in_file):
+    global REPORT_MODE, RECORD_TELEMETRY
+    campaign = Campaign.CampaignManifest('outputs/{}/{}'.format(OUTPUT_FOLDER, \
+        Campaign.MANIFEST_NAME))
+    if not campaign.exists():
+        settings = dict(settings, ReportMode=REPORT_MODE, Telemetry=\
+            RECORD_TELEMETRY)
+        if settings.get('Seed', 0) is None:
+            settings['Seed'] = random.randint(0, 2 ** 31 - 1)
+        campaign.create(settings)
+        return campaign
+    campaign.load()
+    if campaign.settings['Type'] != settings['Type']:
+        error('Campaign {} is a {} campaign'.format(OUTPUT_FOLDER, \
+            campaign.settings['Type']), quiet, log_in_file)
+        sys.exit(1)
+    different = ['{} {} (campaign: {})'.format(key, value, campaign.settings[key]) \
+        for key, value in sorted(settings.items()) if value is not None and \
+        campaign.settings.get(key) != value]
+    if different:
+        error('Campaign {} has different missions: {}'.format(OUTPUT_FOLDER, \
+            ', '.join(different)), quiet, log_in_file)
+        sys.exit(1)
+    report_mode = campaign.settings.get('ReportMode', get_report_mode())
+    record_telemetry = campaign.settings.get('Telemetry', RECORD_TELEMETRY)
+    if (report_mode, record_telemetry) != (REPORT_MODE, RECORD_TELEMETRY):
+        log('Campaign {} was started with -r {}{}, resuming it the same way'.\
+            format(OUTPUT_FOLDER, report_mode, ' -t' if record_telemetry else \
+            ' and without -t'), quiet, log_in_file, 'WARNING')
+        REPORT_MODE = report_mode
+        RECORD_TELEMETRY = record_telemetry
+    # A mission in flight when the campaign stopped is done if its report was
+    # written, it is run again otherwise.
+    report_count = count_reports()
+    for x in campaign.in_flight():
+        report_id = campaign.missions[x]['ReportId']
+        if report_id < report_count:
+            campaign.update(x, Campaign.DONE, ReportId=report_id, Offset=\
+                find_report_offset(report_id))
+    log('Resuming campaign {}: {} of {} missions left'.format(OUTPUT_FOLDER, \
+        len(campaign.remaining()), campaign.settings['Quantity']), quiet, \
+        log_in_file)
+    return campaign
+
+# Runs the missions of a campaign that are not done. get_mission(x) returns the
+# mission description of mission x and what the manifest records to rebuild it.
+# A mission the vehicle could not be reset for is reported and recorded as
+# failed, the campaign goes on with the next one, which tries the reset again.
+def run_campaign(campaign, get_mission, quiet, log_in_file):
+    global MISSION_COUNT, CAMPAIGN_MISSION
+    for x in campaign.remaining():
+        mission_description, source = get_mission(x)
+        campaign.update(x, Campaign.RUNNING, ReportId=count_reports(), **source)
+        MISSION_COUNT = x
+        CAMPAIGN_MISSION = x
+        try:
+            report_id, offset = start_test(mission_description, quiet, log_in_file)
+        except VehicleResetError as reset_error:
+            error('Mission {} not flown: {}'.format(x, reset_error), quiet, \
+                log_in_file)
+            report_id, offset = reset_error.write_report()
+            campaign.update(x, Campaign.FAILED, ReportId=report_id, Offset=\
+                offset, Error=str(reset_error))
+            continue
+        campaign.update(x, Campaign.DONE, ReportId=report_id, Offset=offset)
+
+# Number of reports in the report of the current output folder, which is also
+# the id of the next one.
+def count_reports():
+    if REPORT_MODE == 'stream':
+        return ReportStore.get_store('outputs/{}/{}'.format(OUTPUT_FOLDER, \
+            ReportStore.STREAM_REPORT_NAME)).next_id()
+    report_file = 'outputs/{}/{}'.format(OUTPUT_FOLDER, \
+        ReportStore.LEGACY_REPORT_NAME)
+    if not os.path.exists(report_file) or not os.path.getsize(report_file):
+        return 0
+    return len(open_json_file(report_file)['Reports'])
+
+# Report mode of the report in the current output folder, for manifests written
+# before they recorded it. REPORT_MODE when there is no report yet.
+def get_report_mode():
+    folder = 'outputs/{}'.format(OUTPUT_FOLDER)
+    if os.path.exists(os.path.join(folder, ReportStore.STREAM_REPORT_NAME)):
+        return 'stream'
+    if os.path.exists(os.path.join(folder, ReportStore.LEGACY_REPORT_NAME)):
+        return 'json'
+    return REPORT_MODE
+
+def find_report_offset(report_id):
+    if REPORT_MODE != 'stream':
+        return None
+    return ReportStore.find_offset('outputs/{}/{}'.format(OUTPUT_FOLDER, \
+        ReportStore.STREAM_REPORT_NAME), report_id)
+
+# Output folder name of a campaign given as <ts>, outputs/<ts> or a path to it.
+def get_campaign_folder(campaign):
+    return os.path.basename(os.path.normpath(campaign))
+
+# Replaces MAVROS, Gazebo and the ROS master by a KinematicSimulator running
+# speed_up times faster than real time.
+def use_simulator(speed_up):
+    global ROS_API, SIMULATOR, CLOCK
+    SIMULATOR = KinematicSimulator.KinematicSimulator(MAVROS_NAMESPACE, \
+        ROBOT_MODEL_NAME, speed_up, HOME_COORDINATES)
+    ROS_API = SIMULATOR
+    CLOCK = Clock.SimulatorClock(SIMULATOR)
+
+# Selects the clock missions are measured on. 'wall' is the wall clock, sped up
+# when speed_up is not 1 (e.g. SITL with SIM_SPEEDUP), 'ros' follows /clock.
+# With the simulator the simulated time is always used.
+def set_clock(clock, speed_up):
+    global CLOCK
+    if SIMULATOR is not None:
+        return
+    if clock == 'ros':
+        CLOCK = Clock.RosClock(rospy)
+    elif speed_up != 1.0:
+        CLOCK = Clock.ScaledClock(speed_up)
+    else:
+        CLOCK = Clock.WallClock()
+
+# ROS master URI and MAVROS namespace of a campaign worker.
+def get_worker_environment(worker):
+    return {'ROS_MASTER_URI': 'http://localhost:{}/'.format(ROS_MASTER_BASE_PORT +\
+                worker * WORKER_PORT_OFFSET),
+            'MAVROS_NAMESPACE': WORKER_NAMESPACE.format(worker)}
+
+# Worker process of a parallel campaign. Takes mission numbers from the shared
+# queue until it gets None, and writes its reports to outputs/<ts>/worker_<n>.
+# Mission x is generated with the seed seed + x, as start_random_mission does.
+# The start, end or failure of each mission is sent to results, see
+# start_parallel_campaign.
+def campaign_worker(worker, queue, results, mission_type, seed, quiet, log_in_file, \
+    save_missions):
+    global OUTPUT_FOLDER, REPORT_MODE, MAVROS_NAMESPACE, UPDATE_ESTIMATOR
+    environment = get_worker_environment(worker)
+    os.environ['ROS_MASTER_URI'] = environment['ROS_MASTER_URI']
+    MAVROS_NAMESPACE = environment['MAVROS_NAMESPACE']
+    if SIMULATOR is not None:
+        use_simulator(SIMULATOR.speed_up)
+    campaign_folder = OUTPUT_FOLDER
+    OUTPUT_FOLDER = '{}/worker_{}'.format(campaign_folder, worker)
+    REPORT_MODE = 'stream'
+    UPDATE_ESTIMATOR = False
+    log('Worker {} using {} and {}'.format(worker, environment['ROS_MASTER_URI'], \
+        MAVROS_NAMESPACE), quiet, log_in_file)
+    def run():
+        global MISSION_COUNT, CAMPAIGN_MISSION
+        for x in iter(queue.get, None):
+            results.put((WORKER_STARTED, worker, x))
+            try:
+                randomGenerator = RandomMissionGenerator.RandomMissionGenerator(\
+                    'random', get_mission_start_position(), seed + x, ESTIMATOR)
+                random_mission = randomGenerator.generate_random_mission(mission_type)
+                if save_missions:
+                    write_json_report('outputs/{}/missions/{}.json'.format(\
+                        campaign_folder, x), random_mission)
+                MISSION_COUNT = x
+                CAMPAIGN_MISSION = x
+                start_test(random_mission, quiet, log_in_file)
+            except Exception as e:
+                # The stack of this worker is not usable, the parent gives the
+                # mission to the other workers.
+                error('Worker {} stopped at mission {}: {}'.format(worker, x, e), \
+                    quiet, log_in_file)
+                results.put((WORKER_FAILED, worker, x))
+                return
+            results.put((WORKER_DONE, worker, x))
+    try:
+        if PROFILE:
+            run_profiled(run, quiet, log_in_file)
+        else:
+            run()
+    finally:
+        # Workers exit without running atexit.
+        Logger.close()
+
+# Runs a campaign of random missions on several workers, each one with its own
+# SITL stack, then merges the worker reports into outputs/<ts>. A worker stops
+# at its first failed mission, which is given to the other workers. When every
+# worker stopped before the campaign is done, the missions not run are
+# reported and Houston exits with status 1.
+def start_parallel_campaign(mission_type, quantity, workers, quiet, log_in_file, \
+    save_missions, seed = None):
+    if seed is None:
+        seed = random.randint(0, 2 ** 31 - 1)
+    log('Campaign of {} missions on {} workers, seed {}'.format(quantity, \
+        workers, seed), quiet, log_in_file)
+    queue = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    for x in range(0, int(quantity)):
+        queue.put(x)
+    processes = []
+    for worker in range(workers):
+        process = multiprocessing.Process(target=campaign_worker, args=(worker, \
+            queue, results, mission_type, seed, quiet, log_in_file, save_missions))
+        process.start()
+        processes.append(process)
+    pending = wait_for_workers(processes, queue, results, int(quantity), quiet, \
+        log_in_file)
+    # No mission is left to run, the live workers stop.
+    for worker in range(workers):
+        queue.put(None)
+    if pending:
+        queue.cancel_join_thread()
+    for process in processes:
+        process.join()
+    merge_worker_reports(workers, quiet, log_in_file)
+    if pending:
+        error('{} missions were not run, all the workers stopped: {}'.format(\
+            len(pending), sorted(pending)), quiet, log_in_file)
+        sys.exit(1)
+
+# Follows the missions of the workers until every mission is done or every
+# worker stopped. The mission of a worker that failed, or died without telling
+# (e.g. killed), is put back in the queue. Returns the missions not done.
+def wait_for_workers(processes, queue, results, quantity, quiet, log_in_file):
+    pending = set(range(quantity))
+    in_flight = {}
+    stopped = set()
+    dead = set()
+    while pending and len(stopped) < len(processes):
+        try:
+            kind, worker, x = results.get(True, WORKER_POLL_PERIOD)
+        except Queue.Empty:
+            # Workers found dead at the previous poll have no result left in
+            # the queue.
+            for worker in dead - stopped:
+                stopped.add(worker)
+                if worker in in_flight:
+                    error('Worker {} exited during mission {}'.format(worker, \
+                        in_flight[worker]), quiet, log_in_file)
+                    queue.put(in_flight.pop(worker))
+            dead = set(worker for worker, process in enumerate(processes) if \
+                not process.is_alive())
+            continue
+        if kind == WORKER_STARTED:
+            in_flight[worker] = x
+        elif kind == WORKER_DONE:
+            in_flight.pop(worker, None)
+            pending.discard(x)
+        elif kind == WORKER_FAILED:
+            in_flight.pop(worker, None)
+            stopped.add(worker)
+            queue.put(x)
+    return pending
+
+# Merges outputs/<ts>/worker_<n>/report.jsonl into the campaign report.
+def merge_worker_reports(workers, quiet, log_in_file):
+    stream_file = 'outputs/{}/{}'.format(OUTPUT_FOLDER, ReportStore.STREAM_REPORT_NAME)
+    store = ReportStore.get_store(stream_file)
+    for worker in range(workers):
+        worker_file = 'outputs/{}/worker_{}/{}'.format(OUTPUT_FOLDER, worker, \
+            ReportStore.STREAM_REPORT_NAME)
+        if not os.path.exists(worker_file):
+            log('Worker {} did not write any report'.format(worker), quiet, \
+                log_in_file)
+            continue
+        worker_timing = ReportStore.read_timing(worker_file)
+        for report_id, report in ReportStore.read_records(worker_file):
+            if 'Telemetry' in report:
+                report['Telemetry'] = 'worker_{}/{}'.format(worker, \
+                    report['Telemetry'])
+            merged_id, offset = store.append(report)
+            if report_id in worker_timing:
+                ReportStore.append_timing(stream_file, merged_id, \
+                    worker_timing[report_id])
+    log('{} reports merged into {}'.format(store.count, stream_file), quiet, \
+        log_in_file)
+    if ESTIMATOR is not None:
+        ESTIMATOR.update_from_file(stream_file)
+        ESTIMATOR.save()
+    if REPORT_MODE == 'json':
+        export_report(stream_file, 'outputs/{}/{}'.format(OUTPUT_FOLDER, \
+            ReportStore.LEGACY_REPORT_NAME))
+
+# Writes missions start to start + quantity - 1 of the mission set given by
+# seed, one JSON mission per line. The missions start from the home position.
+def generate_missions(mission_type, quantity, seed, start, output_file):
+    randomGenerator = RandomMissionGenerator.RandomMissionGenerator('random', \
+        Point(0, 0, 0), estimator=ESTIMATOR)
+    log('Writting file: {}'.format(output_file), False, False)
+    with safe_open(output_file) as output:
+        for mission in randomGenerator.generate_missions(mission_type, \
+            int(quantity), seed, start):
+            output.write(json.dumps(mission, sort_keys=True) + '\n')
+
+# Compacts a stream report (report.jsonl) into the legacy report.json format.
+def export_report(stream_file, json_file):
+    log('Exporting {} to {}'.format(stream_file, json_file), False, False)
+    ReportStore.export_legacy(stream_file, json_file)
+
+# Reports are streamed from the file (report.json or report.jsonl), so the
+# report is never loaded as a whole.
+def analyze_report(json_file, as_json = False):
+    report_analyzer = ReportAnalyzer.ReportAnalyzer(json_file)
+    report_analyzer.analyze(as_json)
+
+# Adds the reports of report files (report.json or report.jsonl) to the model
+# file, created when missing, and prints its estimates. Reports already added
+# from a file are skipped, so a growing report can be fitted again.
+def fit_estimator(model_file, report_files):
+    estimator = MissionEstimator.MissionEstimator(model_file)
+    for report_file in report_files:
+        added = estimator.update_from_file(report_file)
+        log('{} reports added from {}'.format(added, report_file), False, False)
+    estimator.save()
+    print json.dumps(estimator.summary(), sort_keys=True, indent=4)
+
+# Adds a report just written to the --estimator model, see ESTIMATOR.
+def update_estimator(report, report_file, report_id):
+    if ESTIMATOR is None or not UPDATE_ESTIMATOR:
+        return
+    ESTIMATOR.add_report(report, os.path.abspath(report_file), report_id)
+    ESTIMATOR.save()
+
+# Replays recorded telemetry against mission descriptions, see MissionReplay.
+# mission_path and telemetry_path are either a mission JSON and a telemetry
+# file, or two folders (e.g. missions/ saved with -s and telemetry/ recorded
+# with -t) whose files are paired by name.
+def replay_missions(mission_path, telemetry_path, quiet, log_in_file):
+    global CLOCK
+    CLOCK = Clock.ReplayClock()
+    for mission_file, telemetry_file in get_replay_pairs(mission_path, \
+        telemetry_path):
+        log('Replaying {} against {}'.format(telemetry_file, mission_file), \
+            quiet, log_in_file)
+        mission_description = open_json_file(mission_file)
+        check_json(mission_description)
+        MissionReplay(mission_description, telemetry_file).run(quiet, log_in_file)
+
+# Pairs the missions of a campaign (outputs/<ts>/missions) with their telemetry
+# through the campaign report: the telemetry of a report belongs to the mission
+# it records ('Mission') or, in older reports, to the mission the manifest gives
+# the report to. Report ids and mission numbers differ with -w or when a report
+# is appended to, so names are only used for folders without a report. Exits
+# when a telemetry file of the report cannot be paired.
+def get_replay_pairs(mission_path, telemetry_path):
+    if not os.path.isdir(mission_path):
+        return [(mission_path, telemetry_path)]
+    campaign_folder = os.path.dirname(os.path.normpath(mission_path))
+    report_file = get_report_file(campaign_folder)
+    if report_file is None:
+        return get_replay_pairs_by_name(mission_path, telemetry_path)
+    report_missions = get_report_missions(campaign_folder)
+    telemetry_root = os.path.join(os.path.realpath(telemetry_path), '')
+    pairs, unpaired = [], []
+    for report_id, report in ReportAnalyzer.iter_reports(report_file):
+        if 'Telemetry' not in report:
+            continue
+        telemetry_file = os.path.join(campaign_folder, report['Telemetry'])
+        if not os.path.realpath(telemetry_file).startswith(telemetry_root):
+            continue
+        mission = report.get('Mission', report_missions.get(int(report_id)))
+        mission_file = os.path.join(mission_path, '{}.json'.format(mission))
+        if mission is None or not os.path.exists(mission_file):
+            unpaired.append(telemetry_file)
+            continue
+        pairs.append((mission, mission_file, telemetry_file))
+    if unpaired:
+        error('No mission in {} for the telemetry {}, {} does not record their \
+missions'.format(mission_path, ', '.join(unpaired), report_file))
+        sys.exit(1)
+    return [(mission_file, telemetry_file) for mission, mission_file, \
+        telemetry_file in sorted(pairs)]
+
+def get_report_file(folder):
+    for name in (ReportStore.STREAM_REPORT_NAME, ReportStore.LEGACY_REPORT_NAME):
+        if os.path.exists(os.path.join(folder, name)):
+            return os.path.join(folder, name)
+    return None
+
+# Mission of each report id, from the manifest of the campaign, see Campaign.
+def get_report_missions(campaign_folder):
+    campaign = Campaign.CampaignManifest(os.path.join(campaign_folder, \
+        Campaign.MANIFEST_NAME))
+    if not campaign.exists():
+        return {}
+    campaign.load()
+    return dict((record['ReportId'], mission) for mission, record in \
+        campaign.missions.items() if record['Status'] == Campaign.DONE)
+
+# Missions and telemetry folders not written by a campaign, <x>.json is paired
+# with <x>.npz.
+def get_replay_pairs_by_name(mission_path, telemetry_path):
+    missions = dict((os.path.splitext(name)[0], os.path.join(mission_path, name)) \
+        for name in os.listdir(mission_path) if name.endswith('.json'))
+    pairs = []
+    for name in os.listdir(telemetry_path):
+        key = os.path.splitext(name)[0]
+        if name.endswith('.npz') and key in missions:
+            pairs.append((int(key) if key.isdigit() else key, missions[key], \
+                os.path.join(telemetry_path, name)))
+    return [(mission_file, telemetry_file) for key, mission_file, telemetry_file \
+        in sorted(pairs)]
+
+# Recieves a JSON file opens it and starts the test. A .jsonl file is run as a
+# campaign, see start_json_missions.
 def start_json_mission(json_file, quiet, log_in_file):
+    if json_file.endswith('.jsonl'):
+        start_json_missions(json_file, quiet, log_in_file)
+        return
     start_test(open_json_file(json_file), quiet, log_in_file)
 
 def open_json_file(json_file):
@@ -817,6 +2085,35 @@ def open_json_file(json_file):
         json_file = json.load(file)
     return json_file
 
+# Runs function under cProfile. The stats of the calling thread and of the
+# threads run through profiled are written to outputs/<ts>/PROFILE_NAME and the
+# PROFILE_TOP functions by cumulative time are logged. The subscriber callbacks
+# run in threads of rospy (or of the simulator) and are not profiled.
+def run_profiled(function, quiet, log_in_file):
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function)
+    finally:
+        stats_file = 'outputs/{}/{}'.format(OUTPUT_FOLDER, PROFILE_NAME)
+        make_parent_dirs(os.path.dirname(stats_file))
+        stats = pstats.Stats(profiler)
+        for thread_profile in THREAD_PROFILES:
+            stats.add(thread_profile)
+        stats.dump_stats(stats_file)
+        summary = StringIO.StringIO()
+        stats.stream = summary
+        stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+        log('Profile written to {}\n{}'.format(stats_file, summary.getvalue()), \
+            quiet, log_in_file)
+
+# Wraps the entry point of a thread so that it is profiled, see run_profiled.
+def profiled(function):
+    def run(*args):
+        profiler = cProfile.Profile()
+        THREAD_PROFILES.append(profiler)
+        return profiler.runcall(function, *args)
+    return run
+
 def make_parent_dirs(path):
     try:
         os.makedirs(path)
@@ -841,16 +2138,65 @@ def exit_handler(signal, frame):
     sys.exit(0)
 
 def main():
+    global REPORT_MODE, LOG_PER_MISSION, RECORD_TELEMETRY, OUTPUT_FOLDER, \
+        RESET_VEHICLE, STABLE_BUFFER_TIME, SETTLE_SPEED_TOLERANCE, \
+        SETTLE_POSITION_TOLERANCE, PROFILE, ESTIMATOR, PREDICT_FAILURES
     signal.signal(signal.SIGINT, exit_handler)
+    signal.signal(signal.SIGUSR1, toggle_debug_handler)
     parser = argparse.ArgumentParser()
     subparsers = parser.add_subparsers()
     parser.add_argument('--version', action='version', version='0.0.1')
     parser.add_argument('-l', '--log_in_file', action='store_true', \
         required = False)
+    parser.add_argument('--log_level', choices=['DEBUG', 'LOG', 'WARNING', \
+        'ERROR'], required=False, default='LOG', help='Minimum level logged. \
+        SIGUSR1 toggles DEBUG while running.')
+    parser.add_argument('--log_per_mission', action='store_true', required=False, \
+        default=False, help='With -l, one log file per mission in outputs/<ts>/logs.')
     parser.add_argument('-q', '--quiet', action='store_true', required=False, \
         default = False)
     parser.add_argument('-s', '--save_missions', action='store_true', required=False,\
         default = False)
+    parser.add_argument('--simulate', action='store_true', required=False, \
+        default=False, help='Fly the missions on the headless kinematic simulator \
+        instead of SITL, Gazebo and MAVROS.')
+    parser.add_argument('--speed_up', type=float, required=False, default=1.0, \
+        help='Speed of the simulator, or of SITL, compared to real time.')
+    parser.add_argument('--clock', choices=['wall', 'ros'], required=False, \
+        default='wall', help='wall: wall clock times speed_up. ros: ROS time \
+        (/clock). Ignored with --simulate.')
+    parser.add_argument('-t', '--record_telemetry', action='store_true', \
+        required=False, default=False, help='Store every telemetry sample in \
+        outputs/<ts>/telemetry.')
+    parser.add_argument('-r', '--report_mode', choices=['json', 'stream'], \
+        required=False, default = REPORT_MODE, help='json: single report.json \
+        rewritten after each mission. stream: append-only report.jsonl.')
+    parser.add_argument('--reset', action='store_true', required=False, \
+        default=False, help='Before each mission, fly the vehicle back home, \
+        disarm it and reset its battery instead of restarting the stack.')
+    parser.add_argument('--settle_time', type=float, required=False, default=\
+        STABLE_BUFFER_TIME, help='Max seconds to wait for the system to settle \
+        after each command.')
+    parser.add_argument('--settle_tolerance', type=float, nargs=2, required=False, \
+        default=(SETTLE_SPEED_TOLERANCE, SETTLE_POSITION_TOLERANCE), metavar=(\
+        'SPEED', 'POSITION'), help='The system is settled when its RMS speed \
+        (m/s) and position deviation (m) over the last {} s are under these.'.\
+        format(SETTLE_WINDOW))
+    parser.add_argument('--resume', required=False, default=None, metavar=\
+        'CAMPAIGN', help='Output folder (outputs/<ts>) of a campaign to resume: \
+        done missions are skipped, the others are run and appended to it with the \
+        -r and -t of the campaign. The missions given must be the campaign ones.')
+    parser.add_argument('--profile', action='store_true', required=False, \
+        default=False, help='Profile Houston with cProfile, stats written to \
+        outputs/<ts>/{} (one per worker with -w).'.format(PROFILE_NAME))
+    parser.add_argument('--estimator', required=False, default=None, metavar=\
+        'MODEL', help='Generate the random missions with the times, battery and \
+        failure flags estimated from previous reports (see fit-estimator). The \
+        reports written are added to the model.')
+    parser.add_argument('--predict_failures', action='store_true', required=\
+        False, default=False, help='End a mission early when the progress of the \
+        vehicle towards its target shows the Time or Battery failure flag will be \
+        crossed first.')
 
     # One random mission, allows to select one mission type with random parameters
     random_mission_parser = subparsers.add_parser('random-mission')
@@ -859,27 +2205,105 @@ def main():
         RDM - Random selection (any of PTP, MTP or EXTR)')
     random_mission_parser.add_argument('quantity', help='How many missions you \
         want to be executed')
+    random_mission_parser.add_argument('-w', '--workers', type=int, default=1, \
+        help='Number of missions executed concurrently, each worker needs its own \
+        SITL stack (see test_environment/start_workers.sh)')
+
+    random_mission_parser.add_argument('--seed', type=int, default=None, \
+        help='Seed of the campaign, mission x is generated with seed + x. Random \
+        by default. generate-missions gives other missions for the same seed.')
 
     random_mission_parser.set_defaults(func = lambda args: \
         start_random_mission(args.mission_type, args.quantity, args.quiet,\
-         args.log_in_file, args.save_missions))
+         args.log_in_file, args.save_missions, args.seed) if args.workers <= 1 else \
+        start_parallel_campaign(args.mission_type, args.quantity, args.workers, \
+         args.quiet, args.log_in_file, args.save_missions, args.seed))
 
     # Gets mission instructions from a json file
     report_analyzer_parser = subparsers.add_parser('analyze-report')
     report_analyzer_parser.add_argument('json_file', help='Please provide a json\
          file with mission report.')
+    report_analyzer_parser.add_argument('--json', action='store_true', \
+        required=False, default=False, help='Print the summary as JSON.')
     report_analyzer_parser.set_defaults(func = lambda args: analyze_report(\
-        args.json_file))
+        args.json_file, args.json))
 
     json_mission_parser = subparsers.add_parser('json-mission')
     json_mission_parser.add_argument('json_file', help='Please provide a json\
-         file with mission instructions.')
+         file with mission instructions, or a .jsonl file with one mission per \
+         line (see generate-missions).')
     json_mission_parser.set_defaults(func = lambda args: start_json_mission(\
         args.json_file, args.quiet, args.log_in_file))
 
+    # Generates missions in bulk without running them
+    generate_missions_parser = subparsers.add_parser('generate-missions')
+    generate_missions_parser.add_argument('mission_type', help='PTP, MPTP, EXTR \
+        or RDM (see random-mission)')
+    generate_missions_parser.add_argument('quantity', help='How many missions')
+    generate_missions_parser.add_argument('output_file', help='JSON lines file \
+        to write the missions to')
+    generate_missions_parser.add_argument('--seed', type=int, default=0, \
+        help='Same seed, same missions. They are not the missions of random-mission \
+        --seed with the same seed.')
+    generate_missions_parser.add_argument('--start', type=int, default=0, \
+        help='Number of the first mission, to split the work in chunks')
+    generate_missions_parser.set_defaults(func = lambda args: generate_missions(\
+        args.mission_type, args.quantity, args.seed, args.start, args.output_file))
+
+    # Compacts a stream report into the legacy report.json document
+    export_report_parser = subparsers.add_parser('export-report')
+    export_report_parser.add_argument('stream_file', help='Please provide a \
+        report.jsonl file.')
+    export_report_parser.add_argument('json_file', help='Path of the report.json \
+        to write.')
+    export_report_parser.set_defaults(func = lambda args: export_report(\
+        args.stream_file, args.json_file))
+
+    replay_parser = subparsers.add_parser('replay')
+    replay_parser.add_argument('mission', help='Please provide a mission JSON \
+        file, or a folder of them.')
+    replay_parser.add_argument('telemetry', help='Telemetry recorded with -t for \
+        the mission, or a folder of them (outputs/<ts> with -w). The missions of a \
+        campaign are paired with the telemetry through its report, other folders \
+        by name.')
+    replay_parser.set_defaults(func = lambda args: replay_missions(args.mission, \
+        args.telemetry, args.quiet, args.log_in_file))
+
+    # Fits the mission estimator from reports, see --estimator
+    fit_estimator_parser = subparsers.add_parser('fit-estimator')
+    fit_estimator_parser.add_argument('model', help='Model file to update, \
+        created when missing.')
+    fit_estimator_parser.add_argument('report_files', nargs='+', help='report.json \
+        or report.jsonl files.')
+    fit_estimator_parser.set_defaults(func = lambda args: fit_estimator(\
+        args.model, args.report_files))
+
 
     args = parser.parse_args()
-    if 'func' in vars(args):
+    if args.resume:
+        if getattr(args, 'workers', 1) > 1:
+            error('--resume does not support parallel campaigns (-w)')
+            sys.exit(1)
+        OUTPUT_FOLDER = get_campaign_folder(args.resume)
+    REPORT_MODE = args.report_mode
+    LOG_PER_MISSION = args.log_per_mission
+    RECORD_TELEMETRY = args.record_telemetry
+    RESET_VEHICLE = args.reset
+    STABLE_BUFFER_TIME = args.settle_time
+    SETTLE_SPEED_TOLERANCE, SETTLE_POSITION_TOLERANCE = args.settle_tolerance
+    PROFILE = args.profile
+    PREDICT_FAILURES = args.predict_failures
+    if args.estimator:
+        ESTIMATOR = MissionEstimator.MissionEstimator(args.estimator)
+    Logger.set_level(args.log_level)
+    if args.simulate:
+        use_simulator(args.speed_up)
+    set_clock(args.clock, args.speed_up)
+    if 'func' not in vars(args):
+        return
+    if PROFILE and getattr(args, 'workers', 1) <= 1:
+        run_profiled(lambda: args.func(args), args.quiet, args.log_in_file)
+    else:
         args.func(args)
 
 if __name__ == "__main__":
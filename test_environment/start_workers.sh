@@ -0,0 +1,19 @@
+#!/bin/bash
+# Starts one docker-compose stack per campaign worker, e.g. ./start_workers.sh 4
+# Worker N gets the ports Houston expects (see get_worker_environment in
+# houston.py): ROS master 11311 + 10N, SITL instance N (ArduPilot shifts its
+# ports by 10N) and MAVROS in the /workerN namespace.
+# Each worker also needs a Gazebo instance using GAZEBO_MASTER_URI port 11345 + 10N.
+
+WORKERS=${1:-1}
+OFFSET=10
+
+for ((N = 0; N < WORKERS; N++)); do
+  ROS_PORT=$((11311 + N * OFFSET)) \
+  MAVROS_NS=/worker${N} \
+  FCU_PORT=$((14550 + N * OFFSET)) \
+  GCS_PORT=$((14551 + N * OFFSET)) \
+  SITL_INSTANCE=${N} \
+  SITL_PORT=$((5760 + N * OFFSET)) \
+  docker-compose -p houston_worker${N} up -d
+done
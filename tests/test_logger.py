@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+import Logger as Logger
+
+
+def write_from_child(line):
+    Logger.write(line)
+    Logger.close()
+
+
+class LoggerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'houston.log')
+        self.writer = Logger._writer
+        Logger._writer = None
+
+    def tearDown(self):
+        Logger.close()
+        Logger._writer = self.writer
+        shutil.rmtree(self.folder)
+
+    def read(self):
+        with open(self.path) as stream:
+            return stream.read().splitlines()
+
+    # The parent writer (and its thread) exists before the fork, as when a
+    # campaign logs before starting its workers.
+    def test_forked_process_lines_are_written(self):
+        Logger.set_log_file(self.path)
+        Logger.write('parent')
+        child = multiprocessing.Process(target=write_from_child, args=('child',))
+        child.start()
+        child.join()
+        self.assertEqual(child.exitcode, 0)
+        Logger.close()
+        self.assertEqual(sorted(self.read()), ['child', 'parent'])
+
+    def test_forked_process_keeps_log_file(self):
+        Logger.set_log_file(self.path)
+        child = multiprocessing.Process(target=write_from_child, args=('child',))
+        child.start()
+        child.join()
+        Logger.close()
+        self.assertEqual(self.read(), ['child'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import json
+import os
+import unittest
+
+try:
+    import RandomMissionGenerator
+    import houston
+except ImportError:
+    houston = None
+
+MISSION_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(\
+    __file__))), 'mission_examples', 'multiple_point_to_point.json')
+
+
+class Message(object):
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def point(x, y, z):
+    return Message(x=x, y=y, z=z)
+
+
+@unittest.skipIf(houston is None, 'houston needs ROS')
+class MonitorTriggerTest(unittest.TestCase):
+
+    def setUp(self):
+        with open(MISSION_FILE) as stream:
+            mission = houston.Mission(json.load(stream)['MDescription'])
+        self.ros = houston.ROSHandler('mavros')
+        self.ros.ros_set_mission_info(mission, True, False)
+
+    # Gazebo publishes model_states at about 1 kHz, the cache is updated
+    # without waking the monitor.
+    def test_model_states_do_not_wake_the_monitor(self):
+        self.ros.ros_monitor_callback_model_position_gazebo(Message(name=[\
+            houston.ROBOT_MODEL_NAME], pose=[Message(position=point(1, 2, 3))]))
+        self.assertEqual(self.ros.current_model_position, [-2, 1, 3])
+        self.assertEqual(self.ros.monitor_trigger.pending, set())
+
+    def test_odom_wakes_the_monitor(self):
+        self.ros.ros_monitor_callback_odom_local_position(Message(pose=Message(\
+            pose=Message(position=point(1, 2, 3))), twist=Message(twist=Message(\
+            linear=point(0, 0, 0)))))
+        self.assertEqual(self.ros.monitor_trigger.pending, set(['odom']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import collections
+import unittest
+
+try:
+    import RandomMissionGenerator as RandomMissionGenerator
+except ImportError:
+    RandomMissionGenerator = None
+
+Position = collections.namedtuple('Position', 'x y z')
+
+
+@unittest.skipIf(RandomMissionGenerator is None, 'houston needs ROS')
+class GenerateMissionsTest(unittest.TestCase):
+
+    def generate(self, seed, count = 3, start = 0):
+        generator = RandomMissionGenerator.RandomMissionGenerator('random', \
+            Position(0, 0, 0))
+        return list(generator.generate_missions('RDM', count, seed, start))
+
+    def test_negative_seed(self):
+        missions = self.generate(-1)
+        self.assertEqual(len(missions), 3)
+        self.assertEqual(missions, self.generate(-1))
+        self.assertNotEqual(missions, self.generate(1))
+
+    def test_large_seed(self):
+        self.assertEqual(len(self.generate(2 ** 40 + 3)), 3)
+
+    def test_missions_do_not_depend_on_chunks(self):
+        missions = self.generate(7, 5)
+        self.assertEqual(missions[2:], self.generate(7, 3, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import ReportAnalyzer as ReportAnalyzer
+import ReportStore    as ReportStore
+
+try:
+    import RandomMissionGenerator
+    import houston
+except ImportError:
+    houston = None
+
+MISSION_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(\
+    __file__))), 'mission_examples', 'multiple_point_to_point.json')
+
+
+def span(name):
+    return {'Name': name, 'Start': 0.0, 'Duration': 1.0, 'Wall': 0.5}
+
+
+class ReportTimingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def analyze(self, report_file):
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            return ReportAnalyzer.ReportAnalyzer(report_file).analyze(True)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    def test_analyzer_adds_write_spans(self):
+        report_file = os.path.join(self.folder, ReportStore.STREAM_REPORT_NAME)
+        store = ReportStore.StreamingReportStore(report_file)
+        for index in range(2):
+            report_id, offset = store.append({'MissionType': 'PTP', \
+                'OverallTime': '10.0', 'TotalDistanceTraveled': 5.0, \
+                'Failure Flags': 'Success', 'Timing': [span('Takeoff')]})
+            ReportStore.append_timing(report_file, report_id, [span('Write')])
+        timing = self.analyze(report_file)['All']['Timing']
+        self.assertEqual(timing['Takeoff']['Duration']['Count'], 2)
+        self.assertEqual(timing['Write']['Duration']['Count'], 2)
+
+    @unittest.skipIf(houston is None, 'houston needs ROS')
+    def test_generate_times_the_write(self):
+        with open(MISSION_FILE) as stream:
+            mission = houston.Mission(json.load(stream)['MDescription'])
+        mission_info = mission.mission_info
+        ros = houston.ROSHandler('mavros')
+        ros.ros_set_mission_info(mission, True, False)
+        ros.prepare_monitor(mission_info['QualityAttributes'], mission_info[\
+            'Intents'], mission_info['FailureFlags'])
+        cwd = os.getcwd()
+        settings = houston.OUTPUT_FOLDER, houston.REPORT_MODE
+        os.chdir(self.folder)
+        try:
+            for mode, name in (('json', ReportStore.LEGACY_REPORT_NAME), \
+                ('stream', ReportStore.STREAM_REPORT_NAME)):
+                houston.OUTPUT_FOLDER = mode
+                houston.REPORT_MODE = mode
+                report_id, offset = ros.report.generate()
+                report_timing = ReportStore.read_timing('outputs/{}/{}'.format(\
+                    mode, name))
+                self.assertEqual([spans[0]['Name'] for spans in \
+                    report_timing.values()], ['Write'])
+                self.assertIn(report_id, report_timing)
+                self.assertIsNotNone(report_timing[report_id][0]['Wall'])
+        finally:
+            os.chdir(cwd)
+            houston.OUTPUT_FOLDER, houston.REPORT_MODE = settings
+
+
+if __name__ == '__main__':
+    unittest.main()